@@ -0,0 +1,343 @@
+"""
+Placement layer: 把没有开始时间的任务自动放进用户的空闲时间
+输入：忙碌区间（分钟偏移）+ 任务列表（时长、截止、优先级、允许窗口）
+输出：每个任务的 (start, end) 分钟偏移，或未能放置
+
+纯函数/纯内存计算，不访问数据库；时间都以规划窗口起点为 0、以分钟为单位。
+先按 (截止时间, -优先级) 贪心放置，再做有限轮的局部搜索（重新插入、相邻交换、
+为高优先级任务挤出低优先级任务）。某个已有事件移动时，可以用 load() 从已保存的方案恢复，
+再用 move_busy() 只重排与之冲突或受其影响的任务。
+"""
+
+from __future__ import annotations
+
+import logging
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PlacementTask:
+    key: str
+    duration: int
+    priority: int = 0
+    earliest: int = 0
+    deadline: Optional[int] = None
+    # 允许放置的窗口（分钟偏移），None 表示不限制
+    windows: Optional[List[Tuple[int, int]]] = None
+
+
+@dataclass
+class PlacementResult:
+    placed: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    unplaced: List[str] = field(default_factory=list)
+
+
+class FreeTimeline:
+    """有序、不相交的空闲区间集合，支持占用与释放"""
+
+    def __init__(self, starts: Sequence[int], ends: Sequence[int]):
+        self.starts: List[int] = list(starts)
+        self.ends: List[int] = list(ends)
+
+    def reserve(self, start: int, end: int) -> None:
+        """占用 [start, end)，它可以跨越多个空闲区间的任意部分"""
+        i = bisect_right(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            fs, fe = self.starts[i], self.ends[i]
+            pieces = []
+            if fs < start:
+                pieces.append((fs, start))
+            if end < fe:
+                pieces.append((end, fe))
+            self.starts[i:i + 1] = [p[0] for p in pieces]
+            self.ends[i:i + 1] = [p[1] for p in pieces]
+            i += len(pieces)
+
+    def release(self, start: int, end: int) -> None:
+        """释放 [start, end)，与相邻空闲区间合并"""
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        if i + 1 < len(self.starts) and self.starts[i + 1] <= self.ends[i]:
+            self.ends[i] = max(self.ends[i], self.ends.pop(i + 1))
+            self.starts.pop(i + 1)
+        if i > 0 and self.ends[i - 1] >= self.starts[i]:
+            self.ends[i - 1] = max(self.ends[i - 1], self.ends.pop(i))
+            self.starts.pop(i)
+
+    def earliest_fit(self, task: PlacementTask, granularity: int, not_before: int = 0) -> Optional[int]:
+        """返回满足时长、窗口与截止时间的最早开始偏移"""
+        lower = max(task.earliest, not_before)
+        deadline = task.deadline
+        windows = task.windows
+        i = bisect_right(self.ends, lower)
+        while i < len(self.starts):
+            fs, fe = self.starts[i], self.ends[i]
+            if deadline is not None and fs + task.duration > deadline:
+                return None
+            limit = fe if deadline is None else min(fe, deadline)
+            if windows is None:
+                start = _align(max(fs, lower), granularity)
+                if start + task.duration <= limit:
+                    return start
+            else:
+                j = bisect_right(windows, (max(fs, lower), float('inf'))) - 1
+                j = max(j, 0)
+                while j < len(windows) and windows[j][0] < limit:
+                    ws, we = windows[j]
+                    start = _align(max(fs, lower, ws), granularity)
+                    if start + task.duration <= min(limit, we):
+                        return start
+                    j += 1
+            i += 1
+        return None
+
+
+class PlacementEngine:
+    """贪心 + 局部搜索的任务放置器"""
+
+    def __init__(
+        self,
+        busy_starts: Sequence[int],
+        busy_ends: Sequence[int],
+        horizon: int,
+        granularity: int = 15,
+        max_passes: int = 3,
+        max_ejections: int = 16,
+        replan_window: int = 1440,
+    ):
+        self.horizon = horizon
+        self.granularity = granularity
+        self.max_passes = max_passes
+        self.max_ejections = max_ejections
+        self.replan_window = replan_window
+        self.busy: List[Tuple[int, int]] = sorted(
+            (max(s, 0), min(e, horizon)) for s, e in zip(busy_starts, busy_ends) if e > s
+        )
+        self._longest_busy = max((e - s for s, e in self.busy), default=0)
+        self.timeline = FreeTimeline([0], [horizon])
+        for s, e in self.busy:
+            self.timeline.reserve(s, e)
+        self.tasks: Dict[str, PlacementTask] = {}
+        self.result = PlacementResult()
+
+    # ---- 目标函数 ----
+
+    def _task_cost(self, key: str) -> int:
+        """未放置的任务代价极高；已放置的任务越晚、优先级越高，代价越大"""
+        task = self.tasks[key]
+        weight = task.priority + 1
+        if key in self.result.placed:
+            return weight * self.result.placed[key][0]
+        return weight * self.horizon * 4
+
+    def cost(self) -> int:
+        return sum(self._task_cost(key) for key in self.tasks)
+
+    # ---- 基本操作 ----
+
+    def _place(self, key: str) -> bool:
+        task = self.tasks[key]
+        start = self.timeline.earliest_fit(task, self.granularity)
+        if start is None:
+            return False
+        self.timeline.reserve(start, start + task.duration)
+        self.result.placed[key] = (start, start + task.duration)
+        return True
+
+    def _unplace(self, key: str) -> Tuple[int, int]:
+        start, end = self.result.placed.pop(key)
+        self.timeline.release(start, end)
+        return start, end
+
+    def _restore(self, key: str, slot: Tuple[int, int]) -> None:
+        self.timeline.reserve(*slot)
+        self.result.placed[key] = slot
+
+    def _refresh_unplaced(self) -> None:
+        self.result.unplaced = [key for key in self.tasks if key not in self.result.placed]
+
+    # ---- 贪心 + 局部搜索 ----
+
+    def place(self, tasks: Sequence[PlacementTask]) -> PlacementResult:
+        for task in tasks:
+            if task.windows is not None:
+                task.windows = sorted(task.windows)
+            self.tasks[task.key] = task
+        order = sorted(
+            tasks,
+            key=lambda t: (t.deadline if t.deadline is not None else self.horizon, -t.priority, -t.duration),
+        )
+        for task in order:
+            self._place(task.key)
+        self._refresh_unplaced()
+        self.improve()
+        return self.result
+
+    def load(self, tasks: Sequence[PlacementTask], placed: Dict[str, Tuple[int, int]]) -> PlacementResult:
+        """从已保存的方案恢复：placed 中的任务占回原来的位置，不重新计算"""
+        for task in tasks:
+            if task.windows is not None:
+                task.windows = sorted(task.windows)
+            self.tasks[task.key] = task
+        for key, slot in placed.items():
+            if key in self.tasks:
+                self._restore(key, slot)
+        self._refresh_unplaced()
+        return self.result
+
+    def improve(self, keys: Optional[Sequence[str]] = None) -> None:
+        """局部搜索：直到没有改进或达到轮数上限"""
+        for _ in range(self.max_passes):
+            changed = self._reinsert_pass(keys)
+            changed = self._swap_pass(keys) or changed
+            changed = self._eject_pass(keys) or changed
+            if not changed:
+                break
+        self._refresh_unplaced()
+
+    def _reinsert_pass(self, keys: Optional[Sequence[str]] = None) -> bool:
+        """把每个已放置任务取出再放回最早可行位置（移入新空出的时间）"""
+        changed = False
+        candidates = keys if keys is not None else list(self.result.placed)
+        by_priority = sorted(
+            (k for k in candidates if k in self.result.placed),
+            key=lambda k: -self.tasks[k].priority,
+        )
+        for key in by_priority:
+            old = self._unplace(key)
+            if self._place(key) and self.result.placed[key][0] < old[0]:
+                changed = True
+                continue
+            if key in self.result.placed:
+                self._unplace(key)
+            self._restore(key, old)
+        return changed
+
+    def _swap_pass(self, keys: Optional[Sequence[str]] = None) -> bool:
+        """时间上相邻的两个任务，若后者优先级更高则尝试交换先后"""
+        changed = False
+        focus = set(keys) if keys is not None else None
+        ordered = sorted(self.result.placed, key=lambda k: self.result.placed[k][0])
+        for a, b in zip(ordered, ordered[1:]):
+            if focus is not None and a not in focus and b not in focus:
+                continue
+            if a not in self.result.placed or b not in self.result.placed:
+                continue
+            if self.tasks[a].priority >= self.tasks[b].priority:
+                continue
+            before = self._task_cost(a) + self._task_cost(b)
+            slot_a, slot_b = self._unplace(a), self._unplace(b)
+            if self._place(b) and self._place(a) and self._task_cost(a) + self._task_cost(b) < before:
+                changed = True
+                continue
+            for key in (a, b):
+                if key in self.result.placed:
+                    self._unplace(key)
+            self._restore(a, slot_a)
+            self._restore(b, slot_b)
+        return changed
+
+    def _eject_pass(self, keys: Optional[Sequence[str]] = None) -> bool:
+        """为未放置的高优先级任务挤出低优先级任务（每个任务最多尝试 max_ejections 个）"""
+        changed = False
+        candidates = keys if keys is not None else list(self.tasks)
+        unplaced = sorted(
+            (k for k in candidates if k not in self.result.placed),
+            key=lambda k: -self.tasks[k].priority,
+        )
+        for key in unplaced:
+            task = self.tasks[key]
+            victims = sorted(
+                (
+                    k for k, (s, _) in self.result.placed.items()
+                    if self.tasks[k].priority < task.priority
+                    and self.tasks[k].duration >= task.duration
+                    and s >= task.earliest
+                    and (task.deadline is None or s + task.duration <= task.deadline)
+                ),
+                key=lambda k: (self.tasks[k].priority, self.result.placed[k][0]),
+            )[:self.max_ejections]
+            for victim in victims:
+                before = self._task_cost(key) + self._task_cost(victim)
+                old = self._unplace(victim)
+                if self._place(key):
+                    self._place(victim)
+                    if self._task_cost(key) + self._task_cost(victim) < before:
+                        changed = True
+                        break
+                    self._unplace(key)
+                    if victim in self.result.placed:
+                        self._unplace(victim)
+                self._restore(victim, old)
+        return changed
+
+    # ---- 增量重排 ----
+
+    def move_busy(self, old: Optional[Tuple[int, int]], new: Optional[Tuple[int, int]]) -> List[str]:
+        """
+        某个已有事件从 old 移到 new（任一可为 None 表示新增/删除）
+        只重排与 new 冲突的任务，以及可能移入 old 空出时间的任务；返回位置发生变化的任务
+        """
+        before = dict(self.result.placed)
+        if new is not None:
+            displaced = [
+                key for key, (s, e) in self.result.placed.items()
+                if s < new[1] and new[0] < e
+            ]
+            for key in displaced:
+                self._unplace(key)
+        else:
+            displaced = []
+        if old is not None:
+            self._remove_busy((max(old[0], 0), min(old[1], self.horizon)))
+        if new is not None:
+            self._add_busy((max(new[0], 0), min(new[1], self.horizon)))
+
+        for key in sorted(displaced, key=lambda k: -self.tasks[k].priority):
+            self._place(key)
+        affected = set(displaced)
+        if old is not None:
+            # 只有 old 之后一个 replan_window 内的任务有机会前移到空出的时间
+            window_end = old[1] + self.replan_window
+            affected.update(
+                key for key, (s, _) in self.result.placed.items()
+                if old[0] <= s < window_end
+            )
+        self.improve(keys=sorted(affected))
+        return [key for key in self.tasks if before.get(key) != self.result.placed.get(key)]
+
+    def _add_busy(self, interval: Tuple[int, int]) -> None:
+        if interval[1] <= interval[0]:
+            return
+        insort(self.busy, interval)
+        self._longest_busy = max(self._longest_busy, interval[1] - interval[0])
+        self.timeline.reserve(*interval)
+
+    def _remove_busy(self, interval: Tuple[int, int]) -> None:
+        """移除一个忙碌区间，只释放不再被其他忙碌区间覆盖的部分"""
+        i = bisect_left(self.busy, interval)
+        if i >= len(self.busy) or self.busy[i] != interval:
+            return
+        self.busy.pop(i)
+        start, end = interval
+        lo = bisect_left(self.busy, (start - self._longest_busy, start - self._longest_busy))
+        hi = bisect_left(self.busy, (end, end))
+        covered = sorted(
+            (max(s, start), min(e, end)) for s, e in self.busy[lo:hi] if e > start
+        )
+        cursor = start
+        for s, e in covered:
+            if s > cursor:
+                self.timeline.release(cursor, s)
+            cursor = max(cursor, e)
+        if cursor < end:
+            self.timeline.release(cursor, end)
+
+
+def _align(value: int, granularity: int) -> int:
+    return -(-value // granularity) * granularity
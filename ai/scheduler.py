@@ -6,9 +6,18 @@ Schedule layer: 从规范化字段生成事件实体
 
 import logging
 from typing import Optional, Dict, Any
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
 
-from events.models import Event
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from events.freebusy import busy_intervals_for_users, off_hours_intervals
+from events.idempotency import make_idempotency_key
+from events.models import Event, EventChange
+from events.updates import ConcurrentUpdateError, update_event_fields
+
+from .placement import PlacementEngine, PlacementTask
 
 logger = logging.getLogger(__name__)
 
@@ -21,11 +30,36 @@ class ScheduleError(Exception):
 class EventScheduler:
     """事件调度器：从规范化数据生成事件实体"""
 
+    @staticmethod
+    def build_event_data(normalized_data: Dict[str, Any]) -> Dict[str, Any]:
+        """把规范化字段转换为 Event 模型字段（缺少时间/时长视为全天）"""
+        date_obj = datetime.fromisoformat(normalized_data['date']).date()
+        all_day = normalized_data.get('all_day') is True or not normalized_data.get('start_time') or not normalized_data.get('duration')
+        if all_day:
+            time_obj = time(0, 0)
+            duration_min = 1440
+        else:
+            time_obj = time.fromisoformat(normalized_data['start_time'])
+            duration_min = int(normalized_data['duration'])
+
+        return {
+            'title': normalized_data['title'],
+            'date': date_obj,
+            'start_time': time_obj,
+            'duration': duration_min,
+            'location': normalized_data.get('location'),
+            'description': normalized_data.get('description'),
+            'participants': normalized_data.get('participants'),
+            'reminder': normalized_data.get('reminder', 15),
+            'category': normalized_data.get('category', 'other'),
+        }
+
     @staticmethod
     def schedule_event(
         user,
         normalized_data: Dict[str, Any],
-        event_id: Optional[int] = None
+        event_id: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Event:
         """
         创建或更新一个 Event 实例
@@ -33,52 +67,52 @@ class EventScheduler:
         :param user: Django User 实例（事件所有者）
         :param normalized_data: 规范化后的字段字典
         :param event_id: 如果指定，则更新现有事件；否则创建新事件
+        :param idempotency_key: 客户端提供的幂等键；缺省时使用 normalized_data['idempotency_key']
+                                或内容哈希。重放同一个键时直接返回已有事件
         :return: 创建或更新的 Event 实例（已保存）
         :raises ScheduleError: 创建/更新失败
         """
         
         try:
-            # 类型转换
-            date_obj = datetime.fromisoformat(normalized_data['date']).date()
-            all_day = normalized_data.get('all_day') is True or not normalized_data.get('start_time') or not normalized_data.get('duration')
-            if all_day:
-                time_obj = time(0, 0)
-                duration_min = 1440
-            else:
-                time_obj = time.fromisoformat(normalized_data['start_time'])
-                duration_min = int(normalized_data['duration'])
-            
-            event_data = {
-                'title': normalized_data['title'],
-                'date': date_obj,
-                'start_time': time_obj,
-                'duration': duration_min,
-                'location': normalized_data.get('location'),
-                'description': normalized_data.get('description'),
-                'participants': normalized_data.get('participants'),
-                'reminder': normalized_data.get('reminder', 15),
-                'category': normalized_data.get('category', 'other'),
-            }
+            event_data = EventScheduler.build_event_data(normalized_data)
             
             # 保留现有的集成字段（如果存在）
             if event_id:
                 try:
                     event = Event.objects.get(id=event_id, user=user)
-                    # 更新字段
-                    for key, value in event_data.items():
-                        setattr(event, key, value)
-                    event.save()
-                    logger.info(f"Updated event {event.id}: {event.title}")
-                    return event
                 except Event.DoesNotExist:
                     raise ScheduleError(f"Event {event_id} not found for user {user.id}")
+                # 只写变化的列；normalized_data['version'] 为调用方读到的版本
+                try:
+                    changed = update_event_fields(event, event_data, normalized_data.get('version'))
+                except ConcurrentUpdateError as e:
+                    raise ScheduleError(str(e))
+                if changed:
+                    logger.info(f"Updated event {event.id} ({', '.join(changed)}): {event.title}")
+                else:
+                    logger.info(f"Event {event.id} unchanged, skipped write")
+                return event
             
             else:
-                # 创建新事件
-                event = Event.objects.create(
-                    user=user,
-                    **event_data
+                key = make_idempotency_key(
+                    user.id,
+                    event_data,
+                    client_key=idempotency_key or normalized_data.get('idempotency_key'),
                 )
+                existing = Event.objects.filter(user=user, idempotency_key=key).first()
+                if existing is not None:
+                    logger.info(f"Idempotent replay for event {existing.id}: {existing.title}")
+                    return existing
+                # 创建新事件；并发重试撞上唯一索引时返回先写入的那一行
+                try:
+                    with transaction.atomic():
+                        event = Event.objects.create(
+                            user=user,
+                            idempotency_key=key,
+                            **event_data
+                        )
+                except IntegrityError:
+                    return Event.objects.get(user=user, idempotency_key=key)
                 logger.info(f"Created event {event.id}: {event.title}")
                 return event
                 
@@ -91,31 +125,262 @@ class EventScheduler:
     @staticmethod
     def schedule_events_batch(
         user,
-        normalized_events: list
+        normalized_events: list,
+        errors: Optional[list] = None,
     ) -> list:
         """
-        批量创建事件
+        批量创建事件（幂等）：一次查询找出已存在的键，其余一次 bulk_create
         
         :param user: Django User 实例
         :param normalized_events: 规范化后的事件列表
-        :return: 创建的 Event 实例列表
+        :param errors: 可选，传入列表以收集每条失败的 {'index', 'title', 'error'}
+        :return: 按输入顺序的 Event 实例列表（重放的条目返回已有事件，失败的条目跳过）
         """
-        created_events = []
-        errors = []
-        
-        for i, event_data in enumerate(normalized_events):
+        errors = errors if errors is not None else []
+        keyed = []
+
+        for i, normalized_data in enumerate(normalized_events):
             try:
-                event = EventScheduler.schedule_event(user, event_data)
-                created_events.append(event)
-            except ScheduleError as e:
+                event_data = EventScheduler.build_event_data(normalized_data)
+            except Exception as e:
                 errors.append({
                     'index': i,
-                    'title': event_data.get('title', 'Unknown'),
-                    'error': str(e)
+                    'title': normalized_data.get('title', 'Unknown'),
+                    'error': f"Event scheduling failed: {str(e)}"
                 })
                 logger.warning(f"Batch event {i} failed: {e}")
+                continue
+            key = make_idempotency_key(user.id, event_data, client_key=normalized_data.get('idempotency_key'))
+            keyed.append((key, event_data))
+
+        keys = {key for key, _ in keyed}
+        existing = set(
+            Event.objects.filter(user=user, idempotency_key__in=keys).values_list('idempotency_key', flat=True)
+        )
+        to_create = {}
+        for key, event_data in keyed:
+            if key not in existing and key not in to_create:
+                to_create[key] = Event(user=user, idempotency_key=key, **event_data)
+        if to_create:
+            Event.objects.bulk_create(to_create.values(), ignore_conflicts=True)
+
+        by_key = {event.idempotency_key: event for event in Event.objects.filter(user=user, idempotency_key__in=keys)}
+        scheduled_events = [by_key[key] for key, _ in keyed if key in by_key]
+        # ignore_conflicts 的 bulk_create 拿不到主键，这里补记变更日志
+        EventChange.record_for([by_key[key] for key in to_create if key in by_key], EventChange.UPSERT)
         
         if errors:
             logger.warning(f"Batch scheduling completed with {len(errors)} error(s)")
+        logger.info(
+            f"Batch scheduled {len(scheduled_events)} event(s), "
+            f"{len(to_create)} new, {len(keyed) - len(to_create)} replayed"
+        )
         
-        return created_events
+        return scheduled_events
+
+    @staticmethod
+    def place_tasks(
+        user,
+        tasks: list,
+        first_day: date,
+        days: int,
+        work_start: time = time(9, 0),
+        work_end: time = time(18, 0),
+        granularity: int = 15,
+        weekdays=(0, 1, 2, 3, 4),
+        commit: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        把没有开始时间的任务放进用户在 [first_day, first_day + days) 内的空闲工作时间
+
+        :param tasks: 规范化后的事件字典，额外支持 priority（越大越重要）、
+                      deadline（ISO 日期或日期时间）、windows（[{"start", "end"}] ISO 日期时间）
+        :param commit: True 时通过 schedule_event 创建事件；False 只返回放置方案
+        :return: {'placed': [...], 'unplaced': [...]}
+        :raises ScheduleError: 任务字段无效
+        """
+        horizon = days * 1440
+        try:
+            placement_tasks = [
+                _to_placement_task(str(i), task, first_day, horizon)
+                for i, task in enumerate(tasks)
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ScheduleError(f"Invalid task: {e}")
+
+        busy_starts, busy_ends = busy_intervals_for_users([user.id], first_day, days)
+        off_starts, off_ends = off_hours_intervals(days, work_start, work_end, weekdays, first_day)
+        busy_starts.extend(off_starts)
+        busy_ends.extend(off_ends)
+
+        engine = PlacementEngine(busy_starts, busy_ends, horizon, granularity=granularity)
+        result = engine.place(placement_tasks)
+
+        origin = datetime.combine(first_day, time(0, 0))
+        placed = []
+        stored = []
+        # 任一事件创建失败（ScheduleError）时整批回滚，不留下半个方案
+        with transaction.atomic():
+            for key, (start, _) in sorted(result.placed.items(), key=lambda item: item[1]):
+                task = dict(tasks[int(key)])
+                start_dt = origin + timedelta(minutes=start)
+                task.update({
+                    'date': start_dt.date().isoformat(),
+                    'start_time': start_dt.time().isoformat('seconds'),
+                    'duration': int(task['duration']),
+                    'all_day': False,
+                })
+                if commit:
+                    event = EventScheduler.schedule_event(user, task)
+                    # 记下约束，之后其他事件移动时 move_and_replan 可以只重排受影响的任务
+                    event.placement = {field: task[field] for field in PLACEMENT_FIELDS if task.get(field)}
+                    stored.append(event)
+                    placed.append({'index': int(key), 'event': event})
+                else:
+                    placed.append({'index': int(key), 'event_data': task})
+            if stored:
+                Event.objects.bulk_update(stored, ['placement'])
+
+        logger.info(f"Placed {len(placed)}/{len(tasks)} task(s) for user {user.id}")
+        return {
+            'placed': placed,
+            'unplaced': [
+                {'index': int(key), 'title': tasks[int(key)].get('title', 'Unknown')}
+                for key in result.unplaced
+            ],
+        }
+
+
+    @staticmethod
+    def move_and_replan(
+        user,
+        event_id: int,
+        normalized_move: Dict[str, Any],
+        first_day: date,
+        days: int,
+        work_start: time = time(9, 0),
+        work_end: time = time(18, 0),
+        granularity: int = 15,
+        weekdays=(0, 1, 2, 3, 4),
+    ) -> Dict[str, Any]:
+        """
+        移动一个事件，并在 [first_day, first_day + days) 内只重排受影响的自动放置任务
+
+        从已保存的方案（带 placement 的事件当前位置）恢复放置器，再由 move_busy 只重排
+        与新位置冲突、或可能前移到旧位置空出时间的任务；其余任务保持原位，不写库。
+        被移动的事件此后视为固定日程。
+
+        :param normalized_move: date / start_time，可带 duration 与 version（乐观锁）
+        :return: {'event': Event, 'moved': [Event, ...], 'unplaced': [Event, ...]}
+        :raises ScheduleError: 事件不存在、字段无效或版本冲突
+        """
+        try:
+            changes = {
+                'date': date.fromisoformat(normalized_move['date']),
+                'start_time': time.fromisoformat(normalized_move['start_time']),
+            }
+            if normalized_move.get('duration'):
+                changes['duration'] = int(normalized_move['duration'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ScheduleError(f"Invalid move: {e}")
+
+        horizon = days * 1440
+        tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+        window = (
+            datetime.combine(first_day, time(0, 0), tzinfo=tz),
+            datetime.combine(first_day + timedelta(days=days), time(0, 0), tzinfo=tz),
+        )
+        with transaction.atomic():
+            try:
+                event = Event.objects.get(id=event_id, user=user)
+            except Event.DoesNotExist:
+                raise ScheduleError(f"Event {event_id} not found for user {user.id}")
+            old = _event_minutes(event, first_day)
+            if event.placement is not None:
+                changes['placement'] = None
+            try:
+                update_event_fields(event, changes, normalized_move.get('version'))
+            except ConcurrentUpdateError as e:
+                raise ScheduleError(str(e))
+            new = _event_minutes(event, first_day)
+
+            nearby = list(
+                Event.objects.filter(user=user).overlapping(*window).exclude(pk=event.pk)
+                .only('id', 'date', 'start_time', 'duration', 'placement')
+            )
+            tasks = {str(e.pk): e for e in nearby if e.placement is not None}
+            busy = [_event_minutes(e, first_day) for e in nearby if e.placement is None]
+            # 放置器看到的是移动之前的日程：旧位置仍然忙碌
+            busy.append(old)
+            off_starts, off_ends = off_hours_intervals(days, work_start, work_end, weekdays, first_day)
+            engine = PlacementEngine(
+                [s for s, _ in busy] + list(off_starts), [e for _, e in busy] + list(off_ends),
+                horizon, granularity=granularity,
+            )
+            engine.load(
+                [
+                    _to_placement_task(key, {'duration': e.duration, **e.placement}, first_day, horizon)
+                    for key, e in tasks.items()
+                ],
+                {key: _event_minutes(e, first_day) for key, e in tasks.items()},
+            )
+            changed = engine.move_busy(old, new)
+
+            origin = datetime.combine(first_day, time(0, 0))
+            moved = []
+            for key in changed:
+                slot = engine.result.placed.get(key)
+                if slot is None:
+                    continue
+                start_dt = origin + timedelta(minutes=slot[0])
+                task = tasks[key]
+                task.date, task.start_time = start_dt.date(), start_dt.time()
+                moved.append(task)
+            if moved:
+                Event.objects.bulk_update(moved, ['date', 'start_time'])
+
+        logger.info(f"Moved event {event.id}, re-placed {len(moved)} of {len(tasks)} task(s) for user {user.id}")
+        return {
+            'event': event,
+            'moved': moved,
+            'unplaced': [tasks[key] for key in changed if key not in engine.result.placed],
+        }
+
+
+PLACEMENT_FIELDS = ('priority', 'deadline', 'earliest', 'windows')
+
+
+def _event_minutes(event: Event, first_day: date) -> tuple:
+    """事件的本地挂钟时间 → 相对 first_day 00:00 的 (start, end) 分钟偏移"""
+    start = (event.date - first_day).days * 1440 + event.start_time.hour * 60 + event.start_time.minute
+    return start, start + event.duration
+
+
+def _offset_minutes(value: str, first_day: date, end_of_day: bool = False) -> int:
+    """把 ISO 日期/日期时间转换为相对 first_day 00:00（本地时区）的分钟偏移"""
+    if len(value) <= 10:
+        day = date.fromisoformat(value)
+        return (day - first_day).days * 1440 + (1440 if end_of_day else 0)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(ZoneInfo(settings.TIME_ZONE or 'UTC')).replace(tzinfo=None)
+    return (dt.date() - first_day).days * 1440 + dt.hour * 60 + dt.minute
+
+
+def _to_placement_task(key: str, data: Dict[str, Any], first_day: date, horizon: int) -> PlacementTask:
+    duration = int(data['duration'])
+    if duration <= 0 or duration > 1440:
+        raise ValueError(f"duration must be 1-1440 minutes, got {duration}")
+    deadline = data.get('deadline')
+    windows = data.get('windows')
+    return PlacementTask(
+        key=key,
+        duration=duration,
+        priority=int(data.get('priority') or 0),
+        earliest=_offset_minutes(data['earliest'], first_day) if data.get('earliest') else 0,
+        deadline=min(_offset_minutes(deadline, first_day, end_of_day=True), horizon) if deadline else None,
+        windows=[
+            (_offset_minutes(w['start'], first_day), _offset_minutes(w['end'], first_day, end_of_day=True))
+            for w in windows
+        ] if windows else None,
+    )
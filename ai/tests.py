@@ -1,3 +1,137 @@
-from django.test import TestCase
+import random
+from datetime import date, time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from rest_framework.test import APIClient
+
+from events.models import Event, EventChange
+from .placement import PlacementEngine, PlacementTask
+from .scheduler import EventScheduler, ScheduleError
+
+
+class PlacementEngineTests(SimpleTestCase):
+    def test_respects_busy_deadline_and_windows(self):
+        engine = PlacementEngine([60], [120], horizon=600, granularity=15)
+        result = engine.place([
+            PlacementTask('a', duration=60, deadline=60),
+            PlacementTask('b', duration=30, windows=[(300, 400)]),
+            PlacementTask('c', duration=90, deadline=100),
+        ])
+        self.assertEqual(result.placed['a'], (0, 60))
+        self.assertEqual(result.placed['b'], (300, 330))
+        self.assertEqual(result.unplaced, ['c'])
+
+    def test_high_priority_ejects_low_priority(self):
+        engine = PlacementEngine([60], [600], horizon=600, granularity=15)
+        result = engine.place([
+            PlacementTask('low', duration=60, priority=0, deadline=60),
+            PlacementTask('high', duration=60, priority=5, deadline=60),
+        ])
+        self.assertEqual(result.placed, {'high': (0, 60)})
+        self.assertEqual(result.unplaced, ['low'])
+
+    def test_move_busy_only_touches_affected_tasks(self):
+        engine = PlacementEngine([], [], horizon=3 * 1440, granularity=15)
+        engine.place([PlacementTask(str(i), duration=60) for i in range(10)])
+        moved = engine.move_busy(None, (120, 180))
+        self.assertEqual(moved, ['2'])
+        self.assertEqual(engine.result.placed['2'], (600, 660))
+        moved = engine.move_busy((120, 180), None)
+        self.assertEqual(moved, ['2'])
+        self.assertEqual(engine.result.placed['2'], (120, 180))
+
+    def test_loaded_plan_is_replanned_from_where_it_stands(self):
+        tasks = [PlacementTask(str(i), duration=60) for i in range(10)]
+        engine = PlacementEngine([], [], horizon=3 * 1440, granularity=15)
+        # 已保存的方案不是贪心会给出的那个：load 不重新计算
+        stored = {str(i): (i * 120, i * 120 + 60) for i in range(10)}
+        self.assertEqual(engine.load(tasks, stored).placed, stored)
+        self.assertEqual(engine.move_busy(None, (240, 300)), ['2'])
+        self.assertEqual({key: slot for key, slot in engine.result.placed.items() if key != '2'},
+                         {key: slot for key, slot in stored.items() if key != '2'})
+
+    def test_thousands_of_events_give_a_valid_repeatable_plan(self):
+        rng = random.Random(7)
+        horizon = 90 * 1440
+        busy = [(s, s + rng.choice((15, 30, 45, 60))) for s in (rng.randrange(0, horizon, 15) for _ in range(2000))]
+        tasks = [
+            PlacementTask(str(i), duration=rng.choice((15, 30, 60)), priority=rng.randrange(4),
+                          deadline=rng.randrange(1440, horizon))
+            for i in range(1000)
+        ]
+
+        def plan():
+            engine = PlacementEngine([s for s, _ in busy], [e for _, e in busy], horizon, granularity=15)
+            return engine.place([PlacementTask(**vars(task)) for task in tasks])
+
+        result = plan()
+        self.assertEqual(plan(), result)
+        self.assert_valid(result.placed, tasks, busy)
+
+        # 一个事件挪到第二天：只有与新位置冲突、或能前移到旧位置的少数任务被重排
+        engine = PlacementEngine([s for s, _ in busy], [e for _, e in busy], horizon, granularity=15)
+        engine.load([PlacementTask(**vars(task)) for task in tasks], result.placed)
+        old = busy[0]
+        new = (old[0] + 1440, old[1] + 1440)
+        moved = engine.move_busy(old, new)
+        self.assertLessEqual(len(moved), 5)
+        self.assertEqual(
+            {key: slot for key, slot in engine.result.placed.items() if key not in moved},
+            {key: slot for key, slot in result.placed.items() if key not in moved},
+        )
+        self.assert_valid(engine.result.placed, tasks, [new] + busy[1:])
+
+    def assert_valid(self, placed, tasks, busy):
+        slots = sorted(placed.values())
+        for (_, end), (start, _) in zip(slots, slots[1:]):
+            self.assertLessEqual(end, start)
+        for key, (s, e) in placed.items():
+            self.assertLessEqual(e, tasks[int(key)].deadline)
+            self.assertFalse(any(bs < e and s < be for bs, be in busy))
+
+
+class PlaceTasksTests(TestCase):
+    def test_moving_an_event_replaces_only_the_tasks_it_hits(self):
+        user = get_user_model().objects.create_user('ria', password='pw')
+        client = APIClient()
+        client.force_authenticate(user)
+        lunch = Event.objects.create(user=user, title='Lunch', date=date(2026, 3, 2), start_time=time(16, 0),
+                                     duration=60)
+        window = {'start': '2026-03-02', 'end': '2026-03-03'}
+        res = client.post('/api/ai/place/', {
+            **window, 'tasks': [{'title': f'Task {i}', 'duration': 60, 'date': '2026-03-02'} for i in range(5)],
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        before = dict(Event.objects.filter(user=user, placement__isnull=False).values_list('title', 'start_time'))
+        self.assertEqual(sorted(before.values()), [time(h, 0) for h in range(9, 14)])
+        hit = next(title for title, start in before.items() if start == time(10, 0))
+        changes = EventChange.objects.count()
+
+        res = client.post('/api/ai/replan/', {
+            **window, 'event_id': lunch.pk, 'date': '2026-03-02', 'start_time': '10:00',
+        }, format='json').json()
+        self.assertEqual([(item['title'], item['start_time']) for item in res['moved']], [(hit, '14:00:00')])
+        self.assertIsNone(res['unplaced'])
+        # 被移动的事件与被重排的那一个任务，各记一次变更；其余任务不动
+        self.assertEqual(EventChange.objects.count() - changes, 2)
+        after = dict(Event.objects.filter(user=user, placement__isnull=False).values_list('title', 'start_time'))
+        self.assertEqual({title: start for title, start in after.items() if title != hit},
+                         {title: start for title, start in before.items() if title != hit})
+
+    def test_failed_commit_leaves_no_events_behind(self):
+        user = get_user_model().objects.create_user('pia', password='pw')
+        schedule_event = EventScheduler.schedule_event
+
+        def fail_second(user, data):
+            if Event.objects.filter(user=user).exists():
+                raise ScheduleError('boom')
+            return schedule_event(user, data)
+
+        tasks = [{'title': 'Report', 'duration': 60}, {'title': 'Slides', 'duration': 60}]
+        with mock.patch.object(EventScheduler, 'schedule_event', fail_second):
+            with self.assertRaises(ScheduleError):
+                EventScheduler.place_tasks(user, tasks, date(2026, 3, 2), days=1)
+        self.assertFalse(Event.objects.filter(user=user).exists())
@@ -5,6 +5,8 @@ from .views import (
     NormalizeEventView,
     ScheduleEventsView,
     ParseNormalizeScheduleView,
+    PlaceTasksView,
+    ReplanView,
     AiDataStashView,
 )
 
@@ -13,6 +15,8 @@ urlpatterns = [
     path('normalize/', NormalizeEventView.as_view(), name='normalize'),
     path('schedule/', ScheduleEventsView.as_view(), name='schedule'),
     path('process/', ParseNormalizeScheduleView.as_view(), name='process'),
+    path('place/', PlaceTasksView.as_view(), name='place'),
+    path('replan/', ReplanView.as_view(), name='replan'),
     path('stash/', AiDataStashView.as_view(), name='stash'),
     path('stash/<str:key>/', AiDataStashView.as_view(), name='stash_get'),
 ]
@@ -1,17 +1,19 @@
 import logging
+import secrets
+from datetime import date, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from django.conf import settings
-from django.core.cache import cache
+from events.idempotency import IDEMPOTENCY_HEADER
 from events.serializers import EventSerializer
-
-import secrets
-
-from .services import parse_with_openai
 from .normalizer import EventNormalizer, NormalizationError
 from .scheduler import EventScheduler, ScheduleError
+from .services import parse_with_openai
 
 logger = logging.getLogger(__name__)
 
@@ -153,12 +155,15 @@ class ScheduleEventsView(APIView):
 
         created_events = []
         errors = []
+        # 整个请求的幂等键：每条事件派生 "<key>:<index>"
+        request_key = request.META.get(IDEMPOTENCY_HEADER)
 
         for i, event_data in enumerate(events_data):
             try:
                 event = EventScheduler.schedule_event(
                     user=request.user,
-                    normalized_data=event_data
+                    normalized_data=event_data,
+                    idempotency_key=f'{request_key}:{i}' if request_key else None,
                 )
                 serializer = EventSerializer(event)
                 created_events.append(serializer.data)
@@ -245,12 +250,14 @@ class ParseNormalizeScheduleView(APIView):
         # Step 3: Schedule
         created_events = []
         schedule_errors = []
+        request_key = request.META.get(IDEMPOTENCY_HEADER)
 
         for i, event_data in enumerate(normalized_events):
             try:
                 event = EventScheduler.schedule_event(
                     user=request.user,
-                    normalized_data=event_data
+                    normalized_data=event_data,
+                    idempotency_key=f'{request_key}:{i}' if request_key else None,
                 )
                 serializer = EventSerializer(event)
                 created_events.append(serializer.data)
@@ -271,6 +278,129 @@ class ParseNormalizeScheduleView(APIView):
         }, status=status.HTTP_201_CREATED if created_events else status.HTTP_400_BAD_REQUEST)
 
 
+def planning_window(request, max_days: int):
+    """解析 start / end / work_start / work_end / granularity；无效时返回 400 响应"""
+    try:
+        first_day = date.fromisoformat(request.data['start']) if request.data.get('start') else timezone.localdate()
+        last_day = date.fromisoformat(request.data['end']) if request.data.get('end') else first_day + timedelta(days=7)
+        work_start = time.fromisoformat(request.data.get('work_start') or '09:00')
+        work_end = time.fromisoformat(request.data.get('work_end') or '18:00')
+        granularity = int(request.data.get('granularity') or 15)
+    except (TypeError, ValueError) as e:
+        return Response({'ok': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    days = (last_day - first_day).days
+    if days <= 0 or days > max_days or granularity <= 0 or work_end <= work_start:
+        return Response({
+            'ok': False,
+            'error': f'end must be 1-{max_days} days after start with valid working hours'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return {
+        'first_day': first_day,
+        'days': days,
+        'work_start': work_start,
+        'work_end': work_end,
+        'granularity': granularity,
+    }
+
+
+class PlaceTasksView(APIView):
+    """
+    把没有开始时间的任务自动放进空闲时间（贪心 + 局部搜索）
+    输入：规范化后的任务列表（duration 必填，可带 priority / deadline / windows）
+    输出：放置结果；commit=false 时只返回方案不写库
+
+    POST /api/ai/place/
+    {
+        "start": "2026-02-09",
+        "end": "2026-02-14",
+        "commit": true,
+        "tasks": [
+            {
+                "title": "Write report",
+                "duration": 120,
+                "priority": 2,
+                "deadline": "2026-02-11"
+            }
+        ]
+    }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 31
+
+    def post(self, request):
+        tasks = request.data.get('tasks', [])
+
+        if not tasks:
+            return Response({
+                'ok': False,
+                'error': 'tasks list is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        window = planning_window(request, self.max_days)
+        if isinstance(window, Response):
+            return window
+
+        commit = request.data.get('commit', True) is not False
+        try:
+            result = EventScheduler.place_tasks(user=request.user, tasks=tasks, commit=commit, **window)
+        except ScheduleError as e:
+            return Response({'ok': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        placed = [
+            {
+                'index': item['index'],
+                'event': EventSerializer(item['event']).data if commit else item['event_data'],
+            }
+            for item in result['placed']
+        ]
+        return Response({
+            'ok': len(placed) > 0,
+            'placed': placed,
+            'unplaced': result['unplaced'] or None,
+        }, status=status.HTTP_201_CREATED if commit and placed else status.HTTP_200_OK)
+
+
+class ReplanView(APIView):
+    """
+    移动一个事件，并只重排受影响的自动放置任务（其余任务保持原位）
+    输入：事件 id 与新的 date / start_time（可带 duration、version），规划窗口同 /api/ai/place/
+    输出：移动后的事件、被重排的任务、因此放不下的任务
+
+    POST /api/ai/replan/
+    {
+        "event_id": 42,
+        "date": "2026-02-10",
+        "start_time": "14:00",
+        "start": "2026-02-09",
+        "end": "2026-02-14"
+    }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 31
+
+    def post(self, request):
+        event_id = request.data.get('event_id')
+        if not event_id:
+            return Response({'ok': False, 'error': 'event_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        window = planning_window(request, self.max_days)
+        if isinstance(window, Response):
+            return window
+
+        try:
+            result = EventScheduler.move_and_replan(request.user, event_id, request.data, **window)
+        except ScheduleError as e:
+            return Response({'ok': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'ok': True,
+            'event': EventSerializer(result['event']).data,
+            'moved': EventSerializer(result['moved'], many=True).data,
+            'unplaced': EventSerializer(result['unplaced'], many=True).data or None,
+        })
+
+
 class AiDataStashView(APIView):
     """
     Store large AI payload server-side to avoid URL/sessionStorage issues.
@@ -96,6 +96,35 @@ DATABASES = {
 }
 
 
+# Caches
+# The 'events' alias holds rendered event list responses. Entries are keyed by a per-user
+# generation counter stored in the database (events.EventGeneration), so a write handled by one
+# worker process invalidates the entries every other worker holds.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'events': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'events',
+        'TIMEOUT': int(os.getenv('EVENT_LIST_CACHE_TIMEOUT', '300')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('EVENT_LIST_CACHE_MAX_ENTRIES', '5000'))},
+    },
+    # Per-event VEVENT fragments for the ICS subscription feed, keyed by (id, updated_at)
+    'feeds': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feeds',
+        'TIMEOUT': int(os.getenv('ICS_FEED_CACHE_TIMEOUT', str(7 * 24 * 3600))),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('ICS_FEED_CACHE_MAX_ENTRIES', '100000'))},
+    },
+}
+EVENT_LIST_CACHE_ALIAS = 'events'
+ICS_FEED_CACHE_ALIAS = 'feeds'
+# Larger responses (e.g. unpaginated lists of huge calendars) are not cached
+EVENT_LIST_CACHE_MAX_BYTES = int(os.getenv('EVENT_LIST_CACHE_MAX_BYTES', str(512 * 1024)))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -175,3 +204,5 @@ GOOGLE_OAUTH_SCOPES = os.getenv(
     'GOOGLE_OAUTH_SCOPES',
     'https://www.googleapis.com/auth/calendar.events',
 )
+# Public HTTPS address of the Calendar push-notification webhook (api/google/webhook/)
+GOOGLE_CALENDAR_WEBHOOK_URL = os.getenv('GOOGLE_CALENDAR_WEBHOOK_URL', '')
@@ -31,6 +31,7 @@ urlpatterns = [
     path('api/auth/', include('users.urls')),
     path('api/events/', include('events.urls')),
     path('api/caldav/', include('caldav_sync.urls')),
+    path('feeds/', include('caldav_sync.feed_urls')),
     path('', include('google_sync.urls')),
     path('api/ai/', include('ai.urls')),
 ]
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import CalendarFeedView
+
+urlpatterns = [
+    path('<str:token>.ics', CalendarFeedView.as_view()),
+]
@@ -0,0 +1,86 @@
+"""
+只读 ICS 订阅源：/feeds/<token>.ics
+
+按 chunk 从数据库流式读取事件，每个 VEVENT 片段以 (id, updated_at) 为键缓存，
+一批片段用一次 get_many / set_many 取写，未改动的事件不再经过 icalendar 序列化。
+ETag 来自 (count, max(updated_at))，Last-Modified 还会算上删除留下的墓碑变更，
+轮询客户端在没有变化时只花一次聚合查询。
+"""
+
+from __future__ import annotations
+
+from typing import Iterator
+
+from django.conf import settings
+from django.core.cache import caches
+
+from events.conditional import Validators, aggregate_validators
+from events.models import Event
+from .services import ICS_PRODID, build_vevent
+
+FEED_FIELDS = ('id', 'title', 'date', 'start_time', 'duration', 'location', 'description', 'category',
+               'caldav_uid', 'updated_at')
+CHUNK_SIZE = 1000
+
+
+def feed_cache():
+    return caches[getattr(settings, 'ICS_FEED_CACHE_ALIAS', 'default')]
+
+
+def feed_queryset(user_id: int):
+    return Event.objects.filter(user_id=user_id)
+
+
+def feed_validators(user_id: int) -> Validators:
+    return aggregate_validators(feed_queryset(user_id), 'feed', user_id)
+
+
+def event_uid(event: Event) -> str:
+    return event.caldav_uid or f'autoplan-event-{event.pk}'
+
+
+def fragment_key(event: Event) -> str:
+    return f'ics:vevent:v2:{event.pk}:{int(event.updated_at.timestamp() * 1_000_000)}'
+
+
+def render_fragments(events: list[Event]) -> list[bytes]:
+    """返回与 events 同序的 VEVENT 片段，只渲染缓存中没有的"""
+    cache = feed_cache()
+    keys = [fragment_key(event) for event in events]
+    cached = cache.get_many(keys)
+    missing = {}
+    fragments = []
+    for key, event in zip(keys, events):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = missing[key] = build_vevent(event, uid=event_uid(event)).to_ical()
+        fragments.append(fragment)
+    if missing:
+        cache.set_many(missing)
+    return fragments
+
+
+def calendar_header(name: str) -> bytes:
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{ICS_PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{name}',
+        f'X-WR-TIMEZONE:{settings.TIME_ZONE or "UTC"}',
+    ]
+    return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+
+def iter_feed(user_id: int, name: str = 'AutoPlan') -> Iterator[bytes]:
+    yield calendar_header(name)
+    chunk = []
+    rows = feed_queryset(user_id).only(*FEED_FIELDS).order_by('id').iterator(chunk_size=CHUNK_SIZE)
+    for event in rows:
+        chunk.append(event)
+        if len(chunk) >= CHUNK_SIZE:
+            yield b''.join(render_fragments(chunk))
+            chunk = []
+    if chunk:
+        yield b''.join(render_fragments(chunk))
+    yield b'END:VCALENDAR\r\n'
@@ -1,3 +1,27 @@
+import secrets
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+def generate_feed_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeedToken(models.Model):
+    """只读 ICS 订阅地址 /feeds/<token>.ics 的凭据；轮换即生成新 token，旧地址立即失效"""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='calendar_feed_token',
+    )
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'CalendarFeedToken({self.user_id})'
+
+    def rotate(self) -> None:
+        self.token = generate_feed_token()
+        self.save(update_fields=['token'])
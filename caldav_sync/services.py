@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
+from django.utils import timezone
 import fcntl
 import os
 import secrets
@@ -16,6 +17,9 @@ from icalendar import Calendar, Event as ICalEvent
 
 from events.models import Event
 
+ICS_PRODID = '-//AutoPlan AI//Smart Calendar Hub//'
+
+
 def generate_radicale_password(length: int = 32) -> str:
     # Sensitive credential; consider encrypting at rest in the future.
     token = secrets.token_urlsafe(length)
@@ -145,16 +149,16 @@ def ensure_user_calendar(username: str, password: str, calendar_name: str | None
     return calendar, calendar_url
 
 
-def build_ics(event: Event) -> str:
+def build_vevent(event: Event, uid: str | None = None) -> ICalEvent:
+    # UTC 时间（...Z）不需要 VTIMEZONE 组件；DTSTAMP 是 RFC 5545 的必填项，取最后修改时间以便片段可缓存
     tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
-    start_dt = datetime.combine(event.date, event.start_time, tzinfo=tz)
+    start_dt = datetime.combine(event.date, event.start_time, tzinfo=tz).astimezone(dt_timezone.utc)
     end_dt = start_dt + timedelta(minutes=event.duration)
 
-    cal = Calendar()
-    cal.add('prodid', '-//AutoPlan AI//Smart Calendar Hub//')
-    cal.add('version', '2.0')
-
     ical_event = ICalEvent()
+    if uid:
+        ical_event.add('uid', uid)
+    ical_event.add('dtstamp', (event.updated_at or timezone.now()).astimezone(dt_timezone.utc))
     ical_event.add('summary', event.title)
     ical_event.add('dtstart', start_dt)
     ical_event.add('dtend', end_dt)
@@ -164,8 +168,14 @@ def build_ics(event: Event) -> str:
         ical_event.add('description', event.description)
     if event.category:
         ical_event.add('categories', [event.category])
+    return ical_event
+
 
-    cal.add_component(ical_event)
+def build_ics(event: Event) -> str:
+    cal = Calendar()
+    cal.add('prodid', ICS_PRODID)
+    cal.add('version', '2.0')
+    cal.add_component(build_vevent(event))
     return cal.to_ical().decode('utf-8')
 
 
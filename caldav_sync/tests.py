@@ -1,3 +1,111 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from icalendar import Calendar
+from rest_framework.test import APIClient
+
+from events.models import Event, EventChange
+from .feeds import feed_cache, fragment_key
+from .models import CalendarFeedToken
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        feed_cache().clear()
+        self.user = get_user_model().objects.create_user('pia', password='pw')
+        self.feed = CalendarFeedToken.objects.create(user=self.user)
+        self.url = f'/feeds/{self.feed.token}.ics'
+        self.events = [
+            Event.objects.create(
+                user=self.user, title=f'Session {i}', date=date(2026, 3, 2 + i), start_time=time(9, 0),
+                duration=60, location='Room 1' if i == 0 else None,
+            )
+            for i in range(3)
+        ]
+
+    def fetch(self, **headers):
+        res = self.client.get(self.url, **headers)
+        body = b''.join(res.streaming_content).decode('utf-8') if res.status_code == 200 else ''
+        return res, body
+
+    def test_streams_every_event_as_vevent(self):
+        res, body = self.fetch()
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertIn(f'UID:autoplan-event-{self.events[0].id}', body)
+        self.assertIn('LOCATION:Room 1', body)
+
+    def test_etag_304_until_an_event_changes(self):
+        res, _ = self.fetch()
+        with self.assertNumQueries(2):  # token 查找 + 聚合
+            again, _ = self.fetch(HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        event = self.events[1]
+        event.title = 'Moved'
+        event.save()
+        changed, body = self.fetch(HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('SUMMARY:Moved', body)
+        self.assertNotIn('SUMMARY:Session 1', body)
+
+    def test_if_modified_since_sees_a_delete(self):
+        # 已有的写入挪到一小时前，删除才会落在更晚的一秒里
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Event.objects.filter(user=self.user).update(updated_at=an_hour_ago)
+        EventChange.objects.filter(user=self.user).update(created_at=an_hour_ago)
+        res, _ = self.fetch()
+        self.events[0].delete()
+        again, body = self.fetch(HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+
+    @override_settings(TIME_ZONE='America/Los_Angeles')
+    def test_times_are_utc_and_every_event_has_a_dtstamp(self):
+        _, body = self.fetch()
+        # 没有 VTIMEZONE 时不能引用 TZID
+        self.assertNotIn('TZID=', body)
+        self.assertIn('DTSTART:20260302T170000Z', body)
+        events = Calendar.from_ical(body).walk('VEVENT')
+        self.assertEqual(len(events), 3)
+        self.assertTrue(all('DTSTAMP' in event for event in events))
+
+    def test_fragments_are_cached_by_updated_at(self):
+        self.fetch()
+        cache = feed_cache()
+        self.assertIsNotNone(cache.get(fragment_key(self.events[0])))
+        cache.set(fragment_key(self.events[0]), b'BEGIN:VEVENT\r\nSUMMARY:from cache\r\nEND:VEVENT\r\n')
+        _, body = self.fetch()
+        self.assertIn('SUMMARY:from cache', body)
+
+    def test_unknown_or_rotated_token_is_404(self):
+        self.assertEqual(self.client.get('/feeds/nope.ics').status_code, 404)
+        api = APIClient()
+        api.force_authenticate(self.user)
+        new_url = api.post('/api/caldav/feed/').data['feed_url']
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(new_url).status_code, 200)
+
+    def test_warm_feed_skips_icalendar_serialization(self):
+        Event.objects.bulk_create([
+            Event(user=self.user, title=f'bulk {i}', date=date(2025, 1, 1) + timedelta(days=i % 700),
+                  start_time=time(8 + i % 10, 0), duration=30)
+            for i in range(3_000)
+        ])
+        cold, cold_body = self.fetch()
+
+        # 热请求：片段全部命中缓存，不再序列化也不回写；数据库只有 token、聚合校验值和一次流式读取
+        with mock.patch('caldav_sync.feeds.build_vevent') as build, \
+                mock.patch.object(feed_cache(), 'set_many') as set_many, \
+                self.assertNumQueries(3):
+            warm, warm_body = self.fetch()
+        build.assert_not_called()
+        set_many.assert_not_called()
+        self.assertEqual(warm_body, cold_body)
+        self.assertEqual(warm['ETag'], cold['ETag'])
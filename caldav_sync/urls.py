@@ -1,8 +1,9 @@
 from django.urls import path
 
-from .views import CalDAVLinkView, SyncEventView
+from .views import CalDAVLinkView, CalendarFeedLinkView, SyncEventView
 
 urlpatterns = [
     path('sync/', SyncEventView.as_view()),
     path('link/', CalDAVLinkView.as_view()),
+    path('feed/', CalendarFeedLinkView.as_view()),
 ]
@@ -1,9 +1,13 @@
 from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.views import View
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from events.models import Event
+from .feeds import feed_validators, iter_feed
+from .models import CalendarFeedToken
 from .services import sync_event_to_caldav
 
 
@@ -51,3 +55,41 @@ class CalDAVLinkView(APIView):
         # Standard Radicale path: /<user>/<calendar>/
         link = f"{base_url.rstrip('/')}/{profile.radicale_username}/{calendar}/"
         return Response({'caldav_url': link})
+
+
+class CalendarFeedLinkView(APIView):
+    """GET 返回（必要时创建）订阅地址；POST 轮换 token，旧地址失效"""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        feed, _ = CalendarFeedToken.objects.get_or_create(user=request.user)
+        return Response({'feed_url': self.feed_url(request, feed)})
+
+    def post(self, request):
+        feed, created = CalendarFeedToken.objects.get_or_create(user=request.user)
+        if not created:
+            feed.rotate()
+        return Response({'feed_url': self.feed_url(request, feed)})
+
+    @staticmethod
+    def feed_url(request, feed: CalendarFeedToken) -> str:
+        return request.build_absolute_uri(f'/feeds/{feed.token}.ics')
+
+
+class CalendarFeedView(View):
+    """/feeds/<token>.ics：token 即凭据，不需要登录"""
+
+    def get(self, request, token):
+        user_id = CalendarFeedToken.objects.filter(token=token).values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise Http404('Unknown feed')
+
+        validators = feed_validators(user_id)
+        not_modified = validators.not_modified_response(request)
+        if not_modified is not None:
+            return validators.apply(not_modified)
+
+        response = StreamingHttpResponse(iter_feed(user_id), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="autoplan.ics"'
+        return validators.apply(response)
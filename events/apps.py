@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """SQLite 重建 events_event 时会丢掉 FTS 触发器：每次 migrate 之后补建"""
+    from .search import ensure_sqlite_index
+    ensure_sqlite_index(using)
 
 
 class EventsConfig(AppConfig):
     name = 'events'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self, dispatch_uid='events_ensure_search_index')
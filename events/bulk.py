@@ -0,0 +1,197 @@
+"""
+批量写入：/api/events/bulk/ 一次请求完成多条 create / update / delete
+
+先用一条查询取出所有被引用的事件并逐条校验，全部通过后在同一个事务里执行：
+新建走一次 bulk_create，修改合并成一次 bulk_update，删除一条 DELETE ... WHERE id IN (...)。
+任何一条校验失败或版本冲突时整批不写入。
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .fastread import LIST_FIELDS, serialize_rows
+from .idempotency import forget_idempotency_key, make_idempotency_key
+from .models import Event
+from .serializers import EventSerializer
+from .updates import ConcurrentUpdateError, diff_event_fields
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class BulkValidationError(Exception):
+    """至少一条操作无效；results 为逐条结果（有效的条目 status 为 None）"""
+
+    def __init__(self, results: list[dict]):
+        super().__init__('Invalid bulk operations')
+        self.results = results
+
+
+def _serialize(events) -> list[dict]:
+    return serialize_rows(
+        ({name: getattr(event, name) for name in LIST_FIELDS} for event in events),
+        LIST_FIELDS,
+    )
+
+
+def _run_validation(serializer: EventSerializer, data) -> tuple[dict | None, dict | None]:
+    try:
+        return dict(serializer.run_validation(data)), None
+    except ValidationError as exc:
+        return None, exc.detail
+
+
+def _validate(operations: list, events: dict) -> tuple[list[dict], list]:
+    """
+    逐条校验，返回 (results, parsed)；parsed[i] 为 (op, event, validated_data)
+
+    新建与修改各复用一个序列化器实例：字段只构建一次，逐条只跑 run_validation
+    """
+    create_serializer = EventSerializer()
+    update_serializer = EventSerializer(partial=True)
+    results = []
+    parsed = []
+    seen_ids = set()
+    for index, item in enumerate(operations):
+        result = {'index': index, 'op': None, 'status': None}
+        results.append(result)
+        parsed.append(None)
+        if not isinstance(item, dict) or item.get('op') not in OPERATIONS:
+            result.update(status=400, errors={'op': f'must be one of {", ".join(OPERATIONS)}'})
+            continue
+        op = result['op'] = item['op']
+
+        if op == 'create':
+            data, errors = _run_validation(create_serializer, item.get('data') or {})
+            if errors:
+                result.update(status=400, errors=errors)
+                continue
+            data.pop('version', None)
+            parsed[index] = (op, None, data)
+            continue
+
+        try:
+            event_id = int(item.get('id'))
+        except (TypeError, ValueError):
+            result.update(status=400, errors={'id': 'must be an integer'})
+            continue
+        result['id'] = event_id
+        if event_id in seen_ids:
+            result.update(status=400, errors={'id': 'appears more than once in this batch'})
+            continue
+        seen_ids.add(event_id)
+        event = events.get(event_id)
+        if event is None:
+            result.update(status=404, errors={'id': 'not found'})
+            continue
+
+        if op == 'delete':
+            parsed[index] = (op, event, None)
+            continue
+        data, errors = _run_validation(update_serializer, item.get('data') or {})
+        if errors:
+            result.update(status=400, errors=errors)
+            continue
+        parsed[index] = (op, event, data)
+
+    if any(result['status'] is not None for result in results):
+        raise BulkValidationError(results)
+    return results, parsed
+
+
+def apply_operations(user, operations: list, client_key: str | None = None) -> list[dict]:
+    """
+    校验并在一个事务中执行批量操作
+
+    :param operations: [{'op': 'create', 'data': {...}}, {'op': 'update', 'id': 1, 'data': {...}},
+                        {'op': 'delete', 'id': 2}]；update 的 data 可带 version 作为期望版本
+    :param client_key: Idempotency-Key 头；第 i 条新建使用 f'{client_key}:{i}'
+    :return: 与输入同序的 [{'index', 'op', 'status', 'id', 'event'?, 'changed'?}]
+    :raises BulkValidationError: 任一条无效，整批未写入
+    :raises ConcurrentUpdateError: 任一 update 的版本不匹配，整批已回滚
+    """
+    ids = set()
+    for item in operations:
+        if isinstance(item, dict) and item.get('op') in ('update', 'delete'):
+            try:
+                ids.add(int(item.get('id')))
+            except (TypeError, ValueError):
+                pass
+    with transaction.atomic():
+        events = Event.objects.select_for_update().filter(user=user, id__in=ids).in_bulk()
+        results, parsed = _validate(operations, events)
+
+        creates = []
+        updates = []
+        deletes = []
+        for index, (op, event, data) in enumerate(parsed):
+            if op == 'create':
+                key = make_idempotency_key(user.id, data, client_key=f'{client_key}:{index}' if client_key else None)
+                creates.append((index, key, data))
+            elif op == 'update':
+                updates.append((index, event, data))
+            else:
+                deletes.append((index, event))
+
+        _apply_creates(user, creates, results)
+        _apply_updates(updates, results)
+        if deletes:
+            Event.objects.filter(user=user, id__in=[event.pk for _, event in deletes]).delete()
+            for index, event in deletes:
+                results[index]['status'] = 204
+    return results
+
+
+def _apply_creates(user, creates: list, results: list[dict]) -> None:
+    if not creates:
+        return
+    keys = list(dict.fromkeys(key for _, key, _ in creates))
+    by_key = {event.idempotency_key: event for event in Event.objects.filter(user=user, idempotency_key__in=keys)}
+    replayed = set(by_key)
+    new_events = []
+    for _, key, data in creates:
+        if key not in by_key:
+            by_key[key] = Event(user=user, idempotency_key=key, **data)
+            new_events.append(by_key[key])
+    Event.objects.bulk_create(new_events)
+
+    serialized = dict(zip(keys, _serialize(by_key[key] for key in keys)))
+    for index, key, _ in creates:
+        results[index].update(
+            # 同一批里重复的新建只有第一条是 201，其余按重放处理
+            status=200 if key in replayed else 201,
+            id=by_key[key].pk,
+            event=serialized[key],
+        )
+        replayed.add(key)
+
+
+def _apply_updates(updates: list, results: list[dict]) -> None:
+    if not updates:
+        return
+    now = timezone.now()
+    dirty = []
+    fields: set[str] = set()
+    for index, event, data in updates:
+        expected = data.pop('version', None)
+        if expected is not None and int(expected) != event.version:
+            raise ConcurrentUpdateError(event.pk, int(expected))
+        changed = diff_event_fields(event, data)
+        for name, value in changed.items():
+            setattr(event, name, value)
+        if changed:
+            event.version += 1
+            event.updated_at = now
+            dirty.append(event)
+            fields.update(changed)
+            if forget_idempotency_key(event, changed):
+                fields.add('idempotency_key')
+        results[index].update(status=200, changed=sorted(changed))
+    if dirty:
+        Event.objects.bulk_update(dirty, sorted(fields) + ['version', 'updated_at'])
+
+    serialized = _serialize(event for _, event, _ in updates)
+    for (index, _, _), data in zip(updates, serialized):
+        results[index]['event'] = data
@@ -0,0 +1,127 @@
+"""
+按用户分代的事件列表缓存：缓存渲染好的 JSON 响应体及其 ETag / Last-Modified
+
+键为 events:<namespace>:<user>:<generation>:<查询参数摘要>（namespace 区分列表、汇总等端点）。
+generation 是数据库里按用户只增不减的计数器（EventGeneration）：任何写入（EventChange.record*，即
+save/delete 信号、update_event_fields 与 bulk 路径）都在同一事务里把它加一，旧条目不再被引用，
+随 TIMEOUT / MAX_ENTRIES 淘汰。条目放在进程内缓存，generation 却来自所有 worker 共享的数据库
+（一次主键查询），写入提交后每个 worker 立刻换用新一代。
+未命中时用 cache.add 抢一个短锁，只有一个请求回源，其余请求短暂等待结果（防击穿）。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import EventGeneration
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: datetime | None
+
+
+class EventListCache:
+    lock_timeout = 10
+    wait_timeout = 2.0
+    wait_interval = 0.02
+
+    def __init__(self, alias: str | None = None):
+        self._alias = alias
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self._alias or getattr(settings, 'EVENT_LIST_CACHE_ALIAS', 'default')]
+
+    @property
+    def max_bytes(self) -> int:
+        return getattr(settings, 'EVENT_LIST_CACHE_MAX_BYTES', 512 * 1024)
+
+    # ---- generation ----
+
+    def generation(self, user_id: int) -> int:
+        return EventGeneration.current(user_id)
+
+    # ---- 读写 ----
+
+    def key(self, user_id: int, params, namespace: str = 'list') -> str:
+        digest = hashlib.md5(repr(sorted(params.lists())).encode('utf-8'), usedforsecurity=False).hexdigest()
+        return f'events:{namespace}:{user_id}:{self.generation(user_id)}:{digest}'
+
+    def get_or_build(
+        self,
+        user_id: int,
+        params,
+        build: Callable[[], CachedResponse],
+        namespace: str = 'list',
+    ) -> tuple[CachedResponse, bool]:
+        """
+        :param params: request.query_params
+        :param build: 未命中时生成 CachedResponse
+        :return: (entry, hit)
+        """
+        key = self.key(user_id, params, namespace)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self._count(hit=True)
+            return entry, True
+
+        lock_key = f'{key}:lock'
+        if not self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+            deadline = time.monotonic() + self.wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.wait_interval)
+                entry = self.cache.get(key)
+                if entry is not None:
+                    self._count(hit=True)
+                    return entry, True
+            # 持锁请求太慢或失败：自己回源，但不再写缓存
+            self._count(hit=False)
+            return build(), False
+
+        try:
+            self._count(hit=False)
+            entry = build()
+            if len(entry.body) <= self.max_bytes:
+                self.cache.set(key, entry)
+            return entry, False
+        finally:
+            self.cache.delete(lock_key)
+
+    # ---- 指标 ----
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': round(self.hit_ratio, 4)}
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+
+event_list_cache = EventListCache()
@@ -0,0 +1,138 @@
+"""
+增量同步：/api/events/changes/?since=<token> 返回游标之后新建/修改/删除的事件
+
+令牌是 base64 编码的 [最后一条变更 id, 签发时间]。变更日志按 (user, id) 索引顺序读取，
+同一事件的多次变更只返回最终状态，响应大小只与变更数量成正比。
+墓碑保留 EVENT_CHANGES_RETENTION_DAYS 天；签发时间更早的令牌已无法保证看到所有删除，返回 410 要求全量同步。
+
+游标只有在变更 id 按提交顺序可见时才不会漏行。SQLite 同一时刻只有一个写事务，成立；
+PostgreSQL / MySQL 的自增 id 在插入时分配，小 id 的事务可能晚提交，读者已越过它就永远看不到。
+所以令牌不越过最近 EVENT_CHANGES_COMMIT_LAG_SECONDS 秒内写入的变更：这些行照常返回，
+下次请求会再读一遍（结果是最终状态，重复无害）。SQLite 上默认 0，其他数据库默认 10 秒；
+比这更长的写事务仍可能被漏掉。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .fastread import LIST_FIELDS, serialize_rows
+from .models import Event, EventChange
+
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_COMMIT_LAG_SECONDS = 10
+
+
+class ChangeTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Change token has expired; fetch the full event list and start again from since=0.'
+    default_code = 'token_expired'
+
+
+def retention() -> timedelta:
+    return timedelta(days=getattr(settings, 'EVENT_CHANGES_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+
+
+def commit_lag() -> timedelta:
+    """令牌不越过的时间窗口；SQLite 写事务串行，id 顺序即提交顺序"""
+    default = 0 if connection.vendor == 'sqlite' else DEFAULT_COMMIT_LAG_SECONDS
+    return timedelta(seconds=getattr(settings, 'EVENT_CHANGES_COMMIT_LAG_SECONDS', default))
+
+
+def encode_token(change_id: int, issued_at: int) -> str:
+    raw = json.dumps([change_id, issued_at], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token: str | None) -> tuple[int, int | None]:
+    """since 缺省或为 0 时从头开始（全量），返回 (change_id, issued_at)"""
+    if not token or token == '0':
+        return 0, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        change_id, issued_at = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return int(change_id), int(issued_at)
+    except (TypeError, ValueError):
+        raise NotFound('Invalid change token')
+
+
+def changes_since(user, token: str | None, limit: int = 500) -> dict:
+    """
+    读取 token 之后最多 limit 条变更
+
+    :return: {'changed': [...与列表相同结构...], 'deleted': [id, ...], 'token': str, 'has_more': bool}
+    :raises ChangeTokenExpired: 令牌早于墓碑保留期
+    """
+    since, issued_at = decode_token(token)
+    now = int(time.time())
+    if issued_at is not None and issued_at < now - retention().total_seconds():
+        raise ChangeTokenExpired()
+
+    rows = list(
+        EventChange.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'event_id', 'kind', 'created_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, event_id, kind, _ in rows:
+        latest[event_id] = kind
+    upserted = [event_id for event_id, kind in latest.items() if kind == EventChange.UPSERT]
+
+    changed = serialize_rows(
+        Event.objects.filter(user=user, id__in=upserted).order_by('id').values(*LIST_FIELDS),
+        LIST_FIELDS,
+    )
+    # 在本页之后又被删除的事件：行已不存在，删除变更会在后续页再出现一次
+    present = {item['id'] for item in changed}
+    deleted = sorted(
+        event_id for event_id, kind in latest.items()
+        if kind == EventChange.DELETE or event_id not in present
+    )
+
+    # 游标停在窗口内第一条变更之前：更早分配、尚未提交的 id 下次还能读到
+    settled_before = timezone.now() - commit_lag()
+    last_id = since
+    for change_id, _, _, created_at in rows:
+        if created_at > settled_before:
+            break
+        last_id = change_id
+    if has_more and last_id == since:
+        # 整页都在窗口内：不前进的话翻页会原地打转
+        last_id = rows[-1][0]
+    # 还没追上时沿用原签发时间，避免翻页途中错过即将过期的墓碑
+    next_issued = (issued_at or now) if has_more else now
+    return {
+        'changed': changed,
+        'deleted': deleted,
+        'token': encode_token(last_id, next_issued),
+        'has_more': has_more,
+    }
+
+
+def compact_changes(now=None) -> tuple[int, int]:
+    """
+    删除被同一事件后续变更覆盖的行，以及超过保留期的墓碑
+
+    :return: (被覆盖的行数, 过期墓碑数)
+    """
+    now = now or timezone.now()
+    later = EventChange.objects.filter(event_id=OuterRef('event_id'), id__gt=OuterRef('id'))
+    superseded, _ = EventChange.objects.filter(Exists(later)).delete()
+    expired, _ = EventChange.objects.filter(
+        kind=EventChange.DELETE,
+        created_at__lt=now - retention(),
+    ).delete()
+    return superseded, expired
@@ -0,0 +1,79 @@
+"""
+条件 GET：为事件列表与详情计算廉价的 ETag / Last-Modified
+
+列表的校验值来自一次聚合查询 (count, max(updated_at), 最新一条 EventChange 的时间)，走 (user, updated_at)
+与 (user, id) 索引，不会取出任何事件行。删除不会推进 max(updated_at)，但会追加墓碑变更，
+所以 Last-Modified 取两者中较晚的一个，只带 If-Modified-Since 的客户端也能看到删除；查询参数（范围、字段、游标）也参与 ETag，不同视图互不混淆。
+详情的校验值是 (id, version, updated_at)。命中 If-None-Match / If-Modified-Since 时直接返回 304。
+"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import EventChange
+
+# 浏览器每次都要回源校验，但可以复用本地副本
+CACHE_CONTROL = 'private, no-cache'
+
+
+class Validators:
+    def __init__(self, etag: str, last_modified: datetime | None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def last_modified_timestamp(self) -> int | None:
+        return int(self.last_modified.timestamp()) if self.last_modified else None
+
+    def not_modified_response(self, request):
+        """条件满足时返回 304（或 412），否则返回 None"""
+        return get_conditional_response(
+            request,
+            etag=self.etag,
+            last_modified=self.last_modified_timestamp,
+        )
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified_timestamp)
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+def aggregate_validators(queryset, prefix: str, user_id: int, *salt) -> Validators:
+    """
+    (count, max(updated_at), 该用户最新变更时间) 加上 salt 的摘要
+
+    修改会推进 max(updated_at)，删除只会留下墓碑变更，所以 Last-Modified 取两者中较晚的一个。
+    """
+    latest_change = EventChange.objects.filter(user_id=user_id).order_by('-id').values('created_at')[:1]
+    stats = queryset.order_by().aggregate(
+        count=Count('id'), last=Max('updated_at'), changed=Max(Subquery(latest_change)),
+    )
+    last = max(filter(None, (stats['last'], stats['changed'])), default=None)
+    raw = ':'.join([*(str(part) for part in (user_id, *salt)), str(stats['count']), last.isoformat() if last else ''])
+    digest = hashlib.md5(raw.encode('utf-8'), usedforsecurity=False).hexdigest()
+    return Validators(quote_etag(f'{prefix}-{digest}'), last)
+
+
+def list_validators(queryset, request) -> Validators:
+    return aggregate_validators(queryset, 'list', request.user.id, sorted(request.query_params.lists()))
+
+
+def detail_validators(queryset, pk) -> Validators | None:
+    """事件不存在或 pk 不合法时返回 None，交给 get_object() 给出 404"""
+    try:
+        row = queryset.filter(pk=pk).values_list('version', 'updated_at').first()
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+    version, updated_at = row
+    return Validators(quote_etag(f'event-{pk}-{version}-{int(updated_at.timestamp() * 1_000_000)}'), updated_at)
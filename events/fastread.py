@@ -0,0 +1,88 @@
+"""
+事件列表的轻量读路径：绕过 ModelSerializer，直接从 values() 行生成 JSON bytes
+
+EventSerializer 对每一行都要构造模型实例、逐字段调用 get_attribute/to_representation，
+列表响应的大部分 CPU 都花在这里。这里只格式化日期/时间列（时区与格式按 DRF 字段配置），
+其余列本身就是 JSON 原生类型，原样输出。
+支持稀疏字段：?fields=id,title,date
+"""
+
+from __future__ import annotations
+
+import json
+
+from django.db.models import DateField, DateTimeField, TimeField
+from rest_framework import ISO_8601
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from .models import Event
+from .serializers import EventSerializer
+
+LIST_FIELDS = tuple(EventSerializer.Meta.fields)
+
+
+def parse_fields(raw: str | None) -> tuple[str, ...]:
+    """解析 ?fields=，保持 EventSerializer 的字段顺序"""
+    if not raw:
+        return LIST_FIELDS
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(LIST_FIELDS)
+    if unknown:
+        raise ValidationError({'fields': f'unknown fields: {", ".join(sorted(unknown))}'})
+    return tuple(name for name in LIST_FIELDS if name in requested)
+
+
+def _iso_datetime(field_timezone):
+    def fmt(value):
+        text = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return fmt
+
+
+def _iso(value):
+    return value.isoformat()
+
+
+def row_formatters(fields: tuple[str, ...]) -> list:
+    """
+    每个字段一个格式化函数，其余为 None（原样输出）
+    ISO 8601 格式且带时区时直接 isoformat（与 DRF 结果相同）；自定义格式回退到 DRF 字段
+    """
+    serializer_fields = EventSerializer().fields
+    formatters = []
+    for name in fields:
+        model_field = Event._meta.get_field(name)
+        field = serializer_fields[name]
+        fmt = None
+        if isinstance(model_field, DateTimeField):
+            field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+            iso = getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+            fmt = _iso_datetime(field_timezone) if iso and field_timezone is not None else field.to_representation
+        elif isinstance(model_field, DateField):
+            iso = getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601
+            fmt = _iso if iso else field.to_representation
+        elif isinstance(model_field, TimeField):
+            iso = getattr(field, 'format', api_settings.TIME_FORMAT) == ISO_8601
+            fmt = _iso if iso else field.to_representation
+        formatters.append(fmt)
+    return formatters
+
+
+def serialize_rows(rows, fields: tuple[str, ...]) -> list[dict]:
+    """把 values() 行转换为与 EventSerializer 相同结构的 dict 列表"""
+    formatters = list(zip(fields, row_formatters(fields)))
+    out = []
+    for row in rows:
+        item = {}
+        for name, fmt in formatters:
+            value = row[name]
+            item[name] = fmt(value) if fmt is not None and value is not None else value
+        out.append(item)
+    return out
+
+
+def render_json(data) -> bytes:
+    """与 DRF JSONRenderer 相同的 ensure_ascii / 分隔符设置"""
+    separators = (',', ':') if api_settings.COMPACT_JSON else (', ', ': ')
+    return json.dumps(data, ensure_ascii=not api_settings.UNICODE_JSON, separators=separators).encode('utf-8')
@@ -0,0 +1,179 @@
+"""
+Free/busy 计算：把 Event 行转换为整数分钟区间，合并后求空闲时段并生成候选时间
+
+所有区间都以窗口起始日 00:00（settings.TIME_ZONE 本地时间）为原点、以分钟为单位，
+用 array('q') 存储起止点；合并只需一次排序和一次线性扫描，多人、长窗口同样适用。
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Sequence
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+from .models import Event
+
+MINUTES_PER_DAY = 1440
+
+
+@dataclass
+class FreeSlot:
+    start: datetime
+    end: datetime
+    score: int
+
+
+def merge_intervals(starts: Sequence[int], ends: Sequence[int]) -> tuple[array, array]:
+    """合并重叠/相接的区间，返回按起点排序的不相交区间"""
+    order = sorted(range(len(starts)), key=starts.__getitem__)
+    merged_starts = array('q')
+    merged_ends = array('q')
+    for i in order:
+        s, e = starts[i], ends[i]
+        if e <= s:
+            continue
+        if merged_ends and s <= merged_ends[-1]:
+            if e > merged_ends[-1]:
+                merged_ends[-1] = e
+        else:
+            merged_starts.append(s)
+            merged_ends.append(e)
+    return merged_starts, merged_ends
+
+
+def invert_intervals(
+    starts: Sequence[int],
+    ends: Sequence[int],
+    window_start: int,
+    window_end: int,
+) -> tuple[array, array]:
+    """求已合并区间在 [window_start, window_end) 内的补集"""
+    free_starts = array('q')
+    free_ends = array('q')
+    cursor = window_start
+    for s, e in zip(starts, ends):
+        if e <= cursor:
+            continue
+        if s >= window_end:
+            break
+        if s > cursor:
+            free_starts.append(cursor)
+            free_ends.append(s)
+        cursor = max(cursor, e)
+    if cursor < window_end:
+        free_starts.append(cursor)
+        free_ends.append(window_end)
+    return free_starts, free_ends
+
+
+def off_hours_intervals(
+    days: int,
+    work_start: time,
+    work_end: time,
+    weekdays: Iterable[int],
+    first_day: date,
+) -> tuple[array, array]:
+    """把非工作时间（含非工作日）表示为忙碌区间"""
+    allowed = set(weekdays)
+    open_min = work_start.hour * 60 + work_start.minute
+    close_min = work_end.hour * 60 + work_end.minute
+    starts = array('q')
+    ends = array('q')
+    for day in range(days):
+        base = day * MINUTES_PER_DAY
+        if (first_day + timedelta(days=day)).weekday() not in allowed:
+            starts.append(base)
+            ends.append(base + MINUTES_PER_DAY)
+            continue
+        if open_min > 0:
+            starts.append(base)
+            ends.append(base + open_min)
+        if close_min < MINUTES_PER_DAY:
+            starts.append(base + close_min)
+            ends.append(base + MINUTES_PER_DAY)
+    return starts, ends
+
+
+def busy_intervals_for_users(user_ids: Sequence[int], first_day: date, days: int) -> tuple[array, array]:
+    """一次查询取出所有用户与窗口相交的事件（starts_at/ends_at 索引范围扫描），转换为本地分钟区间（不合并）"""
+    tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+    window_start = datetime.combine(first_day, time(0, 0), tzinfo=tz)
+    window_end = datetime.combine(first_day + timedelta(days=days), time(0, 0), tzinfo=tz)
+    starts = array('q')
+    ends = array('q')
+    rows = Event.objects.filter(user_id__in=user_ids).overlapping(window_start, window_end).values_list(
+        'starts_at', 'ends_at'
+    )
+    for starts_at, ends_at in rows.iterator():
+        starts.append(_local_minutes(starts_at, first_day, tz))
+        ends.append(_local_minutes(ends_at, first_day, tz))
+    return starts, ends
+
+
+def _local_minutes(instant: datetime, first_day: date, tz: ZoneInfo) -> int:
+    """UTC 时刻 → 相对 first_day 00:00 的本地挂钟分钟数（与工作时间同一坐标系）"""
+    local = instant.astimezone(tz)
+    return (local.date() - first_day).days * MINUTES_PER_DAY + local.hour * 60 + local.minute
+
+
+def candidate_slots(
+    free_starts: Sequence[int],
+    free_ends: Sequence[int],
+    duration: int,
+    granularity: int,
+) -> list[tuple[int, int, int]]:
+    """
+    在每个空闲区间内按粒度对齐生成候选 (start, end, score)
+
+    score 为放入该时段后两侧剩下、但已不足以再容纳一次同长会议的碎片分钟数，
+    越小越好：紧贴已有日程的时段排在前面。
+    """
+    slots = []
+    for fs, fe in zip(free_starts, free_ends):
+        first = -(-fs // granularity) * granularity
+        slot_start = first
+        while slot_start + duration <= fe:
+            before = slot_start - fs
+            after = fe - (slot_start + duration)
+            score = (before if before < duration else 0) + (after if after < duration else 0)
+            slots.append((slot_start, slot_start + duration, score))
+            slot_start += granularity
+    return slots
+
+
+def find_free_slots(
+    user_ids: Sequence[int],
+    first_day: date,
+    days: int,
+    duration: int,
+    work_start: time = time(9, 0),
+    work_end: time = time(18, 0),
+    granularity: int = 30,
+    weekdays: Iterable[int] = (0, 1, 2, 3, 4),
+    limit: int = 20,
+) -> list[FreeSlot]:
+    """计算所有用户同时空闲、满足时长的候选时段，按 score、时间排序"""
+    busy_starts, busy_ends = busy_intervals_for_users(user_ids, first_day, days)
+    off_starts, off_ends = off_hours_intervals(days, work_start, work_end, weekdays, first_day)
+    busy_starts.extend(off_starts)
+    busy_ends.extend(off_ends)
+
+    merged_starts, merged_ends = merge_intervals(busy_starts, busy_ends)
+    free_starts, free_ends = invert_intervals(merged_starts, merged_ends, 0, days * MINUTES_PER_DAY)
+    slots = candidate_slots(free_starts, free_ends, duration, granularity)
+    slots.sort(key=lambda slot: (slot[2], slot[0]))
+
+    tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+    origin = datetime.combine(first_day, time(0, 0), tzinfo=tz)
+    return [
+        FreeSlot(
+            start=origin + timedelta(minutes=s),
+            end=origin + timedelta(minutes=e),
+            score=score,
+        )
+        for s, e, score in slots[:limit]
+    ]
@@ -0,0 +1,53 @@
+"""
+幂等键：同一用户重复提交同一事件（重试、双击、任务重跑）时返回已有事件而不是再写一行
+
+客户端可通过 Idempotency-Key 头显式指定（AI 排程则用 normalized_data 中的 idempotency_key）；
+否则使用规范化字段 + 用户 id 的内容哈希。两种键都会再做一次 sha256，长度固定为 64。
+事件内容被修改后键随之清空：之后重放原请求会新建事件，而不是返回已改过的那一条。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Mapping
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+# 参与内容哈希的字段；集成字段（caldav/google）与时间戳不影响事件“是否相同”
+HASHED_FIELDS = (
+    'title',
+    'date',
+    'start_time',
+    'duration',
+    'location',
+    'description',
+    'participants',
+    'reminder',
+    'category',
+)
+
+
+def _canonical(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def make_idempotency_key(user_id: int, payload: Mapping[str, Any], client_key: str | None = None) -> str:
+    if client_key:
+        raw = f'{user_id}:client:{client_key}'
+    else:
+        canonical = {name: _canonical(payload.get(name)) for name in HASHED_FIELDS}
+        raw = f'{user_id}:content:' + json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def forget_idempotency_key(event, changed_fields) -> bool:
+    """内容字段有变化时清空 event 的幂等键；返回 True 表示 idempotency_key 需要一并写库"""
+    if event.idempotency_key is None or not set(changed_fields) & set(HASHED_FIELDS):
+        return False
+    event.idempotency_key = None
+    return True
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from events.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = 'Compact the event change log: drop superseded rows and expired tombstones'
+
+    def handle(self, *args, **options):
+        superseded, expired = compact_changes()
+        self.stdout.write(f'Removed {superseded} superseded change(s) and {expired} expired tombstone(s)')
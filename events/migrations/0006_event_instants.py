@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:52
+
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_instants(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+    batch = []
+    for event in Event.objects.only('id', 'date', 'start_time', 'duration').iterator(chunk_size=2000):
+        event.starts_at = datetime.combine(event.date, event.start_time, tzinfo=tz).astimezone(timezone.utc)
+        event.ends_at = event.starts_at + timedelta(minutes=event.duration)
+        batch.append(event)
+        if len(batch) >= 2000:
+            Event.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+            batch = []
+    if batch:
+        Event.objects.bulk_update(batch, ['starts_at', 'ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_instants, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', 'ends_at', 'starts_at'], name='event_user_ends_starts_idx'),
+        ),
+    ]
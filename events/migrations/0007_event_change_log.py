@@ -0,0 +1,44 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_changes(apps, schema_editor):
+    """已有事件各记一条 upsert，since=0 即可拿到完整状态"""
+    Event = apps.get_model('events', 'Event')
+    EventChange = apps.get_model('events', 'EventChange')
+    batch = []
+    for event_id, user_id in Event.objects.order_by('id').values_list('id', 'user_id').iterator(chunk_size=2000):
+        batch.append(EventChange(user_id=user_id, event_id=event_id, kind='upsert'))
+        if len(batch) >= 2000:
+            EventChange.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        EventChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_instants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='eventchange_user_id_idx'), models.Index(fields=['event_id', 'id'], name='eventchange_event_id_idx'), models.Index(fields=['kind', 'created_at'], name='eventchange_kind_created_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:10
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    # trigram 分词按字符切分，中日韩文本无需分词器即可做子串匹配
+    """
+    CREATE VIRTUAL TABLE events_event_fts USING fts5(
+        title, description, location, participants,
+        content='events_event', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER events_event_fts_ai AFTER INSERT ON events_event BEGIN
+        INSERT INTO events_event_fts(rowid, title, description, location, participants)
+        VALUES (new.id, new.title, new.description, new.location, new.participants);
+    END
+    """,
+    """
+    CREATE TRIGGER events_event_fts_ad AFTER DELETE ON events_event BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location, participants)
+        VALUES ('delete', old.id, old.title, old.description, old.location, old.participants);
+    END
+    """,
+    """
+    CREATE TRIGGER events_event_fts_au AFTER UPDATE OF title, description, location, participants ON events_event
+    BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location, participants)
+        VALUES ('delete', old.id, old.title, old.description, old.location, old.participants);
+        INSERT INTO events_event_fts(rowid, title, description, location, participants)
+        VALUES (new.id, new.title, new.description, new.location, new.participants);
+    END
+    """,
+    "INSERT INTO events_event_fts(events_event_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS events_event_fts_au',
+    'DROP TRIGGER IF EXISTS events_event_fts_ad',
+    'DROP TRIGGER IF EXISTS events_event_fts_ai',
+    'DROP TABLE IF EXISTS events_event_fts',
+]
+
+# 表达式索引随行更新，不需要触发器；pg_trgm 索引负责中日韩与短词的子串匹配
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX events_event_search_tsv_idx ON events_event USING gin (
+        to_tsvector('simple',
+            coalesce(title, '') || ' ' || coalesce(description, '') || ' ' ||
+            coalesce(location, '') || ' ' || coalesce(participants, ''))
+    )
+    """,
+    """
+    CREATE INDEX events_event_search_trgm_idx ON events_event USING gin (
+        (coalesce(title, '') || ' ' || coalesce(description, '') || ' ' ||
+         coalesce(location, '') || ' ' || coalesce(participants, '')) gin_trgm_ops
+    )
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS events_event_search_trgm_idx',
+    'DROP INDEX IF EXISTS events_event_search_tsv_idx',
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        statements = statements_by_vendor.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='google_sync_fingerprint',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
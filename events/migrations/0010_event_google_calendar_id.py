@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+def link_existing_to_primary(apps, schema_editor):
+    # 之前的推送和拉取都只用 primary 日历
+    Event = apps.get_model('events', 'Event')
+    Event.objects.filter(google_event_id__isnull=False).update(google_calendar_id='primary')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_google_sync_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='google_calendar_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(link_existing_to_primary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0010_event_google_calendar_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='placement',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,53 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from time import time_ns
+from zoneinfo import ZoneInfo
+
 from django.conf import settings
 from django.db import models
+from django.dispatch import Signal
+
+
+# 决定 starts_at / ends_at 的字段
+INSTANT_SOURCE_FIELDS = ('date', 'start_time', 'duration')
+# 只供同步内部使用、不出现在 API 中的字段：只写这些字段时不记录变更
+UNTRACKED_FIELDS = frozenset({'google_sync_fingerprint', 'placement'})
+
+
+def event_instants(event_date: date, start_time: time, duration: int) -> tuple[datetime, datetime]:
+    """把 settings.TIME_ZONE 下的本地日期+时间+时长转换为 UTC 起止时刻（按真实经过的分钟计算，跨 DST 正确）"""
+    tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+    starts_at = datetime.combine(event_date, start_time, tzinfo=tz).astimezone(dt_timezone.utc)
+    return starts_at, starts_at + timedelta(minutes=duration)
+
+
+# EventChange.record / record_for 写入变更后（同一事务内）发送，每个用户一次；参数 user_id、event_ids、kind
+event_changes_recorded = Signal()
+
+
+class EventQuerySet(models.QuerySet):
+    def overlapping(self, start: datetime, end: datetime):
+        """与 [start, end) 相交的事件；ends_at 打头的索引让这成为一次范围扫描"""
+        return self.filter(ends_at__gt=start, starts_at__lt=end)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.compute_instants()
+        created = super().bulk_create(objs, *args, **kwargs)
+        # ignore_conflicts 时后端不返回主键，调用方需自行记录变更
+        EventChange.record_for(created, EventChange.UPSERT)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        if set(fields) & set(INSTANT_SOURCE_FIELDS):
+            for obj in objs:
+                obj.compute_instants()
+            fields = list(fields) + ['starts_at', 'ends_at']
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if not set(fields) <= UNTRACKED_FIELDS:
+            EventChange.record_for(objs, EventChange.UPSERT)
+        return rows
 
 
 class Event(models.Model):
@@ -29,11 +77,151 @@ class Event(models.Model):
     caldav_uid = models.CharField(max_length=255, blank=True, null=True)
     caldav_href = models.CharField(max_length=512, blank=True, null=True)
     google_event_id = models.CharField(max_length=255, blank=True, null=True)
+    # google_event_id 所在的 Google 日历；全量拉取只对账这个日历下的事件
+    google_calendar_id = models.CharField(max_length=255, blank=True, null=True, editable=False)
+    # 上次成功同步到 Google 的请求体：每个顶层字段的短哈希，用于跳过无变化的更新、只 PATCH 变化的字段
+    google_sync_fingerprint = models.JSONField(blank=True, null=True, editable=False)
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    # 自动放置的任务保存其约束（priority / deadline / earliest / windows）；非空表示其他事件移动时可被重排
+    placement = models.JSONField(blank=True, null=True, editable=False)
+    version = models.PositiveIntegerField(default=1, help_text='Incremented on every update')
+    # 由 date + start_time + duration 派生的 UTC 时刻，所有写路径都会维护
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False)
+    ends_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 日期范围 / 冲突 / free-busy 查询
+            models.Index(fields=['user', 'date', 'start_time'], name='event_user_date_start_idx'),
+            # EventViewSet 默认排序与 keyset 分页 (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='event_user_created_id_idx'),
+            # 同步回写时按远端 id 查找
+            models.Index(fields=['user', 'google_event_id'], name='event_user_google_id_idx'),
+            # 增量读取（updated_at 之后的变更）
+            models.Index(fields=['user', 'updated_at'], name='event_user_updated_idx'),
+            # 重叠查询 ends_at > a AND starts_at < b
+            models.Index(fields=['user', 'ends_at', 'starts_at'], name='event_user_ends_starts_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                name='event_user_idempotency_key_uniq',
+            ),
+        ]
+
     def __str__(self) -> str:
         return f'{self.title} ({self.date} {self.start_time})'
 
-# Create your models here.
+    def compute_instants(self) -> None:
+        if self.date is None or self.start_time is None or self.duration is None:
+            return
+        event_date = date.fromisoformat(self.date) if isinstance(self.date, str) else self.date
+        start_time = time.fromisoformat(self.start_time) if isinstance(self.start_time, str) else self.start_time
+        self.starts_at, self.ends_at = event_instants(event_date, start_time, int(self.duration))
+
+    def save(self, *args, **kwargs):
+        self.compute_instants()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(INSTANT_SOURCE_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'starts_at', 'ends_at'}
+        super().save(*args, **kwargs)
+
+
+class EventChange(models.Model):
+    """
+    事件变更日志：每次写入追加一行，自增 id 即增量同步的单调游标
+
+    event_id 不是外键，事件删除后这一行作为墓碑保留；
+    compact_event_changes 命令会删掉被同一事件更新的变更覆盖的行，并清理过期墓碑。
+    """
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    KIND_CHOICES = [
+        (UPSERT, 'Created or updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='event_changes',
+    )
+    event_id = models.BigIntegerField()
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # /api/events/changes/?since= 的范围扫描
+            models.Index(fields=['user', 'id'], name='eventchange_user_id_idx'),
+            # 压缩时查找同一事件的后续变更
+            models.Index(fields=['event_id', 'id'], name='eventchange_event_id_idx'),
+            # 过期墓碑清理
+            models.Index(fields=['kind', 'created_at'], name='eventchange_kind_created_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.kind} event {self.event_id} (#{self.pk})'
+
+    # 所有事件写路径都经过 record / record_for，顺带推进该用户列表缓存的 generation
+
+    @classmethod
+    def record(cls, user_id: int, event_ids, kind: str) -> None:
+        event_ids = list(event_ids)
+        cls.objects.bulk_create([cls(user_id=user_id, event_id=event_id, kind=kind) for event_id in event_ids])
+        EventGeneration.bump([user_id])
+        event_changes_recorded.send(sender=cls, user_id=user_id, event_ids=event_ids, kind=kind)
+
+    @classmethod
+    def record_for(cls, events, kind: str) -> None:
+        """为一批已落库的事件记录变更（跳过没有主键的对象）"""
+        changes = [
+            cls(user_id=event.user_id, event_id=event.pk, kind=kind)
+            for event in events
+            if event.pk is not None
+        ]
+        cls.objects.bulk_create(changes)
+        by_user: dict[int, list[int]] = {}
+        for change in changes:
+            by_user.setdefault(change.user_id, []).append(change.event_id)
+        EventGeneration.bump(by_user)
+        for user_id, event_ids in by_user.items():
+            event_changes_recorded.send(sender=cls, user_id=user_id, event_ids=event_ids, kind=kind)
+
+
+class EventGeneration(models.Model):
+    """
+    每个用户的事件列表缓存代数，只增不减
+
+    与写入在同一事务里加一，提交后所有 worker 都读到新值；新行从当前纳秒时间戳起步，
+    用户被删除重建或事务回滚后也不会回到某个旧缓存条目用过的值。
+    """
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    value = models.BigIntegerField()
+
+    @classmethod
+    def current(cls, user_id: int) -> int:
+        value = cls.objects.filter(user_id=user_id).values_list('value', flat=True).first()
+        if value is None:
+            cls.objects.bulk_create([cls(user_id=user_id, value=time_ns())], ignore_conflicts=True)
+            value = cls.objects.filter(user_id=user_id).values_list('value', flat=True).first()
+        return value
+
+    @classmethod
+    def bump(cls, user_ids) -> None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        if cls.objects.filter(user_id__in=user_ids).update(value=models.F('value') + 1) < len(user_ids):
+            existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, value=time_ns()) for user_id in user_ids - existing],
+                ignore_conflicts=True,
+            )
@@ -0,0 +1,107 @@
+"""
+NDJSON 导出 / 导入：每行一个事件，字段与列表接口相同
+
+导出用服务端迭代器按 chunk 读取 values() 行并逐块输出，内存占用与事件总数无关。
+导入逐行解析请求流，每 chunk_size 条有效事件一个事务（内容哈希幂等键，重复导入不会产生重复事件），
+每提交一个 chunk 输出一行进度。
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Iterable, Iterator
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer
+
+from .fastread import LIST_FIELDS, serialize_rows
+from .idempotency import make_idempotency_key
+from .models import Event
+from .serializers import EventSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+
+
+class NDJSONRenderer(BaseRenderer):
+    """只用于内容协商：视图直接返回流式响应"""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _lines(items: list[dict]) -> bytes:
+    return ''.join(json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n' for item in items).encode('utf-8')
+
+
+def iter_export(user_id: int) -> Iterator[bytes]:
+    rows = Event.objects.filter(user_id=user_id).order_by('id').values(*LIST_FIELDS)
+    chunk = []
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield _lines(serialize_rows(chunk, LIST_FIELDS))
+            chunk = []
+    if chunk:
+        yield _lines(serialize_rows(chunk, LIST_FIELDS))
+
+
+def _write_chunk(user, chunk: list[tuple[str, dict]]) -> int:
+    """一个事务写入一个 chunk，返回新建数量（已存在的幂等键跳过）"""
+    keys = [key for key, _ in chunk]
+    with transaction.atomic():
+        existing = set(Event.objects.filter(user=user, idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+        new_events = {}
+        for key, data in chunk:
+            if key not in existing and key not in new_events:
+                new_events[key] = Event(user=user, idempotency_key=key, **data)
+        Event.objects.bulk_create(new_events.values())
+    return len(new_events)
+
+
+def iter_import(user, lines: Iterable[bytes], chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    逐行导入，每提交一个 chunk 产出一行进度：
+    {"line": 已读行数, "created": n, "skipped": n, "failed": n}；最后一行额外带 "done": true 与 "errors"
+    """
+    serializer = EventSerializer()
+    progress = {'line': 0, 'created': 0, 'skipped': 0, 'failed': 0}
+    errors = []
+    chunk: list[tuple[str, dict]] = []
+
+    def flush():
+        created = _write_chunk(user, chunk)
+        progress['created'] += created
+        progress['skipped'] += len(chunk) - created
+        chunk.clear()
+        return _lines([progress])
+
+    for number, raw in enumerate(lines, start=1):
+        progress['line'] = number
+        if not raw.strip():
+            continue
+        try:
+            data = dict(serializer.run_validation(json.loads(raw)))
+        except (ValueError, TypeError) as exc:
+            detail = f'invalid JSON: {exc}'
+        except ValidationError as exc:
+            detail = exc.detail
+        else:
+            data.pop('version', None)
+            chunk.append((make_idempotency_key(user.id, data), data))
+            if len(chunk) >= chunk_size:
+                yield flush()
+            continue
+        progress['failed'] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': number, 'errors': detail})
+
+    if chunk:
+        yield flush()
+    yield _lines([{**progress, 'done': True, 'errors': errors}])
@@ -0,0 +1,116 @@
+"""
+Keyset（游标）分页：按 (created_at, id) 或 (date, start_time, id) 的位置继续读取
+
+游标只记录上一页最后一行的排序键，下一页是 “排序键严格大于/小于游标” 的索引范围扫描，
+因此无论翻到多深，每页成本都只取决于 page_size。
+仅在请求带 page_size 或 cursor 时分页，未带参数的旧客户端仍拿到完整列表。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from urllib.parse import urlencode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class EventKeysetPagination(BasePagination):
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'order'
+    orderings = {
+        'created': ('-created_at', '-id'),
+        'start': ('date', 'start_time', 'id'),
+    }
+    default_ordering = 'created'
+
+    def get_ordering(self, request) -> tuple:
+        name = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if name not in self.orderings:
+            raise ValidationError({self.ordering_query_param: f'must be one of {", ".join(self.orderings)}'})
+        return self.orderings[name]
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'must be an integer'})
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self._after(self.decode_cursor(encoded)))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_cursor = self.encode_cursor(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_paginated_data(self, data) -> dict:
+        return {
+            'next': self.get_next_link(),
+            'cursor': self.next_cursor,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.next_cursor
+        return self.request.build_absolute_uri(self.request.path) + '?' + urlencode(params, doseq=True)
+
+    # ---- 游标编解码 ----
+
+    def encode_cursor(self, row) -> str:
+        values = []
+        for field in self.ordering:
+            # 行可以是模型实例，也可以是 values() 字典（轻量读路径）
+            name = field.lstrip('-')
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, encoded: str) -> list:
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return values
+
+    def _after(self, values: list) -> Q:
+        """(k1, k2, ...) 严格排在游标之后；首列额外加闭区间条件，让索引直接定位起点"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            op = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{op}': value})
+            equal[name] = value
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
@@ -0,0 +1,177 @@
+"""
+事件全文搜索：title / description / location / participants
+
+SQLite 使用 FTS5 外部内容表 events_event_fts（trigram 分词，由触发器与 events_event 同步），
+按 bm25 排序；PostgreSQL 使用 to_tsvector('simple') 表达式索引 + pg_trgm 索引，按 ts_rank 排序。
+trigram 至少需要 3 个字符：更短的词（如两个汉字的“会议”）改为在该用户的事件上做 LIKE 过滤。
+
+SQLite 的 ALTER 多数要重建 events_event（建新表、拷数据、删旧表），旧表上的触发器随之消失，
+索引从此不再更新。ensure_sqlite_index 在每次 migrate 之后补建缺失的表/触发器并回填索引。
+"""
+
+from __future__ import annotations
+
+from django.db import connection, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import Q
+
+from .fastread import LIST_FIELDS, serialize_rows
+from .models import Event
+
+SEARCH_FIELDS = ('title', 'description', 'location', 'participants')
+MIN_INDEXED_TERM = 3
+# bm25 列权重，与 SEARCH_FIELDS 顺序一致：标题命中最重要
+COLUMN_WEIGHTS = (10.0, 2.0, 3.0, 1.0)
+
+POSTGRES_DOCUMENT = (
+    "coalesce(e.title, '') || ' ' || coalesce(e.description, '') || ' ' || "
+    "coalesce(e.location, '') || ' ' || coalesce(e.participants, '')"
+)
+
+# 与迁移 0008 建的对象一致；IF NOT EXISTS 让 ensure_sqlite_index 可以反复执行
+SQLITE_INDEX = {
+    'events_event_fts': """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_event_fts USING fts5(
+        title, description, location, participants,
+        content='events_event', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    'events_event_fts_ai': """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_ai AFTER INSERT ON events_event BEGIN
+        INSERT INTO events_event_fts(rowid, title, description, location, participants)
+        VALUES (new.id, new.title, new.description, new.location, new.participants);
+    END
+    """,
+    'events_event_fts_ad': """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_ad AFTER DELETE ON events_event BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location, participants)
+        VALUES ('delete', old.id, old.title, old.description, old.location, old.participants);
+    END
+    """,
+    'events_event_fts_au': """
+    CREATE TRIGGER IF NOT EXISTS events_event_fts_au
+    AFTER UPDATE OF title, description, location, participants ON events_event
+    BEGIN
+        INSERT INTO events_event_fts(events_event_fts, rowid, title, description, location, participants)
+        VALUES ('delete', old.id, old.title, old.description, old.location, old.participants);
+        INSERT INTO events_event_fts(rowid, title, description, location, participants)
+        VALUES (new.id, new.title, new.description, new.location, new.participants);
+    END
+    """,
+}
+SEARCH_MIGRATION = ('events', '0008_event_search_index')
+
+
+def ensure_sqlite_index(using: str = 'default') -> list[str]:
+    """
+    补建 SQLite 上缺失的 FTS5 表与同步触发器；有缺失时 rebuild 整个索引（缺失期间的写入没有进索引）
+
+    迁移 0008 尚未应用（或已回滚）时什么也不做。
+    :return: 补建的对象名，全部完好时为空列表
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite' or SEARCH_MIGRATION not in MigrationRecorder(conn).applied_migrations():
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(SQLITE_INDEX))})",
+            list(SQLITE_INDEX),
+        )
+        present = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in SQLITE_INDEX if name not in present]
+        if not missing:
+            return []
+        for statement in SQLITE_INDEX.values():
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO events_event_fts(events_event_fts) VALUES ('rebuild')")
+    return missing
+
+
+def split_terms(query: str) -> tuple[list[str], list[str]]:
+    """按空白切词，返回 (可走索引的词, 过短只能 LIKE 的词)"""
+    terms = list(dict.fromkeys(term for term in query.split() if term))
+    return (
+        [term for term in terms if len(term) >= MIN_INDEXED_TERM],
+        [term for term in terms if len(term) < MIN_INDEXED_TERM],
+    )
+
+
+def fts_phrase(term: str) -> str:
+    """把用户输入包成 FTS5 短语，避免被解析为 AND/OR/NEAR/列过滤等语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _sqlite_ranked_ids(user_id: int, indexed: list[str], short: list[str], limit: int, offset: int) -> list[int]:
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    sql = [
+        'SELECT e.id FROM events_event_fts f JOIN events_event e ON e.id = f.rowid',
+        'WHERE events_event_fts MATCH %s AND e.user_id = %s',
+    ]
+    params: list = [' '.join(fts_phrase(term) for term in indexed), user_id]
+    for term in short:
+        sql.append('AND (' + ' OR '.join(f"e.{name} LIKE %s ESCAPE '\\'" for name in SEARCH_FIELDS) + ')')
+        params.extend([_like_pattern(term)] * len(SEARCH_FIELDS))
+    sql.append(f'ORDER BY bm25(events_event_fts, {weights}), e.id LIMIT %s OFFSET %s')
+    params.extend([limit, offset])
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_ranked_ids(user_id: int, indexed: list[str], short: list[str], limit: int, offset: int) -> list[int]:
+    vector = f"to_tsvector('simple', {POSTGRES_DOCUMENT})"
+    sql = ['SELECT e.id FROM events_event e WHERE e.user_id = %s']
+    params: list = [user_id]
+    for term in indexed + short:
+        # 分词命中走 tsvector 索引；中日韩等没有空格分隔的文本靠 trigram 子串命中
+        sql.append(f"AND ({vector} @@ plainto_tsquery('simple', %s) OR ({POSTGRES_DOCUMENT}) ILIKE %s)")
+        params.extend([term, _like_pattern(term)])
+    sql.append(
+        f"ORDER BY ts_rank({vector}, plainto_tsquery('simple', %s)) DESC, e.date DESC, e.id DESC LIMIT %s OFFSET %s"
+    )
+    params.extend([' '.join(indexed + short), limit, offset])
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _filtered_ids(user_id: int, terms: list[str], limit: int, offset: int) -> list[int]:
+    """没有可走全文索引的词时：在该用户的事件上做 icontains，最近的排前面"""
+    queryset = Event.objects.filter(user_id=user_id)
+    for term in terms:
+        condition = Q()
+        for name in SEARCH_FIELDS:
+            condition |= Q(**{f'{name}__icontains': term})
+        queryset = queryset.filter(condition)
+    return list(queryset.order_by('-date', '-start_time', '-id').values_list('id', flat=True)[offset:offset + limit])
+
+
+def search_event_ids(user_id: int, query: str, limit: int, offset: int = 0) -> list[int]:
+    """按相关度返回匹配的事件 id"""
+    indexed, short = split_terms(query)
+    if not indexed and not short:
+        return []
+    if connection.vendor == 'postgresql':
+        return _postgres_ranked_ids(user_id, indexed, short, limit, offset)
+    if connection.vendor == 'sqlite' and indexed:
+        return _sqlite_ranked_ids(user_id, indexed, short, limit, offset)
+    return _filtered_ids(user_id, indexed + short, limit, offset)
+
+
+def search_events(user_id: int, query: str, limit: int = 20, offset: int = 0) -> dict:
+    """
+    :return: {'results': [...与列表相同结构...], 'next_offset': int | None}
+    """
+    ids = search_event_ids(user_id, query, limit + 1, offset)
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    rows = {row['id']: row for row in Event.objects.filter(id__in=ids).values(*LIST_FIELDS)}
+    return {
+        'results': serialize_rows((rows[i] for i in ids if i in rows), LIST_FIELDS),
+        'next_offset': offset + limit if has_more else None,
+    }
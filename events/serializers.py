@@ -20,7 +20,14 @@ class EventSerializer(serializers.ModelSerializer):
             'caldav_uid',
             'caldav_href',
             'google_event_id',
+            'version',
+            'starts_at',
+            'ends_at',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'caldav_uid', 'caldav_href', 'google_event_id', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'caldav_uid', 'caldav_href', 'google_event_id', 'starts_at', 'ends_at', 'created_at', 'updated_at',
+        ]
+        # version 只作为更新时的期望版本读取，不会被直接写入
+        extra_kwargs = {'version': {'required': False}}
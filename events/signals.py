@@ -0,0 +1,27 @@
+"""
+通过 save() / delete() 写入的事件自动记录到 EventChange
+
+QuerySet.update() 与 bulk_* 不触发信号：update_event_fields 与 EventQuerySet 的 bulk 方法自行记录。
+只写 UNTRACKED_FIELDS 的保存不算变更。
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UNTRACKED_FIELDS, Event, EventChange
+
+
+@receiver(post_save, sender=Event, dispatch_uid='events_record_upsert')
+def record_upsert(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= UNTRACKED_FIELDS):
+        return
+    EventChange.record(instance.user_id, [instance.pk], EventChange.UPSERT)
+
+
+@receiver(post_delete, sender=Event, dispatch_uid='events_record_delete')
+def record_delete(sender, instance, origin=None, **kwargs):
+    # 随用户一起级联删除时不再需要墓碑（变更日志也会被一并删除）
+    if isinstance(origin, get_user_model()):
+        return
+    EventChange.record(instance.user_id, [instance.pk], EventChange.DELETE)
@@ -0,0 +1,57 @@
+"""
+日历网格用的汇总：按天 / 周 / 月在数据库里 GROUP BY (bucket, category)，返回列式数据
+
+{
+  "granularity": "day", "start": "2026-03-01", "end": "2026-04-01",
+  "buckets": ["2026-03-02", ...],          # 只含有事件的时间段，升序
+  "count": [3, ...], "minutes": [150, ...],
+  "categories": {"work": [2, ...], "meeting": [1, ...]}   # 与 buckets 对齐的计数
+}
+跨午夜的事件计入开始日期。
+"""
+
+from __future__ import annotations
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+GRANULARITIES = {
+    'day': lambda: F('date'),
+    'week': lambda: TruncWeek('date'),
+    'month': lambda: TruncMonth('date'),
+}
+
+
+def summarize(queryset, granularity: str) -> dict:
+    """queryset 应已按用户与日期范围过滤"""
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=GRANULARITIES[granularity]())
+        .values('bucket', 'category')
+        .annotate(count=Count('id'), minutes=Sum('duration'))
+        .order_by('bucket', 'category')
+    )
+    buckets = []
+    counts = []
+    minutes = []
+    categories: dict[str, list[int]] = {}
+    for row in rows:
+        bucket = row['bucket'].isoformat()
+        if not buckets or buckets[-1] != bucket:
+            buckets.append(bucket)
+            counts.append(0)
+            minutes.append(0)
+        counts[-1] += row['count']
+        minutes[-1] += row['minutes'] or 0
+        column = categories.setdefault(row['category'], [])
+        column.extend([0] * (len(buckets) - len(column)))
+        column[-1] = row['count']
+    for column in categories.values():
+        column.extend([0] * (len(buckets) - len(column)))
+    return {
+        'granularity': granularity,
+        'buckets': buckets,
+        'count': counts,
+        'minutes': minutes,
+        'categories': categories,
+    }
@@ -1,3 +1,868 @@
-from django.test import TestCase
+import json
+import threading
+import time as perf_time
+import unittest
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as django_timezone
+from rest_framework.test import APIClient
+
+from users.models import UserProfile
+from .apps import ensure_search_index
+from .fastread import serialize_rows
+from .freebusy import busy_intervals_for_users, find_free_slots, invert_intervals, merge_intervals
+from .cache import CachedResponse, EventListCache, event_list_cache
+from .changes import compact_changes, encode_token
+from .models import Event, EventChange
+from .pagination import EventKeysetPagination
+from .search import SQLITE_INDEX, ensure_sqlite_index
+from .serializers import EventSerializer
+
+
+class FreeBusyIntervalTests(TestCase):
+    def test_merge_overlapping_and_adjacent(self):
+        starts, ends = merge_intervals([60, 0, 30, 200], [90, 30, 45, 210])
+        self.assertEqual(list(starts), [0, 60, 200])
+        self.assertEqual(list(ends), [45, 90, 210])
+
+    def test_invert_within_window(self):
+        starts, ends = invert_intervals([10, 50], [20, 200], 0, 100)
+        self.assertEqual(list(zip(starts, ends)), [(0, 10), (20, 50)])
+
+
+class FreeSlotsApiTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        # 2026-03-02 is a Monday
+        Event.objects.create(user=self.alice, title='A', date=date(2026, 3, 2), start_time=time(9, 0), duration=60)
+        Event.objects.create(user=self.bob, title='B', date=date(2026, 3, 2), start_time=time(10, 0), duration=90)
+        UserProfile.objects.create(user=self.bob, radicale_username='bob', radicale_password='pw') \
+            .free_busy_viewers.add(self.alice)
+
+    def test_group_slots_avoid_everyones_events(self):
+        res = self.client.get('/api/events/free-slots/', {
+            'users': 'bob', 'start': '2026-03-02', 'end': '2026-03-03', 'duration': 60, 'limit': 50,
+        })
+        self.assertEqual(res.status_code, 200)
+        starts = [slot['start'][11:16] for slot in res.data['slots']]
+        self.assertNotIn('09:00', starts)
+        self.assertNotIn('10:00', starts)
+        self.assertNotIn('10:30', starts)
+        # 11:30 sits right after bob's meeting, so it ranks first
+        self.assertEqual(starts[0], '11:30')
+
+    def test_unknown_user_rejected(self):
+        res = self.client.get('/api/events/free-slots/', {'users': 'nobody'})
+        self.assertEqual(res.status_code, 404)
+
+    def test_users_who_do_not_share_are_not_visible(self):
+        carol = get_user_model().objects.create_user('carol', password='pw')
+        Event.objects.create(user=carol, title='C', date=date(2026, 3, 2), start_time=time(13, 0), duration=60)
+        res = self.client.get('/api/events/free-slots/', {'users': 'carol', 'start': '2026-03-02', 'end': '2026-03-03'})
+        self.assertEqual(res.status_code, 404)
+        self.assertNotIn('slots', res.data)
+        # Sharing is one-way: bob shares with alice, not the other way round
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get('/api/events/free-slots/', {'users': 'alice'}).status_code, 404)
+
+    def test_month_for_twenty_users_merges_everyones_events(self):
+        User = get_user_model()
+        users = [User.objects.create_user(f'u{i}') for i in range(20)]
+        events = Event.objects.bulk_create([
+            Event(user=u, title='busy', date=date(2026, 3, 1 + d), start_time=time(9 + (i + d) % 8, 0), duration=45)
+            for i, u in enumerate(users)
+            for d in range(30)
+        ])
+        first_day = date(2026, 3, 1)
+        busy_minutes = {
+            (event.date - first_day).days * 1440 + event.start_time.hour * 60 + minute
+            for event in events
+            for minute in range(event.duration)
+        }
+        starts, ends = merge_intervals(*busy_intervals_for_users([u.id for u in users], first_day, 31))
+        self.assertTrue(all(end < start for end, start in zip(ends, starts[1:])))
+        self.assertEqual({m for s, e in zip(starts, ends) for m in range(s, e)}, busy_minutes)
+
+        slots = find_free_slots([u.id for u in users], first_day, 31, 90, limit=1000)
+        self.assertTrue(slots)
+        for slot in slots:
+            self.assertEqual(slot.end - slot.start, timedelta(minutes=90))
+            self.assertLess(slot.start.weekday(), 5)
+            self.assertTrue(time(9, 0) <= slot.start.time() and slot.end.time() <= time(18, 0))
+            offset = (slot.start.date() - first_day).days * 1440 + slot.start.hour * 60 + slot.start.minute
+            self.assertFalse(busy_minutes & set(range(offset, offset + 90)))
+
+
+class IdempotentCreateTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('carol', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'title': 'Standup', 'date': '2026-03-02', 'start_time': '09:00', 'duration': 15}
+
+    def test_replayed_post_returns_existing_event(self):
+        first = self.client.post('/api/events/', self.payload, format='json')
+        second = self.client.post('/api/events/', self.payload, format='json')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Event.objects.filter(user=self.user).count(), 1)
+
+    def test_edited_event_no_longer_answers_the_original_payload(self):
+        first = self.client.post('/api/events/', self.payload, format='json').data
+        self.client.patch(f"/api/events/{first['id']}/", {'start_time': '11:00'}, format='json')
+        again = self.client.post('/api/events/', self.payload, format='json')
+        self.assertEqual(again.status_code, 201)
+        self.assertNotEqual(again.data['id'], first['id'])
+
+    def test_duplicate_creates_in_one_bulk_request_replay(self):
+        create = {'op': 'create', 'data': self.payload}
+        results = self.client.post('/api/events/bulk/', {'operations': [create, create]}, format='json').json()['results']
+        self.assertEqual([item['status'] for item in results], [201, 200])
+        self.assertEqual(results[0]['id'], results[1]['id'])
+
+    def test_client_key_distinguishes_identical_payloads(self):
+        self.client.post('/api/events/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='a')
+        self.client.post('/api/events/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='b')
+        self.client.post('/api/events/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='b')
+        self.assertEqual(Event.objects.filter(user=self.user).count(), 2)
+
+    def test_scheduler_batch_replay_is_single_write(self):
+        from ai.scheduler import EventScheduler
+
+        batch = [
+            {'title': f'Batch {i}', 'date': '2026-03-02', 'start_time': '10:00:00', 'duration': 30}
+            for i in range(5)
+        ]
+        first = EventScheduler.schedule_events_batch(self.user, batch)
+        with self.assertNumQueries(2):
+            replay = EventScheduler.schedule_events_batch(self.user, batch + batch[:2])
+        self.assertEqual([e.id for e in replay], [e.id for e in first] + [first[0].id, first[1].id])
+        self.assertEqual(EventScheduler.schedule_event(self.user, batch[0]).id, first[0].id)
+        self.assertEqual(Event.objects.filter(user=self.user).count(), 5)
+
+
+class PartialUpdateTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('dave', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(
+            user=self.user, title='Review', date=date(2026, 3, 2), start_time=time(14, 0), duration=60,
+        )
+        self.url = f'/api/events/{self.event.id}/'
+
+    def test_unchanged_update_skips_write(self):
+        with self.assertNumQueries(1):
+            res = self.client.patch(self.url, {'title': 'Review'}, format='json')
+        self.assertEqual(res['X-Event-Changed'], '0')
+        self.assertEqual(res.data['version'], 1)
+
+    def test_update_writes_changed_columns_and_bumps_version(self):
+        res = self.client.patch(self.url, {'title': 'Design review', 'duration': 60}, format='json')
+        self.assertEqual(res['X-Event-Changed'], '1')
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.title, self.event.version), ('Design review', 2))
+
+    def test_stale_version_is_rejected(self):
+        self.client.patch(self.url, {'title': 'First', 'version': 1}, format='json')
+        res = self.client.patch(self.url, {'title': 'Second', 'version': 1}, format='json')
+        self.assertEqual(res.status_code, 409)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.title, 'First')
+
+
+def _keyset_after(ordering, values):
+    paginator = EventKeysetPagination()
+    paginator.ordering = ordering
+    return paginator._after(values)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks are SQLite specific')
+class EventQueryPlanTests(TestCase):
+    """热点查询必须走索引：不允许全表扫描，也不允许为排序建临时 B-tree。
+
+    几千行加 ANALYZE 统计就足以让 SQLite 给出与大表相同的计划，不必真的灌入百万行。
+    """
+
+    seed_rows = 5_000
+    seed_users = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f'plan{i}') for i in range(cls.seed_users)])
+        cls.user = User.objects.get(username='plan0')
+        first_user_id = cls.user.id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < {cls.seed_rows - 1})
+                INSERT INTO events_event (
+                    user_id, title, date, start_time, duration, reminder, category,
+                    google_event_id, version, starts_at, ends_at, created_at, updated_at
+                )
+                SELECT
+                    {first_user_id} + n % {cls.seed_users},
+                    'seed ' || n,
+                    date('2024-01-01', '+' || ((n / {cls.seed_users}) % 1000) || ' days'),
+                    printf('%02d:00:00', 8 + n % 10),
+                    60, 15, 'work',
+                    CASE WHEN n % 3 = 0 THEN 'g' || n END,
+                    1,
+                    datetime('2024-01-01', '+' || ((n / {cls.seed_users}) % 1000) || ' days', '+' || (8 + n % 10) || ' hours'),
+                    datetime('2024-01-01', '+' || ((n / {cls.seed_users}) % 1000) || ' days', '+' || (9 + n % 10) || ' hours'),
+                    datetime('2024-01-01', '+' || n || ' seconds'),
+                    datetime('2024-01-01', '+' || n || ' seconds')
+                FROM seq
+                """
+            )
+            cursor.execute('ANALYZE')
+
+    def assert_uses_index(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        for line in plan:
+            if 'events_event' in line and line.startswith('SCAN') and 'INDEX' not in line:
+                self.fail(f'full table scan:\n{sql}\n' + '\n'.join(plan))
+            if 'TEMP B-TREE' in line:
+                self.fail(f'sort without index:\n{sql}\n' + '\n'.join(plan))
+
+    def test_hot_queries_use_indexes(self):
+        since = datetime(2024, 1, 5, tzinfo=dt_timezone.utc)
+        hot_queries = {
+            'list': Event.objects.filter(user=self.user).order_by('-created_at', '-id'),
+            'list_after_cursor': Event.objects.filter(user=self.user).filter(
+                _keyset_after(('-created_at', '-id'), [since.isoformat(), 500]),
+            ).order_by('-created_at', '-id'),
+            'range_after_cursor': Event.objects.filter(
+                user=self.user, date__lt=date(2024, 4, 1),
+            ).filter(
+                _keyset_after(('date', 'start_time', 'id'), ['2024-03-01', '09:00:00', 500]),
+            ).order_by('date', 'start_time', 'id'),
+            'range': Event.objects.filter(
+                user=self.user, date__gte=date(2024, 3, 1), date__lt=date(2024, 4, 1),
+            ).order_by('date', 'start_time'),
+            'freebusy': Event.objects.filter(user_id__in=[self.user.id, self.user.id + 1]).overlapping(
+                datetime(2026, 3, 1, tzinfo=dt_timezone.utc), datetime(2026, 4, 1, tzinfo=dt_timezone.utc),
+            ).values_list('starts_at', 'ends_at'),
+            'conflicts': Event.objects.filter(user=self.user).overlapping(
+                datetime(2026, 3, 2, 9, tzinfo=dt_timezone.utc), datetime(2026, 3, 2, 10, tzinfo=dt_timezone.utc),
+            ),
+            'google_lookup': Event.objects.filter(user=self.user, google_event_id='g3000'),
+            'changed_since': Event.objects.filter(user=self.user, updated_at__gt=since),
+            'idempotency': Event.objects.filter(user=self.user, idempotency_key='k'),
+            'change_feed': EventChange.objects.filter(user=self.user, id__gt=500).order_by('id'),
+        }
+        for name, queryset in hot_queries.items():
+            with self.subTest(query=name):
+                self.assert_uses_index(queryset)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('erin', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Event.objects.bulk_create([
+            Event(user=self.user, title=f'E{i}', date=date(2026, 3, 1 + i % 10), start_time=time(9 + i % 3, 0), duration=30)
+            for i in range(25)
+        ])
+
+    def walk(self, params):
+        seen = []
+        res = self.client.get('/api/events/', params)
+        while True:
+            self.assertEqual(res.status_code, 200)
+            body = res.json()
+            seen.extend(row['id'] for row in body['results'])
+            if not body['cursor']:
+                return seen
+            res = self.client.get('/api/events/', {**params, 'cursor': body['cursor']})
+
+    def test_created_order_pages_cover_everything_once(self):
+        ids = self.walk({'page_size': 7})
+        expected = list(Event.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_start_order_with_range_filter(self):
+        ids = self.walk({'page_size': 4, 'order': 'start', 'start': '2026-03-03', 'end': '2026-03-06'})
+        expected = list(
+            Event.objects.filter(user=self.user, date__gte=date(2026, 3, 3), date__lt=date(2026, 3, 6))
+            .order_by('date', 'start_time', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(ids), 9)
+
+    def test_unpaginated_list_is_unchanged(self):
+        res = self.client.get('/api/events/')
+        self.assertIsInstance(res.json(), list)
+        self.assertEqual(len(res.json()), 25)
+
+
+class EventInstantTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('frank', password='pw')
+
+    def test_instants_follow_dst_and_every_write_path(self):
+        # 2026-03-08 02:00 America/Los_Angeles springs forward; 01:30 + 60 minutes ends at 03:30 local
+        with self.settings(TIME_ZONE='America/Los_Angeles'):
+            event = Event.objects.create(
+                user=self.user, title='DST', date=date(2026, 3, 8), start_time=time(1, 30), duration=60,
+            )
+            self.assertEqual(event.starts_at, datetime(2026, 3, 8, 9, 30, tzinfo=dt_timezone.utc))
+            self.assertEqual(event.ends_at, datetime(2026, 3, 8, 10, 30, tzinfo=dt_timezone.utc))
+
+            from .updates import update_event_fields
+            update_event_fields(event, {'start_time': time(12, 0)})
+            event.refresh_from_db()
+            self.assertEqual(event.starts_at, datetime(2026, 3, 8, 19, 0, tzinfo=dt_timezone.utc))
+
+            bulk = Event.objects.bulk_create([
+                Event(user=self.user, title='Bulk', date=date(2026, 7, 1), start_time=time(9, 0), duration=30),
+            ])
+            self.assertEqual(bulk[0].starts_at, datetime(2026, 7, 1, 16, 0, tzinfo=dt_timezone.utc))
+
+    def test_overlapping(self):
+        with self.settings(TIME_ZONE='UTC'):
+            Event.objects.create(user=self.user, title='A', date=date(2026, 3, 2), start_time=time(9, 0), duration=60)
+            Event.objects.create(user=self.user, title='B', date=date(2026, 3, 2), start_time=time(10, 0), duration=60)
+        window = (datetime(2026, 3, 2, 10, 30, tzinfo=dt_timezone.utc), datetime(2026, 3, 2, 11, 0, tzinfo=dt_timezone.utc))
+        titles = list(Event.objects.overlapping(*window).values_list('title', flat=True))
+        self.assertEqual(titles, ['B'])
+
+
+class FastReadPathTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('grace', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        Event.objects.bulk_create([
+            Event(
+                user=self.user, title=f'事件 {i}', date=date(2026, 1, 1 + i % 28), start_time=time(i % 24, i % 60),
+                duration=15 + i % 90, location='Room "A"' if i % 2 else None, description='x' * (i % 5),
+                participants='a@example.com' if i % 3 else None, category='meeting',
+            )
+            for i in range(count)
+        ])
+
+    def test_matches_event_serializer_output(self):
+        self.seed(40)
+        queryset = Event.objects.filter(user=self.user).order_by('-created_at', '-id')
+        expected = json.loads(json.dumps(EventSerializer(queryset, many=True).data))
+        self.assertEqual(self.client.get('/api/events/').json(), expected)
+
+    def test_sparse_fieldset(self):
+        self.seed(3)
+        rows = self.client.get('/api/events/', {'fields': 'title,id', 'page_size': 2}).json()['results']
+        self.assertEqual([list(row) for row in rows], [['id', 'title'], ['id', 'title']])
+        self.assertEqual(self.client.get('/api/events/', {'fields': 'secret'}).status_code, 400)
+
+    def test_large_list_matches_serializer_in_constant_queries(self):
+        self.seed(2_000)
+        queryset = Event.objects.filter(user=self.user).order_by('-created_at', '-id')
+        fields = tuple(EventSerializer.Meta.fields)
+        expected = json.loads(json.dumps(EventSerializer(list(queryset), many=True).data))
+        self.assertEqual(json.loads(json.dumps(serialize_rows(queryset.values(*fields), fields))), expected)
+        # generation + 校验值聚合 + 一页数据，与行数无关
+        with self.assertNumQueries(3):
+            page = self.client.get('/api/events/', {'page_size': 500}).json()
+        self.assertEqual(page['results'], expected[:500])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('heidi', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(
+            user=self.user, title='Gym', date=date(2026, 3, 2), start_time=time(7, 0), duration=60,
+        )
+
+    def test_unchanged_list_returns_304_without_loading_rows(self):
+        first = self.client.get('/api/events/')
+        # 第一次请求已把列表及其校验值写入缓存，只剩一次 generation 查询
+        with self.assertNumQueries(1):
+            again = self.client.get('/api/events/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_list_etag_changes_on_update_and_delete(self):
+        etag = self.client.get('/api/events/')['ETag']
+        self.client.patch(f'/api/events/{self.event.id}/', {'title': 'Gym!'}, format='json')
+        res = self.client.get('/api/events/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+        self.client.delete(f'/api/events/{self.event.id}/')
+        self.assertEqual(self.client.get('/api/events/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_sees_a_delete(self):
+        newer = Event.objects.create(
+            user=self.user, title='Swim', date=date(2026, 3, 3), start_time=time(7, 0), duration=60,
+        )
+        # 把已有的写入挪到一小时前，删除才会落在更晚的一秒里
+        an_hour_ago = django_timezone.now() - timedelta(hours=1)
+        Event.objects.filter(pk=self.event.pk).update(updated_at=an_hour_ago - timedelta(minutes=1))
+        Event.objects.filter(pk=newer.pk).update(updated_at=an_hour_ago)
+        EventChange.objects.filter(user=self.user).update(created_at=an_hour_ago)
+        last_modified = self.client.get('/api/events/')['Last-Modified']
+
+        # 删掉的不是最近修改的那一条：max(updated_at) 不变
+        self.client.delete(f'/api/events/{self.event.id}/')
+        res = self.client.get('/api/events/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([item['id'] for item in res.json()], [newer.id])
+
+    def test_detail_honours_if_none_match_and_if_modified_since(self):
+        url = f'/api/events/{self.event.id}/'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+
+    def test_detail_with_non_numeric_pk_is_404(self):
+        self.assertEqual(self.client.get('/api/events/abc/').status_code, 404)
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('ivan', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(
+            user=self.user, title='Standup', date=date(2026, 3, 2), start_time=time(9, 0), duration=15,
+        )
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        res = self.client.get('/api/events/changes/', params)
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_full_then_incremental_changes(self):
+        first = self.changes()
+        self.assertEqual([item['id'] for item in first['changed']], [self.event.id])
+        self.assertEqual(first['deleted'], [])
+
+        idle = self.changes(first['token'])
+        self.assertEqual((idle['changed'], idle['deleted']), ([], []))
+
+        self.client.patch(f'/api/events/{self.event.id}/', {'title': 'Daily'}, format='json')
+        other = Event.objects.create(user=self.user, title='Lunch', date=date(2026, 3, 2), start_time=time(12, 0), duration=60)
+        self.client.delete(f'/api/events/{other.id}/')
+        delta = self.changes(idle['token'])
+        self.assertEqual([item['title'] for item in delta['changed']], ['Daily'])
+        self.assertEqual(delta['deleted'], [other.id])
+
+    def test_pages_until_caught_up(self):
+        for hour in range(10, 15):
+            Event.objects.create(user=self.user, title='x', date=date(2026, 3, 3), start_time=time(hour, 0), duration=30)
+        seen, token = set(), None
+        while True:
+            page = self.changes(token, limit=2)
+            seen.update(item['id'] for item in page['changed'])
+            token = page['token']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, set(Event.objects.filter(user=self.user).values_list('id', flat=True)))
+
+    def test_other_users_changes_are_invisible(self):
+        stranger = get_user_model().objects.create_user('judy', password='pw')
+        Event.objects.create(user=stranger, title='Secret', date=date(2026, 3, 2), start_time=time(9, 0), duration=15)
+        self.assertEqual([item['id'] for item in self.changes()['changed']], [self.event.id])
+
+    def test_compaction_keeps_latest_change_per_event(self):
+        event_id = self.event.id
+        for title in ('a', 'b', 'c'):
+            self.event.title = title
+            self.event.save()
+        self.event.delete()
+        compact_changes()
+        self.assertEqual(list(EventChange.objects.values_list('kind', flat=True)), [EventChange.DELETE])
+        self.assertEqual(self.changes()['deleted'], [event_id])
+
+    @override_settings(EVENT_CHANGES_COMMIT_LAG_SECONDS=60)
+    def test_token_does_not_pass_recent_changes(self):
+        first = self.changes()
+        again = self.changes(first['token'])
+        # 刚写入的变更可能排在尚未提交的更小 id 之后：下次再读一遍
+        self.assertEqual([item['id'] for item in again['changed']], [self.event.id])
+
+        EventChange.objects.update(created_at=django_timezone.now() - timedelta(minutes=5))
+        settled = self.changes(self.changes(first['token'])['token'])
+        self.assertEqual((settled['changed'], settled['deleted']), ([], []))
+
+    def test_expired_token_requires_resync(self):
+        stale = encode_token(EventChange.objects.latest('id').id, int(perf_time.time()) - 31 * 86400)
+        res = self.client.get('/api/events/changes/', {'since': stale})
+        self.assertEqual(res.status_code, 410)
+
+
+class BulkOperationsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('kate', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.keep = Event.objects.create(user=self.user, title='Keep', date=date(2026, 3, 2), start_time=time(9, 0), duration=30)
+        self.drop = Event.objects.create(user=self.user, title='Drop', date=date(2026, 3, 2), start_time=time(11, 0), duration=30)
+
+    def bulk(self, operations, **extra):
+        return self.client.post('/api/events/bulk/', {'operations': operations}, format='json', **extra)
+
+    def create_op(self, title, hour=14):
+        return {'op': 'create', 'data': {'title': title, 'date': '2026-03-03', 'start_time': f'{hour:02d}:00', 'duration': 45}}
+
+    def test_mixed_operations_apply_together(self):
+        res = self.bulk([
+            self.create_op('New'),
+            {'op': 'update', 'id': self.keep.id, 'data': {'duration': 60, 'version': 1}},
+            {'op': 'delete', 'id': self.drop.id},
+        ])
+        self.assertEqual(res.status_code, 200)
+        results = res.json()['results']
+        self.assertEqual([item['status'] for item in results], [201, 200, 204])
+        self.assertEqual(results[0]['event']['title'], 'New')
+        self.assertEqual(results[1]['changed'], ['duration'])
+        self.keep.refresh_from_db()
+        self.assertEqual((self.keep.duration, self.keep.version), (60, 2))
+        self.assertEqual(self.keep.ends_at - self.keep.starts_at, timedelta(minutes=60))
+        self.assertFalse(Event.objects.filter(id=self.drop.id).exists())
+        self.assertEqual(
+            set(EventChange.objects.filter(user=self.user).values_list('event_id', 'kind').order_by('-id')[:3]),
+            {(results[0]['id'], 'upsert'), (self.keep.id, 'upsert'), (self.drop.id, 'delete')},
+        )
+
+    def test_any_invalid_item_rejects_the_whole_batch(self):
+        res = self.bulk([
+            self.create_op('Fine'),
+            {'op': 'delete', 'id': 999999},
+            {'op': 'update', 'id': self.keep.id, 'data': {'duration': 'soon'}},
+        ])
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual([item['status'] for item in res.data['results']], [None, 404, 400])
+        self.assertFalse(Event.objects.filter(title='Fine').exists())
+
+    def test_stale_version_rolls_back_everything(self):
+        res = self.bulk([
+            self.create_op('Ghost'),
+            {'op': 'update', 'id': self.keep.id, 'data': {'title': 'Late', 'version': 7}},
+        ])
+        self.assertEqual(res.status_code, 409)
+        self.assertFalse(Event.objects.filter(title='Ghost').exists())
+        self.keep.refresh_from_db()
+        self.assertEqual(self.keep.title, 'Keep')
+
+    def test_replayed_creates_return_existing_events(self):
+        first = self.bulk([self.create_op('Once')], HTTP_IDEMPOTENCY_KEY='batch-1').json()['results'][0]
+        again = self.bulk([self.create_op('Once')], HTTP_IDEMPOTENCY_KEY='batch-1').json()['results'][0]
+        self.assertEqual((again['status'], again['id']), (200, first['id']))
+        self.assertEqual(Event.objects.filter(title='Once').count(), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def queries(n, offset):
+            ops = [self.create_op(f'q{offset + i}', hour=8 + i % 10) for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.bulk(ops).status_code, 200)
+            return len(ctx.captured_queries)
+
+        # 固定开销 + 按 SQLite 参数上限分批的 INSERT，而不是每条若干次查询
+        self.assertLessEqual(queries(200, 100), queries(5, 0) + 5)
+
+    def test_bulk_request_runs_a_fixed_number_of_queries(self):
+        ops = [self.create_op(f'b{i}', hour=8 + i % 10) for i in range(200)]
+        # 保存点 2 + 去重查询 1 + 分批 INSERT 5（SQLite 参数上限）+ 变更日志 1 + generation 1 + Google 连接检查 1
+        with self.assertNumQueries(11):
+            response = self.bulk(ops)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Event.objects.filter(user=self.user, title__startswith='b').count(), 200)
+
+
+class EventListCacheTests(TestCase):
+    def setUp(self):
+        event_list_cache.cache.clear()
+        event_list_cache.reset_stats()
+        self.user = get_user_model().objects.create_user('leo', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(user=self.user, title='Yoga', date=date(2026, 3, 4), start_time=time(7, 0), duration=60)
+
+    def get(self, **params):
+        res = self.client.get('/api/events/', params)
+        self.assertEqual(res.status_code, 200)
+        return res
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):  # generation
+            res = self.get()
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual([item['title'] for item in res.json()], ['Yoga'])
+        # 不同的查询参数是不同的条目
+        self.assertEqual(self.get(start='2026-03-01', end='2026-04-01')['X-Cache'], 'MISS')
+        self.assertEqual(event_list_cache.stats(), {'hits': 1, 'misses': 2, 'hit_ratio': 0.3333})
+
+    def test_write_in_one_worker_invalidates_the_others(self):
+        # 两个进程内缓存模拟两个 worker，generation 由共享的数据库给出
+        workers = [EventListCache('events'), EventListCache('default')]
+        caches['default'].clear()
+        params = QueryDict('')
+        build = lambda: CachedResponse(json.dumps(list(Event.objects.values_list('title', flat=True))).encode(), '"x"', None)
+        for worker in workers:
+            self.assertEqual(worker.get_or_build(self.user.id, params, build)[1], False)
+        Event.objects.filter(pk=self.event.pk).update(title='Pilates')
+        EventChange.record(self.user.id, [self.event.pk], EventChange.UPSERT)
+        for worker in workers:
+            entry, hit = worker.get_or_build(self.user.id, params, build)
+            self.assertEqual((hit, json.loads(entry.body)), (False, ['Pilates']))
+
+    def test_generation_never_goes_back_after_compaction(self):
+        Event.objects.create(user=self.user, title='Swim', date=date(2026, 3, 5), start_time=time(7, 0), duration=30)
+        self.assertEqual(sorted(item['title'] for item in self.get().json()), ['Swim', 'Yoga'])
+        self.client.delete(f'/api/events/{self.event.id}/')
+        self.assertEqual([item['title'] for item in self.get().json()], ['Swim'])
+        # 清掉过期墓碑后，剩下的最新变更正是上面那次缓存时的最新变更
+        compact_changes(now=django_timezone.now() + timedelta(days=365))
+        self.assertEqual([item['title'] for item in self.get().json()], ['Swim'])
+
+    def test_every_write_path_invalidates(self):
+        writes = [
+            lambda: self.client.patch(f'/api/events/{self.event.id}/', {'title': 'Pilates'}, format='json'),
+            lambda: self.client.post('/api/events/bulk/', {'operations': [
+                {'op': 'create', 'data': {'title': 'Swim', 'date': '2026-03-05', 'start_time': '07:00', 'duration': 30}},
+            ]}, format='json'),
+            lambda: Event.objects.bulk_create([
+                Event(user=self.user, title='Run', date=date(2026, 3, 6), start_time=time(7, 0), duration=30),
+            ]),
+            lambda: self.client.delete(f'/api/events/{self.event.id}/'),
+        ]
+        for write in writes:
+            before = self.get().json()
+            write()
+            res = self.get()
+            self.assertEqual(res['X-Cache'], 'MISS')
+            self.assertNotEqual(res.json(), before)
+
+    def test_other_users_writes_keep_entry(self):
+        self.get()
+        stranger = get_user_model().objects.create_user('mia', password='pw')
+        Event.objects.create(user=stranger, title='Other', date=date(2026, 3, 4), start_time=time(7, 0), duration=60)
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+    def test_oversized_responses_are_not_stored(self):
+        with self.settings(EVENT_LIST_CACHE_MAX_BYTES=10):
+            self.get()
+            self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+    def test_concurrent_miss_waits_for_single_builder(self):
+        params = self.client.get('/api/events/', {'fields': 'id'}).wsgi_request.GET
+        event_list_cache.cache.clear()
+        key = event_list_cache.key(self.user.id, params)
+        event_list_cache.cache.add(f'{key}:lock', 1)
+        entry = CachedResponse(b'[]', '"x"', None)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return entry
+
+        def other_request_finishes():
+            perf_time.sleep(0.05)
+            event_list_cache.cache.set(key, entry)
+
+        worker = threading.Thread(target=other_request_finishes)
+        worker.start()
+        result, hit = event_list_cache.get_or_build(self.user.id, params, build)
+        worker.join()
+        self.assertEqual((result, hit, builds), (entry, True, []))
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('nora', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make = lambda **kw: Event.objects.create(user=self.user, date=date(2026, 3, 2), start_time=time(9, 0), duration=30, **kw)
+        self.dentist = make(title='Dentist appointment', location='Main St clinic')
+        self.checkup = make(title='Annual checkup', description='remember to ask the dentist about x-rays')
+        self.review = make(title='项目评审会议', participants='张三, 李四')
+        self.lunch = make(title='Team lunch', location='Dentistry school cafeteria')
+        Event.objects.create(
+            user=User.objects.create_user('otto', password='pw'),
+            title='Dentist', date=date(2026, 3, 2), start_time=time(9, 0), duration=30,
+        )
+
+    def search(self, q, **params):
+        res = self.client.get('/api/events/search/', {'q': q, **params})
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def ids(self, q, **params):
+        return [item['id'] for item in self.search(q, **params)['results']]
+
+    def test_title_matches_rank_first_and_other_users_are_excluded(self):
+        self.assertEqual(self.ids('dentist'), [self.dentist.id, self.lunch.id, self.checkup.id])
+
+    def test_cjk_terms(self):
+        self.assertEqual(self.ids('项目评审'), [self.review.id])
+        # 少于 3 个字符的词走 LIKE
+        self.assertEqual(self.ids('会议'), [self.review.id])
+        self.assertEqual(self.ids('评审 李四'), [self.review.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.client.patch(f'/api/events/{self.review.id}/', {'title': 'Quarterly review'}, format='json')
+        self.assertEqual(self.ids('项目评审'), [])
+        self.assertEqual(self.ids('quarterly'), [self.review.id])
+        self.dentist.delete()
+        self.assertNotIn(self.dentist.id, self.ids('dentist'))
+
+    def test_pagination_and_query_syntax_is_literal(self):
+        first = self.search('dentist', limit=2)
+        self.assertEqual(first['next_offset'], 2)
+        rest = self.search('dentist', limit=2, offset=first['next_offset'])
+        self.assertEqual(rest['next_offset'], None)
+        self.assertEqual(len(first['results']) + len(rest['results']), 3)
+        self.assertEqual(self.ids('dentist OR "lunch'), [])
+        self.assertEqual(self.client.get('/api/events/search/', {'q': ''}).status_code, 400)
+
+    def sqlite_objects(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'events_event_fts%%'")
+            return {row[0] for row in cursor.fetchall()}
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 触发器只在 SQLite 上')
+    def test_triggers_survive_later_migrations(self):
+        self.assertLessEqual(set(SQLITE_INDEX), self.sqlite_objects())
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 触发器只在 SQLite 上')
+    def test_lost_triggers_are_recreated_after_migrate(self):
+        # 模拟 SQLite 重建 events_event：触发器没了，之后的改动不进索引
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER events_event_fts_au')
+        Event.objects.filter(pk=self.review.pk).update(title='Quarterly review')
+        self.assertEqual(self.ids('quarterly'), [])
+
+        ensure_search_index(sender=None)
+        self.assertLessEqual(set(SQLITE_INDEX), self.sqlite_objects())
+        self.assertEqual(self.ids('quarterly'), [self.review.id])
+        self.assertEqual(ensure_sqlite_index(), [])
+
+
+class EventSummaryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('olga', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        make = lambda day, category, duration: Event.objects.create(
+            user=self.user, title='x', date=date(2026, 3, day), start_time=time(9, 0),
+            duration=duration, category=category,
+        )
+        make(2, 'work', 60)
+        make(2, 'work', 30)
+        make(2, 'meeting', 45)
+        make(4, 'personal', 120)
+        make(10, 'work', 15)
+        Event.objects.create(user=self.user, title='x', date=date(2026, 4, 1), start_time=time(9, 0), duration=60)
+
+    def summary(self, **params):
+        res = self.client.get('/api/events/summary/', params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_daily_columns(self):
+        data = self.summary(start='2026-03-01', end='2026-04-01')
+        self.assertEqual(data['buckets'], ['2026-03-02', '2026-03-04', '2026-03-10'])
+        self.assertEqual(data['count'], [3, 1, 1])
+        self.assertEqual(data['minutes'], [135, 120, 15])
+        self.assertEqual(data['categories'], {'meeting': [1, 0, 0], 'work': [2, 0, 1], 'personal': [0, 1, 0]})
+
+    def test_weekly_and_monthly_buckets(self):
+        weekly = self.summary(granularity='week', start='2026-03-01', end='2026-04-06')
+        # 2026-03-02 与 03-04 同在 3 月 2 日那一周
+        self.assertEqual(weekly['buckets'], ['2026-03-02', '2026-03-09', '2026-03-30'])
+        self.assertEqual(weekly['count'], [4, 1, 1])
+        monthly = self.summary(granularity='month', start='2026-01-01', end='2026-12-31')
+        self.assertEqual((monthly['buckets'], monthly['count']), (['2026-03-01', '2026-04-01'], [5, 1]))
+
+    def test_single_aggregate_query_and_invalidation(self):
+        with self.assertNumQueries(3):  # generation + 校验值 + GROUP BY
+            self.summary(start='2026-03-01', end='2026-04-01')
+        with self.assertNumQueries(1):
+            self.summary(start='2026-03-01', end='2026-04-01')
+        Event.objects.create(user=self.user, title='y', date=date(2026, 3, 2), start_time=time(15, 0), duration=10)
+        self.assertEqual(self.summary(start='2026-03-01', end='2026-04-01')['count'][0], 4)
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'granularity': 'hour'}, {'start': '2026-03-10', 'end': '2026-03-01'}, {'start': 'soon'}):
+            self.assertEqual(self.client.get('/api/events/summary/', params).status_code, 400)
+
+
+class NDJSONExportImportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('quinn', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            Event.objects.create(
+                user=self.user, title=f'会议 {i}', date=date(2026, 3, 2 + i), start_time=time(9, 0),
+                duration=30, category='meeting',
+            )
+
+    def export(self):
+        res = self.client.get('/api/events/export.ndjson')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content)
+
+    def import_(self, body: bytes):
+        res = self.client.post('/api/events/import.ndjson', body, content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        return [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+
+    def test_export_matches_list(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        listed = sorted(self.client.get('/api/events/').json(), key=lambda item: item['id'])
+        self.assertEqual(lines, listed)
+
+    def test_round_trip_into_another_account_is_idempotent(self):
+        body = self.export()
+        other = get_user_model().objects.create_user('rhea', password='pw')
+        self.client.force_authenticate(other)
+        progress = self.import_(body)
+        self.assertEqual(progress[-1], {'line': 5, 'created': 5, 'skipped': 0, 'failed': 0, 'done': True, 'errors': []})
+        self.assertEqual(
+            sorted(Event.objects.filter(user=other).values_list('title', flat=True)),
+            [f'会议 {i}' for i in range(5)],
+        )
+        again = self.import_(body)[-1]
+        self.assertEqual((again['created'], again['skipped']), (0, 5))
+        self.assertEqual(Event.objects.filter(user=other).count(), 5)
+
+    def test_bad_lines_are_reported_and_skipped(self):
+        good = json.dumps({'title': 'ok', 'date': '2026-03-09', 'start_time': '10:00', 'duration': 15})
+        body = '\n'.join([good, '{not json', '', json.dumps({'title': 'no date'})]).encode('utf-8')
+        final = self.import_(body)[-1]
+        self.assertEqual((final['created'], final['failed']), (1, 2))
+        self.assertEqual([error['line'] for error in final['errors']], [2, 4])
+
+    def test_progress_per_chunk(self):
+        rows = [
+            json.dumps({'title': f'bulk {i}', 'date': '2026-04-01', 'start_time': '08:00', 'duration': i + 1})
+            for i in range(1200)
+        ]
+        progress = self.import_('\n'.join(rows).encode('utf-8'))
+        self.assertEqual([item['created'] for item in progress], [500, 1000, 1200, 1200])
+        self.assertTrue(progress[-1]['done'])
@@ -0,0 +1,74 @@
+"""
+事件部分更新：与已存储状态做 diff，只写变化的列，并用 version 列做乐观并发控制
+
+写入是一条 UPDATE ... SET <changed>, version = version + 1 WHERE id = ? AND version = ?；
+没有任何变化时不写库，调用方据此跳过下游同步。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Mapping
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .idempotency import forget_idempotency_key
+from .models import INSTANT_SOURCE_FIELDS, Event, EventChange, event_instants
+
+
+class ConcurrentUpdateError(Exception):
+    """事件已被其他请求修改（version 不匹配或行已删除）"""
+
+    def __init__(self, event_id: int, expected_version: int):
+        super().__init__(f'Event {event_id} was modified concurrently (expected version {expected_version})')
+        self.event_id = event_id
+        self.expected_version = expected_version
+
+
+def diff_event_fields(event: Event, changes: Mapping[str, Any]) -> dict:
+    return {name: value for name, value in changes.items() if getattr(event, name) != value}
+
+
+def update_event_fields(event: Event, changes: Mapping[str, Any], expected_version: int | None = None) -> list[str]:
+    """
+    把 changes 中与 event 当前值不同的字段写回数据库
+
+    :param expected_version: 客户端读到的版本；缺省为 event.version（即本次读取之后没有别人写过）
+    :return: 实际变化的字段名列表；空列表表示没有写库
+    :raises ConcurrentUpdateError: version 不匹配
+    """
+    expected = event.version if expected_version is None else int(expected_version)
+    changed = diff_event_fields(event, changes)
+    if not changed:
+        if expected != event.version:
+            raise ConcurrentUpdateError(event.pk, expected)
+        return []
+
+    if set(changed) & set(INSTANT_SOURCE_FIELDS):
+        merged = {name: changed.get(name, getattr(event, name)) for name in INSTANT_SOURCE_FIELDS}
+        changed['starts_at'], changed['ends_at'] = event_instants(
+            merged['date'], merged['start_time'], int(merged['duration']),
+        )
+
+    fields = list(changed)
+    if forget_idempotency_key(event, changed):
+        changed['idempotency_key'] = None
+
+    now = timezone.now()
+    # UPDATE、变更日志和 event_changes_recorded 的接收方（如同步 outbox）一起提交或一起回滚
+    with transaction.atomic():
+        rows = Event.objects.filter(pk=event.pk, version=expected).update(
+            **changed,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+        if rows == 0:
+            raise ConcurrentUpdateError(event.pk, expected)
+        EventChange.record(event.user_id, [event.pk], EventChange.UPSERT)
+
+    for name, value in changed.items():
+        setattr(event, name, value)
+    event.version = expected + 1
+    event.updated_at = now
+    return fields
@@ -1,11 +1,14 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import EventViewSet
+from .views import EventExportView, EventImportView, EventViewSet
 
 router = DefaultRouter()
 router.register(r'', EventViewSet, basename='event')
 
 urlpatterns = [
+    # 放在 router 之前：否则会被 <pk>.<format> 后缀路由匹配
+    path('export.ndjson', EventExportView.as_view()),
+    path('import.ndjson', EventImportView.as_view()),
     path('', include(router.urls)),
 ]
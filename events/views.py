@@ -1,20 +1,345 @@
-from rest_framework import permissions, viewsets
+from datetime import date, time, timedelta
 
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .bulk import BulkValidationError, apply_operations
+from .changes import changes_since
+from .cache import CachedResponse, event_list_cache
+from .conditional import Validators, detail_validators, list_validators
+from .fastread import parse_fields, render_json, serialize_rows
+from .freebusy import find_free_slots
+from .idempotency import IDEMPOTENCY_HEADER, make_idempotency_key
 from .models import Event
+from .ndjson import NDJSONRenderer, iter_export, iter_import
+from .pagination import EventKeysetPagination
+from .search import search_events
+from .summary import GRANULARITIES, summarize
 from .serializers import EventSerializer
+from .updates import ConcurrentUpdateError, update_event_fields
+
+
+class EventConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Event was modified by another request; reload and retry.'
+    default_code = 'conflict'
 
 
 class EventViewSet(viewsets.ModelViewSet):
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EventKeysetPagination
+
+    free_slots_max_days = 92
+    free_slots_max_users = 50
+    changes_page_size = 500
+    bulk_max_operations = 500
+    search_page_size = 20
+    search_max_page_size = 100
+    search_max_query_length = 200
+    summary_max_days = 400
+    changes_max_page_size = 2000
 
     def get_queryset(self):
-        return Event.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Event.objects.filter(user=self.request.user)
+        if self.action != 'list':
+            return queryset.order_by('-created_at')
+        return self.filter_date_range(queryset).order_by(*self.paginator.get_ordering(self.request))
+
+    def filter_date_range(self, queryset):
+        """?start=YYYY-MM-DD&end=YYYY-MM-DD（end 不含），与 free-slots 的窗口语义一致"""
+        params = self.request.query_params
+        try:
+            if params.get('start'):
+                queryset = queryset.filter(date__gte=date.fromisoformat(params['start']))
+            if params.get('end'):
+                queryset = queryset.filter(date__lt=date.fromisoformat(params['end']))
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        JSON 请求走 values() + 直接编码的轻量路径，渲染结果按用户分代缓存；
+        可浏览 API 等其他渲染器仍走 EventSerializer
+        """
+        if getattr(request.accepted_renderer, 'format', None) != 'json':
+            return super().list(request, *args, **kwargs)
+
+        entry, hit = event_list_cache.get_or_build(
+            request.user.id, request.query_params, lambda: self.render_list(request),
+        )
+        return self.cached_response(request, entry, hit)
+
+    def cached_response(self, request, entry: CachedResponse, hit: bool) -> HttpResponse:
+        """由缓存条目生成响应（或 304），带上校验头与 X-Cache"""
+        validators = Validators(entry.etag, entry.last_modified)
+        response = validators.not_modified_response(request)
+        if response is None:
+            response = HttpResponse(entry.body, content_type='application/json')
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return validators.apply(response)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    def render_list(self, request) -> CachedResponse:
+        fields = parse_fields(request.query_params.get('fields'))
+        queryset = self.get_queryset()
+        validators = list_validators(queryset, request)
+        ordering_columns = [name.lstrip('-') for name in self.paginator.get_ordering(request)]
+        columns = list(dict.fromkeys([*fields, *ordering_columns]))
+        rows = self.paginate_queryset(queryset.values(*columns))
+        if rows is None:
+            payload = serialize_rows(queryset.values(*columns).iterator(chunk_size=2000), fields)
+        else:
+            payload = self.paginator.get_paginated_data(serialize_rows(rows, fields))
+        return CachedResponse(render_json(payload), validators.etag, validators.last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = detail_validators(self.get_queryset(), kwargs[self.lookup_field])
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        not_modified = validators.not_modified_response(request)
+        if not_modified is not None:
+            return validators.apply(not_modified)
+        return validators.apply(super().retrieve(request, *args, **kwargs))
+
+    def create(self, request, *args, **kwargs):
+        """重试同一请求（Idempotency-Key 头或相同内容）时返回已有事件，状态码 200"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = make_idempotency_key(
+            request.user.id,
+            serializer.validated_data,
+            client_key=request.META.get(IDEMPOTENCY_HEADER),
+        )
+        existing = Event.objects.filter(user=request.user, idempotency_key=key).first()
+        if existing is not None:
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        try:
+            with transaction.atomic():
+                self.perform_create(serializer, idempotency_key=key)
+        except IntegrityError:
+            existing = Event.objects.get(user=request.user, idempotency_key=key)
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def perform_create(self, serializer, idempotency_key=None):
+        serializer.validated_data.pop('version', None)
+        serializer.save(user=self.request.user, idempotency_key=idempotency_key)
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        # 客户端据此决定是否需要再触发日历同步
+        response['X-Event-Changed'] = '1' if self.changed_fields else '0'
+        return response
 
     def perform_update(self, serializer):
-        serializer.save(user=self.request.user)
+        changes = dict(serializer.validated_data)
+        expected_version = changes.pop('version', None)
+        try:
+            self.changed_fields = update_event_fields(serializer.instance, changes, expected_version)
+        except ConcurrentUpdateError as exc:
+            raise EventConflict(str(exc))
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        GET /api/events/summary/?granularity=day&start=2026-03-01&end=2026-04-01
+        每个时间段的事件数、忙碌分钟数与分类计数（列式）；缺省为本月按天
+        """
+        params = request.query_params
+        granularity = params.get('granularity', 'day')
+        if granularity not in GRANULARITIES:
+            raise ValidationError({'granularity': f'must be one of {", ".join(GRANULARITIES)}'})
+        try:
+            today = timezone.localdate()
+            start = date.fromisoformat(params['start']) if params.get('start') else today.replace(day=1)
+            end = date.fromisoformat(params['end']) if params.get('end') else (start + timedelta(days=32)).replace(day=1)
+        except ValueError as exc:
+            raise ValidationError({'detail': str(exc)})
+        if not 0 < (end - start).days <= self.summary_max_days:
+            raise ValidationError({'detail': f'end must be 1-{self.summary_max_days} days after start'})
+
+        def build():
+            queryset = Event.objects.filter(user=request.user, date__gte=start, date__lt=end)
+            validators = list_validators(queryset, request)
+            payload = {**summarize(queryset, granularity), 'start': start.isoformat(), 'end': end.isoformat()}
+            return CachedResponse(render_json(payload), validators.etag, validators.last_modified)
+
+        entry, hit = event_list_cache.get_or_build(request.user.id, params, build, namespace='summary')
+        return self.cached_response(request, entry, hit)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        GET /api/events/search/?q=dentist&limit=20&offset=0
+        按相关度返回当前用户匹配的事件；next_offset 为 null 表示没有更多
+        """
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if not query or len(query) > self.search_max_query_length:
+            return Response(
+                {'ok': False, 'error': f'q must be 1-{self.search_max_query_length} characters'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = max(1, min(int(params.get('limit', self.search_page_size)), self.search_max_page_size))
+            offset = max(0, int(params.get('offset', 0)))
+        except ValueError:
+            raise ValidationError({'detail': 'limit and offset must be integers'})
+        payload = search_events(request.user.id, query, limit=limit, offset=offset)
+        return HttpResponse(render_json(payload), content_type='application/json')
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        POST /api/events/bulk/
+        {"operations": [{"op": "create", "data": {...}}, {"op": "update", "id": 1, "data": {...}}, {"op": "delete", "id": 2}]}
+        全部成功才提交；返回与输入同序的逐条结果
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else request.data
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {'ok': False, 'error': 'operations must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(operations) > self.bulk_max_operations:
+            return Response(
+                {'ok': False, 'error': f'at most {self.bulk_max_operations} operations'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            results = apply_operations(request.user, operations, client_key=request.META.get(IDEMPOTENCY_HEADER))
+        except BulkValidationError as exc:
+            return Response({'ok': False, 'results': exc.results}, status=status.HTTP_400_BAD_REQUEST)
+        except ConcurrentUpdateError as exc:
+            raise EventConflict(str(exc))
+        except IntegrityError:
+            raise EventConflict('A concurrent request created the same events; retry the batch.')
+        return HttpResponse(render_json({'ok': True, 'results': results}), content_type='application/json')
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        GET /api/events/changes/?since=<token>&limit=500
+        返回 token 之后的变更；has_more 为 true 时用返回的 token 继续读取。since 缺省或为 0 表示全量
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.changes_page_size))
+        except ValueError:
+            raise ValidationError({'limit': 'must be an integer'})
+        limit = max(1, min(limit, self.changes_max_page_size))
+        payload = changes_since(request.user, request.query_params.get('since'), limit)
+        return HttpResponse(render_json(payload), content_type='application/json')
+
+    @action(detail=False, methods=['get'], url_path='free-slots')
+    def free_slots(self, request):
+        """
+        GET /api/events/free-slots/?users=alice,bob&start=2026-03-02&end=2026-03-09
+            &duration=90&work_start=09:00&work_end=18:00&granularity=30
+        返回所有指定用户（以及当前用户）都空闲的候选时段；
+        只能查询在个人资料里把当前用户加入 free_busy_viewers 的用户，其他用户一律 404
+        """
+        params = request.query_params
+        try:
+            first_day = date.fromisoformat(params['start']) if params.get('start') else timezone.localdate()
+            last_day = date.fromisoformat(params['end']) if params.get('end') else first_day + timedelta(days=7)
+            duration = int(params.get('duration', 60))
+            granularity = int(params.get('granularity', 30))
+            work_start = time.fromisoformat(params.get('work_start', '09:00'))
+            work_end = time.fromisoformat(params.get('work_end', '18:00'))
+            limit = int(params.get('limit', 20))
+            weekdays = [int(d) for d in params.get('weekdays', '0,1,2,3,4').split(',') if d != '']
+        except ValueError as exc:
+            return Response({'ok': False, 'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        days = (last_day - first_day).days
+        if days <= 0 or days > self.free_slots_max_days:
+            return Response(
+                {'ok': False, 'error': f'end must be 1-{self.free_slots_max_days} days after start'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if duration <= 0 or granularity <= 0 or limit <= 0 or work_end <= work_start:
+            return Response(
+                {'ok': False, 'error': 'duration, granularity, limit and working hours must be positive'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user_ids = {request.user.id}
+        names = [n.strip() for n in params.get('users', '').split(',') if n.strip()]
+        if len(names) > self.free_slots_max_users:
+            return Response(
+                {'ok': False, 'error': f'at most {self.free_slots_max_users} users'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if names:
+            # 不存在和未共享的用户不作区分，避免借此探测用户名
+            found = dict(
+                get_user_model().objects
+                .filter(username__in=names, profile__free_busy_viewers=request.user)
+                .values_list('username', 'id')
+            )
+            found.setdefault(request.user.username, request.user.id)
+            missing = [n for n in names if n not in found]
+            if missing:
+                return Response(
+                    {'ok': False, 'error': f'unknown users: {", ".join(missing)}'},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            user_ids.update(found.values())
+
+        slots = find_free_slots(
+            sorted(user_ids),
+            first_day,
+            days,
+            duration,
+            work_start=work_start,
+            work_end=work_end,
+            granularity=granularity,
+            weekdays=weekdays,
+            limit=limit,
+        )
+        return Response({
+            'ok': True,
+            'duration': duration,
+            'slots': [
+                {'start': slot.start.isoformat(), 'end': slot.end.isoformat(), 'score': slot.score}
+                for slot in slots
+            ],
+        })
+
+
+class EventExportView(APIView):
+    """GET /api/events/export.ndjson：流式导出当前用户的全部事件"""
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, JSONRenderer]
+
+    def get(self, request):
+        response = StreamingHttpResponse(iter_export(request.user.id), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="events.ndjson"'
+        return response
+
+
+class EventImportView(APIView):
+    """
+    POST /api/events/import.ndjson（请求体为 NDJSON）
+    边读请求流边写入，响应同样是 NDJSON：每提交一批输出一行进度，最后一行带 done 与错误明细
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, JSONRenderer]
 
-# Create your views here.
+    def post(self, request):
+        # 不访问 request.data：直接按行读取底层流，避免把整个请求体载入内存
+        stream = request.stream
+        lines = iter(stream) if stream is not None else iter(())
+        return StreamingHttpResponse(iter_import(request.user, lines), content_type='application/x-ndjson')
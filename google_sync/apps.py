@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GoogleSyncConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'google_sync'
+
+    def ready(self):
+        from . import signals  # noqa: F401
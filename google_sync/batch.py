@@ -0,0 +1,182 @@
+"""
+Batch sync to Google Calendar: inserts, updates and deletes are sent through Google's batch HTTP endpoint.
+
+Each batch carries at most BATCH_CHUNK_SIZE calls (Google recommends <= 50, hard limit 1000).
+Per-call results are matched back by request_id (the Event id); google_event_id values for newly
+inserted events and the synced body fingerprints are written back with bulk_update.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+
+from googleapiclient.errors import HttpError
+
+from events.models import Event
+from .services import prepare_push, push_request
+from .signals import suppress_outbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_CHUNK_SIZE = 50
+
+
+@dataclass
+class BatchSyncResult:
+    event_id: int
+    action: str
+    ok: bool
+    google_event_id: str | None = None
+    html_link: str | None = None
+    error: str | None = None
+    # False for failures a retry cannot fix (e.g. 400, 404); the outbox dead-letters those at once
+    retryable: bool = True
+
+    def as_dict(self) -> dict:
+        return {
+            'event_id': self.event_id,
+            'action': self.action,
+            'ok': self.ok,
+            'google_event_id': self.google_event_id,
+            'htmlLink': self.html_link,
+            'error': self.error,
+        }
+
+
+_RATE_LIMIT_REASONS = frozenset({'rateLimitExceeded', 'userRateLimitExceeded'})
+
+
+def is_retryable(exception) -> bool:
+    """Rate limits (429, or 403 with a rate-limit reason), 5xx and transport errors; other 4xx are permanent."""
+    if not isinstance(exception, HttpError):
+        return True
+    status = exception.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403 and isinstance(exception.error_details, list):
+        return any(
+            isinstance(detail, dict) and detail.get('reason') in _RATE_LIMIT_REASONS
+            for detail in exception.error_details
+        )
+    return False
+
+
+def _error_message(exception) -> str:
+    if isinstance(exception, HttpError):
+        return f'{exception.resp.status} {exception.reason}'
+    return str(exception)
+
+
+def sync_events_batch(
+    service,
+    events: list[Event],
+    calendar_id: str = 'primary',
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> list[BatchSyncResult]:
+    """
+    Insert events without a google_event_id and update the rest.
+
+    Events whose body matches the last synced fingerprint are reported as 'unchanged' without a
+    request; changed ones are sent as a PATCH of the changed fields. Returns one result per event,
+    in input order; a failed call does not affect the others.
+    """
+    by_id = {event.pk: event for event in events}
+    results: dict[int, BatchSyncResult] = {}
+    actions: dict[int, str] = {}
+    fingerprints: dict[int, dict] = {}
+    pending = []
+    for event in events:
+        action, body, fingerprints[event.pk] = prepare_push(event)
+        actions[event.pk] = action
+        if action == 'unchanged':
+            results[event.pk] = BatchSyncResult(event.pk, action, ok=True, google_event_id=event.google_event_id)
+        else:
+            pending.append((event, action, body))
+
+    def callback(request_id, response, exception):
+        event = by_id[int(request_id)]
+        action = actions[event.pk]
+        if exception is not None:
+            results[event.pk] = BatchSyncResult(
+                event.pk, action, ok=False, error=_error_message(exception), retryable=is_retryable(exception),
+            )
+            return
+        results[event.pk] = BatchSyncResult(
+            event.pk, action, ok=True,
+            google_event_id=response.get('id'),
+            html_link=response.get('htmlLink'),
+        )
+
+    for offset in range(0, len(pending), chunk_size):
+        chunk = pending[offset:offset + chunk_size]
+        batch = service.new_batch_http_request(callback=callback)
+        for event, action, body in chunk:
+            batch.add(push_request(service, event, action, body, calendar_id), request_id=str(event.pk))
+        try:
+            batch.execute()
+        except Exception as exc:
+            # The whole batch request failed (network, auth): mark every call without a result as failed
+            logger.exception('Google Calendar batch request failed')
+            for event, action, _ in chunk:
+                results.setdefault(event.pk, BatchSyncResult(event.pk, action, ok=False, error=str(exc)))
+
+    inserted = []
+    updated = []
+    for event, action, _ in pending:
+        result = results[event.pk]
+        if not result.ok:
+            continue
+        event.google_sync_fingerprint = fingerprints[event.pk]
+        if action == 'insert' and result.google_event_id:
+            event.google_event_id = result.google_event_id
+            event.google_calendar_id = calendar_id
+            inserted.append(event)
+        else:
+            updated.append(event)
+    # Recording what Google now holds is not a change to push back
+    with suppress_outbox():
+        if inserted:
+            Event.objects.bulk_update(inserted, ['google_event_id', 'google_calendar_id', 'google_sync_fingerprint'])
+        if updated:
+            Event.objects.bulk_update(updated, ['google_sync_fingerprint'])
+    return [results[event.pk] for event in events]
+
+
+def delete_events_batch(
+    service,
+    google_event_ids: dict[int, str],
+    calendar_id: str = 'primary',
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> dict[int, BatchSyncResult]:
+    """
+    Delete remote events, keyed by local event id.
+
+    Returns {event_id: result} for the deletes that failed; events already gone (404/410) count as deleted.
+    """
+    errors: dict[int, BatchSyncResult] = {}
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            return
+        if isinstance(exception, HttpError) and exception.resp.status in (404, 410):
+            return
+        errors[int(request_id)] = BatchSyncResult(
+            int(request_id), 'delete', ok=False, error=_error_message(exception), retryable=is_retryable(exception),
+        )
+
+    items = list(google_event_ids.items())
+    for offset in range(0, len(items), chunk_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for event_id, google_event_id in items[offset:offset + chunk_size]:
+            batch.add(
+                service.events().delete(calendarId=calendar_id, eventId=google_event_id, sendUpdates='none'),
+                request_id=str(event_id),
+            )
+        try:
+            batch.execute()
+        except Exception as exc:
+            logger.exception('Google Calendar batch request failed')
+            for event_id, _ in items[offset:offset + chunk_size]:
+                errors.setdefault(event_id, BatchSyncResult(event_id, 'delete', ok=False, error=str(exc)))
+    return errors
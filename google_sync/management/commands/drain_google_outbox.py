@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from google_sync.outbox import drain_outbox, requeue_dead
+
+
+class Command(BaseCommand):
+    help = 'Push queued event changes to Google Calendar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between passes when idle')
+        parser.add_argument('--users', type=int, default=50, help='Users handled per pass')
+        parser.add_argument('--retry-dead', action='store_true', help='Requeue dead-lettered changes first')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f'Requeued {requeue_dead()} dead change(s)')
+        while True:
+            result = drain_outbox(user_limit=options['users'])
+            if any(result.as_dict().values()) or options['once']:
+                self.stdout.write(
+                    f'Pushed {result.pushed}, failed {result.failed}, dead {result.dead}, dropped {result.dropped}'
+                )
+            if options['once']:
+                return
+            if not result.pushed:
+                time.sleep(options['interval'])
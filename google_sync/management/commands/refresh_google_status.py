@@ -0,0 +1,29 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from google_sync.refresh import jittered
+from google_sync.status import BATCH_SIZE, STATUS_TTL, refresh_stale_statuses
+
+
+class Command(BaseCommand):
+    help = 'Re-check cached Google account identities and connection health older than the TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between scans')
+        parser.add_argument('--ttl', type=int, default=int(STATUS_TTL.total_seconds()),
+                            help='Re-check identities older than this many seconds')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        ttl = timedelta(seconds=options['ttl'])
+        while True:
+            ok, not_ok = refresh_stale_statuses(ttl=ttl, limit=options['batch_size'])
+            if ok or not_ok or options['once']:
+                self.stdout.write(f'Checked {ok + not_ok} Google connection(s), {not_ok} not healthy')
+            if options['once']:
+                return
+            if ok + not_ok < options['batch_size']:
+                time.sleep(jittered(options['interval'], 0.2))
@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from google_sync.refresh import BATCH_SIZE, REFRESH_MARGIN, jittered, refresh_due_tokens
+
+
+class Command(BaseCommand):
+    help = 'Refresh Google OAuth access tokens shortly before they expire'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process one batch and exit')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between scans')
+        parser.add_argument('--jitter', type=float, default=0.2, help='Random spread of the interval (fraction)')
+        parser.add_argument('--margin', type=int, default=int(REFRESH_MARGIN.total_seconds()),
+                            help='Refresh tokens expiring within this many seconds')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--rate', type=float, default=5, help='Maximum refreshes per second (0 = unlimited)')
+        parser.add_argument('--retry-after', type=int, default=900,
+                            help='Seconds to skip a token after a failed refresh')
+
+    def handle(self, *args, **options):
+        margin = timedelta(seconds=options['margin'])
+        retry_after = timedelta(seconds=options['retry_after'])
+        backoff = {}
+        while True:
+            now = timezone.now()
+            backoff = {token_id: until for token_id, until in backoff.items() if until > now}
+            refreshed, failed = refresh_due_tokens(
+                now, margin, options['batch_size'], options['rate'] or None, exclude_ids=list(backoff),
+            )
+            for token_id in failed:
+                backoff[token_id] = now + retry_after
+            if refreshed or failed or options['once']:
+                self.stdout.write(f'Refreshed {refreshed} token(s), {len(failed)} failed')
+            if options['once']:
+                return
+            # A full batch means more tokens are due: continue without waiting
+            if refreshed + len(failed) < options['batch_size']:
+                time.sleep(jittered(options['interval'], options['jitter']))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from google_sync.refresh import jittered
+from google_sync.watch import renew_expiring_channels, run_due_syncs
+
+
+class Command(BaseCommand):
+    help = 'Run debounced Google Calendar pulls for push notifications and renew expiring watch channels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run due pulls and renewals once and exit')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds between scans for due pulls')
+        parser.add_argument('--renew-every', type=float, default=600, help='Seconds between channel renewal scans')
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        next_renewal = 0.0
+        while True:
+            synced, failed = run_due_syncs(limit=options['batch_size'])
+            if synced or failed or options['once']:
+                self.stdout.write(f'Pulled {synced} calendar(s), {failed} failed')
+            if time.monotonic() >= next_renewal:
+                renewed = renew_expiring_channels()
+                if renewed or options['once']:
+                    self.stdout.write(f'Renewed {renewed} watch channel(s)')
+                next_renewal = time.monotonic() + jittered(options['renew_every'], 0.2)
+            if options['once']:
+                return
+            if synced + failed < options['batch_size']:
+                time.sleep(options['interval'])
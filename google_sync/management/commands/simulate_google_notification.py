@@ -0,0 +1,25 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from google_sync.models import GoogleWatchChannel
+from google_sync.watch import notification_headers
+
+
+class Command(BaseCommand):
+    help = 'Send Google-style watch notifications for a channel to a local webhook (development stand-in)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('channel_id', help='GoogleWatchChannel.channel_id')
+        parser.add_argument('--url', default='http://localhost:8000/api/google/webhook/')
+        parser.add_argument('--count', type=int, default=1, help='Notifications to send in a burst')
+        parser.add_argument('--state', default='exists', choices=['sync', 'exists', 'not_exists'])
+
+    def handle(self, *args, **options):
+        try:
+            channel = GoogleWatchChannel.objects.get(channel_id=options['channel_id'])
+        except GoogleWatchChannel.DoesNotExist:
+            raise CommandError(f"Unknown channel {options['channel_id']}")
+        for offset in range(1, options['count'] + 1):
+            headers = notification_headers(channel, channel.last_message_number + offset, options['state'])
+            response = requests.post(options['url'], headers=headers, timeout=5)
+            self.stdout.write(f"#{headers['X-Goog-Message-Number']}: {response.status_code} {response.text}")
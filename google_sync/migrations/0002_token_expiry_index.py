@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='googleoauthtoken',
+            index=models.Index(fields=['expiry'], name='googletoken_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_sync', '0003_calendar_sync_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleWatchChannel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calendar_id', models.CharField(default='primary', max_length=255)),
+                ('channel_id', models.CharField(max_length=64, unique=True)),
+                ('resource_id', models.CharField(blank=True, default='', max_length=255)),
+                ('token', models.CharField(max_length=64)),
+                ('expiration', models.DateTimeField()),
+                ('last_message_number', models.BigIntegerField(default=0)),
+                ('sync_due_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='google_watch_channels', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expiration'], name='googlewatch_expiration_idx'), models.Index(fields=['sync_due_at'], name='googlewatch_sync_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_sync', '0005_sync_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googleoauthtoken',
+            name='account_email',
+            field=models.CharField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='googleoauthtoken',
+            name='status',
+            field=models.CharField(choices=[('unknown', 'Not checked yet'), ('ok', 'Connected'), ('error', 'Needs reconnect')], default='unknown', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='googleoauthtoken',
+            name='status_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='googleoauthtoken',
+            name='status_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='googleoauthtoken',
+            index=models.Index(fields=['status_checked_at'], name='googletoken_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_sync', '0006_token_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googlesyncoutbox',
+            name='google_calendar_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
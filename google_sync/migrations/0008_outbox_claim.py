@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('google_sync', '0007_outbox_calendar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googlesyncoutbox',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='googlesyncoutbox',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
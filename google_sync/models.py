@@ -1,8 +1,18 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class GoogleOAuthToken(models.Model):
+    UNKNOWN = 'unknown'
+    OK = 'ok'
+    ERROR = 'error'
+    STATUS_CHOICES = [
+        (UNKNOWN, 'Not checked yet'),
+        (OK, 'Connected'),
+        (ERROR, 'Needs reconnect'),
+    ]
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     access_token = models.TextField()
     refresh_token = models.TextField(null=True, blank=True)
@@ -12,6 +22,111 @@ class GoogleOAuthToken(models.Model):
     scopes = models.TextField()
     expiry = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Account identity and connection health as last seen by the status worker, served by the status endpoint
+    account_email = models.CharField(max_length=254, blank=True, default='')
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=UNKNOWN)
+    status_error = models.TextField(blank=True, default='')
+    status_checked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Background refresher scans tokens that expire soon
+            models.Index(fields=['expiry'], name='googletoken_expiry_idx'),
+            # Status worker scans identities older than the TTL
+            models.Index(fields=['status_checked_at'], name='googletoken_status_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'GoogleOAuthToken({self.user_id})'
+
+
+class GoogleCalendarSyncState(models.Model):
+    """Incremental pull position for one of a user's Google calendars."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='google_sync_states')
+    calendar_id = models.CharField(max_length=255, default='primary')
+    # nextSyncToken from the last completed events.list; empty means the next pull is a full sync
+    sync_token = models.TextField(blank=True, default='')
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'calendar_id'], name='googlesyncstate_user_calendar_uniq'),
+        ]
+
+    def __str__(self) -> str:
+        return f'GoogleCalendarSyncState({self.user_id}, {self.calendar_id})'
+
+
+class GoogleWatchChannel(models.Model):
+    """A Calendar push-notification channel (events.watch) for one of a user's calendars."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='google_watch_channels')
+    calendar_id = models.CharField(max_length=255, default='primary')
+    channel_id = models.CharField(max_length=64, unique=True)
+    resource_id = models.CharField(max_length=255, blank=True, default='')
+    # Echoed back by Google in X-Goog-Channel-Token; notifications without it are rejected
+    token = models.CharField(max_length=64)
+    expiration = models.DateTimeField()
+    # Highest X-Goog-Message-Number seen, to drop redelivered notifications
+    last_message_number = models.BigIntegerField(default=0)
+    # Set by the first notification of a burst; the worker pulls once this time has passed
+    sync_due_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Renewal scan
+            models.Index(fields=['expiration'], name='googlewatch_expiration_idx'),
+            # Worker picks channels with a pending sync
+            models.Index(fields=['sync_due_at'], name='googlewatch_sync_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'GoogleWatchChannel({self.user_id}, {self.calendar_id}, {self.channel_id})'
+
+
+class GoogleSyncOutbox(models.Model):
+    """
+    Pending push of a local event change to Google Calendar.
+
+    Rows are appended in the same transaction as the Event write and removed once Google has
+    accepted the change; rows that keep failing end up dead (the dead-letter queue). A pusher
+    leases a user's rows (claimed_by / claimed_until) so no two push the same change.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    OP_CHOICES = [
+        (UPSERT, 'Create or update'),
+        (DELETE, 'Delete'),
+    ]
+    PENDING = 'pending'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (DEAD, 'Dead'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='google_outbox')
+    event_id = models.BigIntegerField()
+    op = models.CharField(max_length=8, choices=OP_CHOICES)
+    # Snapshot for deletes: the event row is gone by the time the worker runs
+    google_event_id = models.CharField(max_length=255, blank=True, null=True)
+    google_calendar_id = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    # Lease held by the worker (or manual sync request) pushing this row; expires if it dies
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Worker scan for due rows
+            models.Index(fields=['status', 'next_attempt_at'], name='googleoutbox_status_due_idx'),
+            # One user's pending rows in write order
+            models.Index(fields=['user', 'status', 'id'], name='googleoutbox_user_status_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'GoogleSyncOutbox({self.op} event {self.event_id}, {self.status})'
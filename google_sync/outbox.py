@@ -0,0 +1,213 @@
+"""
+Drain GoogleSyncOutbox: push queued event changes to Google Calendar.
+
+Each pass takes the users that have due rows and handles each user's rows in write order. The
+rows are coalesced so every event is pushed once in its latest state (an update after an
+insert is a single insert, an update followed by a delete is a single delete), and the pushes go
+out through batch requests. Accepted rows are removed. A failed event is retried with
+exponential backoff, and while its row heads the user's queue that user's later changes wait
+too, which keeps the per-user ordering. After MAX_ATTEMPTS the rows are marked dead (the
+dead-letter queue) and stop blocking; failures a retry cannot fix (400, 404, a 403 that is not
+a rate limit, ...) are dead-lettered on the first attempt. `drain_google_outbox --retry-dead`
+requeues dead rows.
+
+Whoever pushes a user's rows (a drain worker or the manual sync endpoints through push_now)
+first leases them for CLAIM_TTL; while a lease is live nobody else touches that user's queue, so
+two pushers never send the same insert twice.
+"""
+
+from __future__ import annotations
+
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.db.models import Q
+from django.utils import timezone
+
+from events.models import Event
+from .batch import BatchSyncResult, delete_events_batch, sync_events_batch
+from .models import GoogleOAuthToken, GoogleSyncOutbox
+from .refresh import jittered
+from .services import user_calendar_service
+
+MAX_ATTEMPTS = 8
+BASE_DELAY = timedelta(seconds=30)
+MAX_DELAY = timedelta(hours=6)
+USER_BATCH_SIZE = 200
+# Longer than one user's batches take; a lease left by a crashed worker frees up after this
+CLAIM_TTL = timedelta(minutes=5)
+
+
+@dataclass
+class DrainResult:
+    pushed: int = 0
+    failed: int = 0
+    dead: int = 0
+    dropped: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with +/-20% jitter: 30s, 1m, 2m, ... capped at MAX_DELAY."""
+    delay = min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY)
+    return timedelta(seconds=jittered(delay.total_seconds(), 0.2))
+
+
+def coalesce(rows: list[GoogleSyncOutbox]) -> dict[int, GoogleSyncOutbox]:
+    """Latest row per event; rows must be in id order."""
+    latest: dict[int, GoogleSyncOutbox] = {}
+    for row in rows:
+        latest[row.event_id] = row
+    return latest
+
+
+def _pending(user_id: int):
+    return GoogleSyncOutbox.objects.filter(user_id=user_id, status=GoogleSyncOutbox.PENDING)
+
+
+def _release(claim: str) -> None:
+    GoogleSyncOutbox.objects.filter(claimed_by=claim).update(claimed_by='', claimed_until=None)
+
+
+def claim_rows(user_id: int, now: datetime) -> list[GoogleSyncOutbox] | None:
+    """
+    Lease the user's next USER_BATCH_SIZE pending rows; None while another pusher holds a lease.
+
+    The UPDATE only takes rows without a live lease, so each row goes to one claimant. Two
+    claimants racing for the same user can still split the queue between them; both then see
+    the other's lease, give theirs back and leave the user to the next pass.
+    """
+    if _pending(user_id).filter(claimed_until__gt=now).exists():
+        return None
+    unclaimed = Q(claimed_until__isnull=True) | Q(claimed_until__lte=now)
+    ids = list(_pending(user_id).filter(unclaimed).order_by('id').values_list('pk', flat=True)[:USER_BATCH_SIZE])
+    if not ids:
+        return None
+    claim = uuid.uuid4().hex
+    GoogleSyncOutbox.objects.filter(pk__in=ids).filter(unclaimed).update(
+        claimed_by=claim, claimed_until=now + CLAIM_TTL,
+    )
+    if _pending(user_id).filter(claimed_until__gt=now).exclude(claimed_by=claim).exists():
+        _release(claim)
+        return None
+    return list(GoogleSyncOutbox.objects.filter(claimed_by=claim).select_related('user').order_by('id'))
+
+
+def _fail(rows: list[GoogleSyncOutbox], errors: dict[int, str], now: datetime, result: DrainResult,
+          permanent: set[int] = frozenset()) -> None:
+    for row in rows:
+        row.attempts += 1
+        row.last_error = errors.get(row.event_id, '')[:2000]
+        row.claimed_by, row.claimed_until = '', None
+        if row.event_id in permanent or row.attempts >= MAX_ATTEMPTS:
+            row.status = GoogleSyncOutbox.DEAD
+        else:
+            row.next_attempt_at = now + retry_delay(row.attempts)
+    GoogleSyncOutbox.objects.bulk_update(
+        rows, ['attempts', 'last_error', 'status', 'next_attempt_at', 'claimed_by', 'claimed_until'],
+    )
+    result.failed += len({row.event_id for row in rows if row.status == GoogleSyncOutbox.PENDING})
+    result.dead += len({row.event_id for row in rows if row.status == GoogleSyncOutbox.DEAD})
+
+
+def _drain_user(user, rows: list[GoogleSyncOutbox], now: datetime, service_for: Callable,
+                result: DrainResult) -> dict[int, BatchSyncResult]:
+    """Push claimed rows; returns the outcome per event id (empty when nothing could be sent)."""
+    try:
+        service = service_for(user)
+    except GoogleOAuthToken.DoesNotExist:
+        # Not connected to Google: nothing to push to
+        GoogleSyncOutbox.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        result.dropped += len(rows)
+        return {}
+    except Exception as exc:
+        _fail(rows, {row.event_id: str(exc) for row in rows}, now, result)
+        return {}
+
+    latest = coalesce(rows)
+    upserts: dict[str, list[int]] = {}
+    deletes: dict[str, dict[int, str]] = {}
+    for event_id, row in latest.items():
+        calendar_id = row.google_calendar_id or 'primary'
+        if row.op == GoogleSyncOutbox.DELETE:
+            deletes.setdefault(calendar_id, {})[event_id] = row.google_event_id
+        else:
+            upserts.setdefault(calendar_id, []).append(event_id)
+    # Upserted events deleted since then without ever reaching Google simply drop out here
+    events = Event.objects.filter(user=user, pk__in=[pk for ids in upserts.values() for pk in ids]).in_bulk()
+    outcomes: dict[int, BatchSyncResult] = {}
+    for calendar_id, event_ids in upserts.items():
+        batch = [events[pk] for pk in event_ids if pk in events]
+        if batch:
+            outcomes.update((outcome.event_id, outcome) for outcome in sync_events_batch(service, batch, calendar_id))
+    for calendar_id, google_event_ids in deletes.items():
+        outcomes.update(delete_events_batch(service, google_event_ids, calendar_id))
+    failures = [outcome for outcome in outcomes.values() if not outcome.ok]
+    errors = {outcome.event_id: outcome.error or 'failed' for outcome in failures}
+    permanent = {outcome.event_id for outcome in failures if not outcome.retryable}
+
+    GoogleSyncOutbox.objects.filter(pk__in=[row.pk for row in rows if row.event_id not in errors]).delete()
+    result.pushed += len(latest) - len(errors)
+    failed = [row for row in rows if row.event_id in errors]
+    if failed:
+        _fail(failed, errors, now, result, permanent)
+    return outcomes
+
+
+def drain_outbox(now: datetime | None = None, user_limit: int = 50,
+                 service_for: Callable = user_calendar_service) -> DrainResult:
+    """One pass over up to user_limit users whose queue head is due."""
+    now = now or timezone.now()
+    result = DrainResult()
+    user_ids = (
+        GoogleSyncOutbox.objects
+        .filter(status=GoogleSyncOutbox.PENDING, next_attempt_at__lte=now)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+    handled = 0
+    for user_id in user_ids:
+        head = _pending(user_id).order_by('id').values_list('next_attempt_at', flat=True).first()
+        # The head of this user's queue is backing off: later changes wait behind it
+        if head is None or head > now:
+            continue
+        rows = claim_rows(user_id, now)
+        if not rows:
+            # Another pusher holds this user's queue
+            continue
+        _drain_user(rows[0].user, rows, now, service_for, result)
+        handled += 1
+        if handled >= user_limit:
+            break
+    return result
+
+
+def push_now(user, event_ids: list[int], calendar_id: str, service) -> dict[int, BatchSyncResult] | None:
+    """
+    Queue upserts for the events and push the user's queue right away, for the manual sync endpoints.
+
+    Returns the outcome per event id, or None when another pusher holds the user's queue; the
+    rows then stay queued and that pusher or the next drain pass sends them.
+    """
+    now = timezone.now()
+    GoogleSyncOutbox.objects.bulk_create([
+        GoogleSyncOutbox(user=user, event_id=event_id, op=GoogleSyncOutbox.UPSERT, google_calendar_id=calendar_id)
+        for event_id in event_ids
+    ])
+    rows = claim_rows(user.pk, now)
+    if rows is None:
+        return None
+    return _drain_user(user, rows, now, lambda _: service, DrainResult())
+
+
+def requeue_dead(user=None) -> int:
+    """Move dead-lettered rows back to pending; returns how many."""
+    rows = GoogleSyncOutbox.objects.filter(status=GoogleSyncOutbox.DEAD)
+    if user is not None:
+        rows = rows.filter(user=user)
+    return rows.update(status=GoogleSyncOutbox.PENDING, attempts=0, next_attempt_at=timezone.now())
@@ -0,0 +1,226 @@
+"""
+Incremental pull from Google Calendar into Event using sync tokens.
+
+The first pull (or one after Google expires the token with 410 Gone) lists the whole calendar;
+later pulls pass the stored nextSyncToken to events.list and only receive changed and cancelled
+events. Remote events are matched to local ones by google_event_id (indexed per user), one
+query per page, and each page is written with bulk_create / bulk_update / one DELETE.
+
+Conflicts are settled by modification time: when the local event's updated_at is newer than
+the remote `updated`, the local copy wins and the remote change is skipped (the next push
+overwrites Google). Otherwise the remote values are applied.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from events.idempotency import forget_idempotency_key
+from events.models import Event, EventChange
+from events.updates import diff_event_fields
+from .models import GoogleCalendarSyncState
+from .services import _extract_valid_emails, body_fingerprint, build_event_payload_from_model, to_google_event_body
+from .signals import suppress_outbox
+
+PAGE_SIZE = 250
+
+
+@dataclass
+class PullResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: int = 0
+    full_sync: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def event_fields_from_google(item: dict) -> dict | None:
+    """Map a Google event resource onto Event fields; None when it has no usable start."""
+    start = item.get('start') or {}
+    end = item.get('end') or {}
+    if 'dateTime' in start:
+        tz = ZoneInfo(settings.TIME_ZONE or 'UTC')
+        starts = _parse_time(start['dateTime']).astimezone(tz)
+        ends = _parse_time(end.get('dateTime') or start['dateTime']).astimezone(tz)
+        fields = {
+            'date': starts.date(),
+            'start_time': starts.time().replace(tzinfo=None),
+            'duration': max(int((ends - starts).total_seconds() // 60), 0),
+        }
+    elif 'date' in start:
+        first = date.fromisoformat(start['date'])
+        last = date.fromisoformat(end['date']) if end.get('date') else first
+        fields = {'date': first, 'start_time': time(0, 0), 'duration': max((last - first).days, 1) * 1440}
+    else:
+        return None
+
+    fields['title'] = (item.get('summary') or '(No title)')[:200]
+    fields['description'] = item.get('description') or None
+    fields['location'] = (item.get('location') or '')[:255] or None
+    reminders = item.get('reminders') or {}
+    if not reminders.get('useDefault', True) and reminders.get('overrides'):
+        fields['reminder'] = int(reminders['overrides'][0]['minutes'])
+    return fields
+
+
+def _synced_fingerprint(event: Event) -> dict[str, str]:
+    return body_fingerprint(to_google_event_body(build_event_payload_from_model(event)))
+
+
+def _attendee_emails(item: dict) -> list[str]:
+    return [attendee['email'] for attendee in item.get('attendees') or [] if attendee.get('email')]
+
+
+def _apply_page(user, calendar_id: str, items: list[dict], result: PullResult, seen: set[str]) -> None:
+    ids = [item['id'] for item in items]
+    local: dict[str, Event] = {}
+    for event in Event.objects.filter(user=user, google_event_id__in=ids):
+        local.setdefault(event.google_event_id, event)
+
+    now = timezone.now()
+    creates: list[Event] = []
+    updates: list[Event] = []
+    update_fields: set[str] = set()
+    deletes: list[int] = []
+    unlinks: list[int] = []
+    for item in items:
+        seen.add(item['id'])
+        event = local.get(item['id'])
+        if event is not None and item.get('updated') and event.updated_at > _parse_time(item['updated']):
+            if item.get('status') == 'cancelled':
+                # The remote copy is gone: queue the newer local one to be recreated instead of patched
+                unlinks.append(event.pk)
+            result.skipped += 1
+            continue
+        if item.get('status') == 'cancelled':
+            if event is not None:
+                deletes.append(event.pk)
+            continue
+        fields = event_fields_from_google(item)
+        if fields is None or item.get('recurrence'):
+            # Event has no recurrence model; recurring series are left in Google
+            result.skipped += 1
+            continue
+        emails = _attendee_emails(item)
+        if event is None:
+            participants = ', '.join(emails)[:500] or None
+            event = Event(user=user, google_event_id=item['id'], google_calendar_id=calendar_id,
+                          participants=participants, **fields)
+            event.google_sync_fingerprint = _synced_fingerprint(event)
+            creates.append(event)
+            continue
+        if sorted(emails) != sorted(_extract_valid_emails(event.participants)):
+            # Only the emails round-trip through Google; keep local free text unless they differ
+            fields['participants'] = ', '.join(emails)[:500] or None
+        changed = diff_event_fields(event, fields)
+        if changed:
+            for name, value in changed.items():
+                setattr(event, name, value)
+            event.version += 1
+            event.updated_at = now
+            # Google already holds these values: the next push only patches what changes after this
+            event.google_sync_fingerprint = _synced_fingerprint(event)
+            updates.append(event)
+            update_fields.update(changed)
+            if forget_idempotency_key(event, changed):
+                update_fields.add('idempotency_key')
+
+    with transaction.atomic(), suppress_outbox():
+        if creates:
+            Event.objects.bulk_create(creates)
+        if updates:
+            Event.objects.bulk_update(updates, sorted(update_fields) + ['version', 'updated_at', 'google_sync_fingerprint'])
+        if deletes:
+            Event.objects.filter(pk__in=deletes).delete()
+    _unlink(user, unlinks)
+    result.created += len(creates)
+    result.updated += len(updates)
+    result.deleted += len(deletes)
+
+
+def _unlink(user, ids: list[int]) -> None:
+    if ids:
+        Event.objects.filter(pk__in=ids).update(google_event_id=None, google_calendar_id=None, updated_at=timezone.now())
+        EventChange.record(user.pk, ids, EventChange.UPSERT)
+
+
+def _reconcile_full_sync(user, state: GoogleCalendarSyncState, seen: set[str], result: PullResult) -> None:
+    """
+    After a full listing, events linked to this calendar that Google no longer returns were deleted remotely.
+
+    They are deleted locally unless edited since the last pull; those are unlinked instead, which
+    queues them in the outbox so the worker recreates them. A calendar that was never pulled
+    before only unlinks.
+    """
+    linked = Event.objects.filter(user=user, google_calendar_id=state.calendar_id, google_event_id__isnull=False)
+    unlink, delete = [], []
+    for event_id, google_event_id, updated_at in linked.values_list('id', 'google_event_id', 'updated_at'):
+        if google_event_id in seen:
+            continue
+        if state.last_synced_at is None or updated_at > state.last_synced_at:
+            unlink.append(event_id)
+        else:
+            delete.append(event_id)
+    _unlink(user, unlink)
+    if delete:
+        with suppress_outbox():
+            Event.objects.filter(pk__in=delete).delete()
+        result.deleted += len(delete)
+
+
+def _list_pages(service, calendar_id: str, sync_token: str):
+    page_token = None
+    while True:
+        params = {'calendarId': calendar_id, 'maxResults': PAGE_SIZE}
+        if sync_token:
+            params['syncToken'] = sync_token
+        if page_token:
+            params['pageToken'] = page_token
+        page = service.events().list(**params).execute()
+        yield page
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def pull_changes(user, service, calendar_id: str = 'primary') -> PullResult:
+    """
+    Bring the user's events up to date with one Google calendar.
+
+    The new sync token is stored only after the last page, so an interrupted pull resumes from
+    the previous token; re-applying a page is harmless.
+    """
+    state, _ = GoogleCalendarSyncState.objects.get_or_create(user=user, calendar_id=calendar_id)
+    result = PullResult(full_sync=not state.sync_token)
+    seen: set[str] = set()
+    try:
+        for page in _list_pages(service, calendar_id, state.sync_token):
+            _apply_page(user, calendar_id, page.get('items') or [], result, seen)
+    except HttpError as exc:
+        if exc.resp.status != 410 or not state.sync_token:
+            raise
+        # Sync token expired: start over with a full listing
+        state.sync_token = ''
+        state.save(update_fields=['sync_token'])
+        return pull_changes(user, service, calendar_id)
+
+    if result.full_sync:
+        _reconcile_full_sync(user, state, seen, result)
+    state.sync_token = page.get('nextSyncToken') or ''
+    state.last_synced_at = timezone.now()
+    state.save(update_fields=['sync_token', 'last_synced_at'])
+    return result
@@ -0,0 +1,74 @@
+"""
+Proactive OAuth token refresh, run by `manage.py refresh_google_tokens`.
+
+Tokens whose expiry falls within the refresh margin are picked up through the expiry index and
+refreshed ahead of time, so interactive requests find a valid access token in the database.
+The margin must exceed google-auth's own refresh threshold (a few minutes), otherwise requests
+would still treat the token as expired and refresh it themselves.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Collection
+
+from django.utils import timezone
+from google.auth.exceptions import GoogleAuthError
+
+from .models import GoogleOAuthToken
+from .services import refresh_stored_credentials
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = timedelta(minutes=10)
+BATCH_SIZE = 100
+
+
+def due_tokens(now: datetime, margin: timedelta = REFRESH_MARGIN, limit: int = BATCH_SIZE,
+               exclude_ids: Collection[int] = ()):
+    """Refreshable tokens expiring before now + margin, soonest first."""
+    return list(
+        GoogleOAuthToken.objects
+        .filter(expiry__lte=now + margin, refresh_token__isnull=False)
+        .exclude(refresh_token='')
+        .exclude(id__in=exclude_ids)
+        .order_by('expiry')[:limit]
+    )
+
+
+def refresh_due_tokens(
+    now: datetime | None = None,
+    margin: timedelta = REFRESH_MARGIN,
+    limit: int = BATCH_SIZE,
+    rate: float | None = None,
+    exclude_ids: Collection[int] = (),
+    sleep: Callable[[float], None] = time.sleep,
+) -> tuple[int, list[int]]:
+    """
+    Refresh one batch of tokens that are about to expire.
+
+    rate caps refreshes per second (None means no cap). Returns (refreshed, failed_token_ids);
+    failed tokens (e.g. revoked grants) are left unchanged for the caller to back off on.
+    """
+    now = now or timezone.now()
+    refreshed = 0
+    failed = []
+    for index, token in enumerate(due_tokens(now, margin, limit, exclude_ids)):
+        if rate and index:
+            sleep(1 / rate)
+        try:
+            refresh_stored_credentials(token)
+        except (GoogleAuthError, OSError):
+            logger.warning('Proactive refresh failed for Google token of user %s', token.user_id, exc_info=True)
+            failed.append(token.pk)
+        else:
+            refreshed += 1
+    return refreshed, failed
+
+
+def jittered(seconds: float, jitter: float) -> float:
+    """seconds spread uniformly by +/- jitter (a fraction), so workers do not poll in lockstep."""
+    return max(0.0, seconds * random.uniform(1 - jitter, 1 + jitter))
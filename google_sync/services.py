@@ -1,14 +1,22 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta, time, timezone as dt_timezone
+from functools import lru_cache
+import hashlib
+import json
+import math
 import re
+import threading
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
+from django.utils import timezone
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 
 from .models import GoogleOAuthToken
 
@@ -49,12 +57,27 @@ def _extract_valid_emails(raw: str | None) -> list[str]:
     return emails
 
 
+# (token updated_at, Credentials) per user id. Access tokens live about an hour, so an entry is
+# reused until it expires; refreshes are serialized per user so concurrent requests trigger a
+# single refresh. Each hit is checked against the token row's updated_at, so a disconnect, a
+# reconnect or a refresh done by another process is noticed on the next call.
+_credentials_cache: dict[int, tuple[datetime, Credentials]] = {}
+_refresh_locks: dict[int, threading.Lock] = {}
+_refresh_locks_guard = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _load_client_config(path: str) -> dict:
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
 def get_google_oauth_flow(state: str | None = None, *, disable_state_check: bool = False) -> Flow:
     scopes = settings.GOOGLE_OAUTH_SCOPES
     if isinstance(scopes, str):
         scopes = [s for s in scopes.split(',') if s]
-    flow = Flow.from_client_secrets_file(
-        settings.GOOGLE_OAUTH_CLIENT_JSON_PATH,
+    flow = Flow.from_client_config(
+        _load_client_config(settings.GOOGLE_OAUTH_CLIENT_JSON_PATH),
         scopes=scopes,
         state=state,
         redirect_uri=settings.GOOGLE_OAUTH_REDIRECT_URI if disable_state_check else None,
@@ -65,33 +88,128 @@ def get_google_oauth_flow(state: str | None = None, *, disable_state_check: bool
     return flow
 
 
-def store_credentials(user, credentials: Credentials) -> GoogleOAuthToken:
-    token, _ = GoogleOAuthToken.objects.get_or_create(user=user)
+_CREDENTIAL_FIELDS = ['access_token', 'refresh_token', 'token_uri', 'client_id', 'client_secret', 'scopes',
+                      'expiry', 'updated_at']
+
+
+def _apply_credentials(token: GoogleOAuthToken, credentials: Credentials) -> None:
     token.access_token = credentials.token
     token.refresh_token = credentials.refresh_token or token.refresh_token
     token.token_uri = credentials.token_uri
     token.client_id = credentials.client_id
     token.client_secret = credentials.client_secret
     token.scopes = ' '.join(credentials.scopes or [])
-    token.expiry = credentials.expiry
+    # google-auth uses naive UTC datetimes
+    token.expiry = credentials.expiry.replace(tzinfo=dt_timezone.utc) if credentials.expiry else None
+
+
+def store_credentials(user, credentials: Credentials) -> GoogleOAuthToken:
+    token, _ = GoogleOAuthToken.objects.get_or_create(user=user)
+    _apply_credentials(token, credentials)
+    # A new grant may belong to another account: the cached identity is re-checked
+    token.account_email = ''
+    token.status = GoogleOAuthToken.UNKNOWN
+    token.status_error = ''
+    token.status_checked_at = None
     token.save()
+    _credentials_cache[user.pk] = (token.updated_at, credentials)
     return token
 
 
-def get_google_credentials(user) -> Credentials:
-    token = GoogleOAuthToken.objects.get(user=user)
-    creds = Credentials(
+def forget_credentials(user_id: int) -> None:
+    """Drop the cached credentials, e.g. after the user disconnects Google."""
+    _credentials_cache.pop(user_id, None)
+
+
+def _cached_credentials(user_id: int) -> Credentials | None:
+    """The cached credentials if still valid and the stored token has not changed since."""
+    entry = _credentials_cache.get(user_id)
+    if entry is None:
+        return None
+    updated_at, creds = entry
+    if creds.valid and GoogleOAuthToken.objects.filter(user_id=user_id, updated_at=updated_at).exists():
+        return creds
+    _credentials_cache.pop(user_id, None)
+    return None
+
+
+def _refresh_lock(user_id: int) -> threading.Lock:
+    with _refresh_locks_guard:
+        return _refresh_locks.setdefault(user_id, threading.Lock())
+
+
+def _credentials_from_token(token: GoogleOAuthToken) -> Credentials:
+    return Credentials(
         token=token.access_token,
         refresh_token=token.refresh_token,
         token_uri=token.token_uri,
         client_id=token.client_id,
         client_secret=token.client_secret,
         scopes=token.scopes.split(' '),
+        expiry=timezone.make_naive(token.expiry, dt_timezone.utc) if token.expiry else None,
     )
-    if creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-        store_credentials(user, creds)
-    return creds
+
+
+def get_google_credentials(user) -> Credentials:
+    """
+    Valid credentials for the user, refreshed if the access token has expired.
+
+    Served from the in-process cache while the access token is valid and the stored token row
+    is unchanged (one indexed query); otherwise one more query loads the token and at most one
+    thread per user refreshes it.
+    Raises GoogleOAuthToken.DoesNotExist if the user has not connected Google.
+    """
+    creds = _cached_credentials(user.pk)
+    if creds is not None:
+        return creds
+    with _refresh_lock(user.pk):
+        creds = _cached_credentials(user.pk)
+        if creds is not None:
+            # Refreshed by another request while we were waiting
+            return creds
+        token = GoogleOAuthToken.objects.get(user=user)
+        creds = _credentials_from_token(token)
+        if creds.expired and creds.refresh_token:
+            _refresh_and_save(token, creds)
+        _credentials_cache[user.pk] = (token.updated_at, creds)
+        return creds
+
+
+def _refresh_and_save(token: GoogleOAuthToken, creds: Credentials) -> None:
+    creds.refresh(Request())
+    _apply_credentials(token, creds)
+    # Leave the status columns to the status worker
+    token.save(update_fields=_CREDENTIAL_FIELDS)
+
+
+def refresh_stored_credentials(token: GoogleOAuthToken) -> Credentials:
+    """Refresh a stored token ahead of its expiry and persist the new access token."""
+    with _refresh_lock(token.user_id):
+        creds = _credentials_from_token(token)
+        _refresh_and_save(token, creds)
+        _credentials_cache[token.user_id] = (token.updated_at, creds)
+        return creds
+
+
+@lru_cache(maxsize=None)
+def _calendar_discovery_document() -> dict:
+    # Bundled with google-api-python-client, so no network fetch; parsed once per process.
+    return json.loads(discovery_cache.get_static_doc('calendar', 'v3'))
+
+
+def calendar_service(credentials: Credentials | None = None, *, http=None):
+    """
+    Calendar v3 client bound to the given credentials (or to an explicit http object in tests).
+
+    Equivalent to build('calendar', 'v3', ...) but skips re-reading and re-parsing the
+    discovery document on every call.
+    """
+    return build_from_document(_calendar_discovery_document(), credentials=credentials, http=http)
+
+
+def user_calendar_service(user):
+    """Calendar client for a connected user; raises GoogleOAuthToken.DoesNotExist otherwise."""
+    return calendar_service(get_google_credentials(user))
 
 
 def build_event_payload_from_model(event) -> GoogleEventPayload:
@@ -122,7 +240,9 @@ def build_event_payload_from_model(event) -> GoogleEventPayload:
 def to_google_event_body(payload: GoogleEventPayload) -> dict:
     if payload.all_day:
         start_date = payload.start.date().isoformat()
-        end_date = (payload.start.date() + timedelta(days=1)).isoformat()
+        # Google's end date is exclusive; a partial last day still counts as a whole one
+        days = max(1, math.ceil((payload.end - payload.start) / timedelta(days=1)))
+        end_date = (payload.start.date() + timedelta(days=days)).isoformat()
         body = {
             'summary': payload.summary,
             'start': {'date': start_date},
@@ -146,3 +266,58 @@ def to_google_event_body(payload: GoogleEventPayload) -> dict:
             'overrides': [{'method': 'popup', 'minutes': int(payload.reminder_minutes)}],
         }
     return body
+
+
+# start / end are merged by PATCH, so switching between timed and all-day must clear the other keys
+_TIME_KEYS = ('date', 'dateTime', 'timeZone')
+
+
+def body_fingerprint(body: dict) -> dict[str, str]:
+    """Short hash of each top-level field of an event body."""
+    return {
+        key: hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+        for key, value in body.items()
+    }
+
+
+def patch_body(body: dict, fingerprint: dict[str, str], previous: dict[str, str]) -> dict:
+    """The fields of body that differ from the previously synced fingerprint; dropped fields become None."""
+    patch = {key: value for key, value in body.items() if previous.get(key) != fingerprint[key]}
+    for key in previous.keys() - body.keys():
+        patch[key] = None
+    for key in ('start', 'end'):
+        if patch.get(key):
+            patch[key] = {name: patch[key].get(name) for name in _TIME_KEYS}
+    return patch
+
+
+def prepare_push(event) -> tuple[str, dict, dict[str, str]]:
+    """
+    Decide how to bring Google up to date with the event.
+
+    Returns (action, body, fingerprint): 'insert' and 'update' carry the full body, 'patch' only
+    the changed fields, and 'unchanged' means the last synced body already matches (nothing to send).
+    The fingerprint is stored on the event once Google has accepted the request.
+    """
+    body = to_google_event_body(build_event_payload_from_model(event))
+    fingerprint = body_fingerprint(body)
+    if not event.google_event_id:
+        return 'insert', body, fingerprint
+    previous = event.google_sync_fingerprint
+    if not previous:
+        # Synced before fingerprints were recorded
+        return 'update', body, fingerprint
+    if previous == fingerprint:
+        return 'unchanged', {}, fingerprint
+    return 'patch', patch_body(body, fingerprint, previous), fingerprint
+
+
+def push_request(service, event, action: str, body: dict, calendar_id: str = 'primary'):
+    """The events() request for an action returned by prepare_push."""
+    if action == 'insert':
+        return service.events().insert(calendarId=calendar_id, body=body, sendUpdates='none')
+    # Linked events live in the calendar they were inserted into or pulled from
+    calendar_id = event.google_calendar_id or calendar_id
+    if action == 'patch':
+        return service.events().patch(calendarId=calendar_id, eventId=event.google_event_id, body=body)
+    return service.events().update(calendarId=calendar_id, eventId=event.google_event_id, body=body)
@@ -0,0 +1,68 @@
+"""
+Append GoogleSyncOutbox rows for every Event write, inside the writer's transaction.
+
+Upserts arrive through events' change log (every write path records there); deletes come from
+post_delete because the row's google_event_id must be captured before it is gone. Writes that
+originate from Google itself (pulled changes, google_event_id write-backs) run under
+suppress_outbox() so they are not pushed straight back, and users without a Google connection
+get no rows at all. Deleting a token (disconnect, user deletion) also evicts its cached
+credentials.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from events.models import Event, EventChange, event_changes_recorded
+from .models import GoogleOAuthToken, GoogleSyncOutbox
+from .services import forget_credentials
+
+_suppressed = ContextVar('google_outbox_suppressed', default=False)
+
+
+@contextmanager
+def suppress_outbox():
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def _connected(user_id: int) -> bool:
+    # Users without a Google grant have nothing to push to
+    return GoogleOAuthToken.objects.filter(user_id=user_id).exists()
+
+
+@receiver(event_changes_recorded, dispatch_uid='google_outbox_upsert')
+def enqueue_upserts(sender, user_id, event_ids, kind, **kwargs):
+    if kind != EventChange.UPSERT or _suppressed.get() or not _connected(user_id):
+        return
+    GoogleSyncOutbox.objects.bulk_create([
+        GoogleSyncOutbox(user_id=user_id, event_id=event_id, op=GoogleSyncOutbox.UPSERT)
+        for event_id in event_ids
+    ])
+
+
+@receiver(post_delete, sender=Event, dispatch_uid='google_outbox_delete')
+def enqueue_delete(sender, instance, origin=None, **kwargs):
+    # Never pushed, nothing to delete remotely; a user cascade takes the outbox with it
+    if _suppressed.get() or not instance.google_event_id or isinstance(origin, get_user_model()):
+        return
+    if not _connected(instance.user_id):
+        return
+    GoogleSyncOutbox.objects.create(
+        user_id=instance.user_id,
+        event_id=instance.pk,
+        op=GoogleSyncOutbox.DELETE,
+        google_event_id=instance.google_event_id,
+        google_calendar_id=instance.google_calendar_id,
+    )
+
+
+@receiver(post_delete, sender=GoogleOAuthToken, dispatch_uid='google_forget_credentials')
+def forget_deleted_credentials(sender, instance, **kwargs):
+    forget_credentials(instance.user_id)
@@ -0,0 +1,94 @@
+"""
+Cached Google connection status, refreshed by `manage.py refresh_google_status`.
+
+The account identity (the primary calendar id, i.e. the Google account email) and the connection
+health are stored on GoogleOAuthToken, so the status endpoint answers from one indexed row without
+loading credentials or calling Google. Connecting clears the cached values and checks them right
+away; disconnecting deletes the row. The worker re-checks identities older than STATUS_TTL.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable
+
+from django.db.models import F, Q
+from django.utils import timezone
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+
+from .models import GoogleOAuthToken
+from .services import user_calendar_service
+
+logger = logging.getLogger(__name__)
+
+STATUS_TTL = timedelta(hours=1)
+BATCH_SIZE = 50
+
+
+def account_status(user) -> dict | None:
+    """The cached status of the user's Google connection; None when not connected."""
+    return (
+        GoogleOAuthToken.objects
+        .filter(user=user)
+        .values('account_email', 'status', 'status_checked_at')
+        .first()
+    )
+
+
+def check_account(token: GoogleOAuthToken, service_for: Callable = user_calendar_service,
+                  now: datetime | None = None) -> str:
+    """
+    Read the primary calendar to refresh the cached identity and health; returns the new status.
+
+    A revoked grant or a rejected token marks the connection as needing a reconnect. Other
+    failures (network, Google outages) keep the previous status until the next check.
+    """
+    now = now or timezone.now()
+    values = {'status_checked_at': now}
+    try:
+        primary = service_for(token.user).calendarList().get(calendarId='primary').execute()
+    except GoogleOAuthToken.DoesNotExist:
+        # Disconnected meanwhile
+        return GoogleOAuthToken.UNKNOWN
+    except (RefreshError, HttpError) as exc:
+        if isinstance(exc, HttpError) and exc.resp.status not in (401, 403):
+            values['status_error'] = str(exc)[:2000]
+        else:
+            values.update(status=GoogleOAuthToken.ERROR, status_error=str(exc)[:2000])
+    except Exception as exc:
+        logger.warning('Google status check failed for user %s', token.user_id, exc_info=True)
+        values['status_error'] = str(exc)[:2000]
+    else:
+        values.update(
+            status=GoogleOAuthToken.OK,
+            status_error='',
+            account_email=(primary.get('id') or primary.get('summary') or '')[:254],
+        )
+    # Update only the status columns: a concurrent refresh may be writing the credentials
+    GoogleOAuthToken.objects.filter(pk=token.pk).update(**values)
+    return values.get('status', token.status)
+
+
+def stale_tokens(now: datetime, ttl: timedelta = STATUS_TTL, limit: int = BATCH_SIZE):
+    """Tokens never checked or checked before now - ttl, oldest first."""
+    return list(
+        GoogleOAuthToken.objects
+        .filter(Q(status_checked_at__isnull=True) | Q(status_checked_at__lte=now - ttl))
+        .select_related('user')
+        .order_by(F('status_checked_at').asc(nulls_first=True))[:limit]
+    )
+
+
+def refresh_stale_statuses(now: datetime | None = None, ttl: timedelta = STATUS_TTL, limit: int = BATCH_SIZE,
+                           service_for: Callable = user_calendar_service) -> tuple[int, int]:
+    """Re-check one batch of stale identities; returns (ok, not_ok)."""
+    now = now or timezone.now()
+    ok = not_ok = 0
+    for token in stale_tokens(now, ttl, limit):
+        if check_account(token, service_for, now) == GoogleOAuthToken.OK:
+            ok += 1
+        else:
+            not_ok += 1
+    return ok, not_ok
@@ -0,0 +1,748 @@
+import io
+import json
+import tempfile
+import threading
+import time as perf_time
+from unittest import mock
+from datetime import date, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.core.management import call_command
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMock, HttpMockSequence
+from rest_framework.test import APIClient
+
+from events.models import Event, EventChange
+from . import services
+from .batch import sync_events_batch
+from .models import GoogleCalendarSyncState, GoogleOAuthToken, GoogleSyncOutbox, GoogleWatchChannel
+from .outbox import CLAIM_TTL, MAX_ATTEMPTS, claim_rows, drain_outbox, requeue_dead
+from .pull import pull_changes
+from .refresh import refresh_due_tokens
+from .services import (
+    calendar_service, forget_credentials, get_google_credentials, get_google_oauth_flow, prepare_push, push_request,
+    store_credentials,
+)
+from .status import STATUS_TTL, account_status, refresh_stale_statuses
+from .watch import notification_headers, register_channel, renew_expiring_channels, run_due_syncs
+
+
+def batch_response(parts):
+    """Multipart body in the format Google's batch endpoint returns; parts are (request_id, status, body)."""
+    chunks = []
+    for request_id, status_code, body in parts:
+        chunks.append(
+            '--batch_boundary\r\n'
+            'Content-Type: application/http\r\n'
+            f'Content-ID: <response-base + {request_id}>\r\n\r\n'
+            f'HTTP/1.1 {status_code} OK\r\n'
+            'Content-Type: application/json\r\n\r\n'
+            f'{json.dumps(body) if body is not None else ""}\r\n'
+        )
+    content = ''.join(chunks) + '--batch_boundary--'
+    return ({'status': '200', 'content-type': 'multipart/mixed; boundary="batch_boundary"'}, content)
+
+
+class CountingHttp(HttpMockSequence):
+    """HttpMockSequence that counts the HTTP round trips sent through it."""
+
+    def __init__(self, iterable):
+        super().__init__(iterable)
+        self.round_trips = 0
+
+    def request(self, *args, **kwargs):
+        self.round_trips += 1
+        return super().request(*args, **kwargs)
+
+
+def mocked_service(responses):
+    return calendar_service(http=HttpMockSequence(responses))
+
+
+class GoogleBatchSyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('sam', password='pw')
+        make = lambda **kw: Event.objects.create(
+            user=self.user, date=date(2026, 3, 2), start_time=time(9, 0), duration=30, **kw,
+        )
+        self.new = make(title='New')
+        self.existing = make(title='Existing', google_event_id='g-existing')
+        self.broken = make(title='Broken')
+
+    def test_results_are_mapped_back_and_ids_written_in_bulk(self):
+        service = mocked_service([batch_response([
+            (self.new.id, 200, {'id': 'g-new', 'htmlLink': 'https://calendar/new'}),
+            (self.existing.id, 200, {'id': 'g-existing'}),
+            (self.broken.id, 400, {'error': {'code': 400, 'message': 'Bad Request'}}),
+        ])])
+        # Inserted ids and fingerprints, update fingerprints (not a tracked change), one change-log INSERT,
+        # one list-cache generation bump
+        with self.assertNumQueries(4):
+            results = sync_events_batch(service, [self.new, self.existing, self.broken])
+        self.assertEqual(
+            [(r.event_id, r.action, r.ok) for r in results],
+            [(self.new.id, 'insert', True), (self.existing.id, 'update', True), (self.broken.id, 'insert', False)],
+        )
+        self.new.refresh_from_db()
+        self.broken.refresh_from_db()
+        self.assertEqual((self.new.google_event_id, self.broken.google_event_id), ('g-new', None))
+
+    def test_events_are_split_into_chunks(self):
+        service = mocked_service([
+            batch_response([(self.new.id, 200, {'id': 'g-1'}), (self.existing.id, 200, {'id': 'g-existing'})]),
+            batch_response([(self.broken.id, 200, {'id': 'g-2'})]),
+        ])
+        results = sync_events_batch(service, [self.new, self.existing, self.broken], chunk_size=2)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(
+            dict(Event.objects.filter(user=self.user).values_list('title', 'google_event_id')),
+            {'New': 'g-1', 'Existing': 'g-existing', 'Broken': 'g-2'},
+        )
+
+    def test_one_round_trip_per_chunk(self):
+        events = [self.new, self.existing, self.broken] + [
+            Event.objects.create(user=self.user, title=f'More {i}', date=date(2026, 3, 3), start_time=time(9, 0),
+                                 duration=30)
+            for i in range(7)
+        ]
+        http = CountingHttp([
+            batch_response([(event.id, 200, {'id': f'g-{event.id}'}) for event in events[offset:offset + 4]])
+            for offset in range(0, len(events), 4)
+        ])
+        results = sync_events_batch(calendar_service(http=http), events, chunk_size=4)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(http.round_trips, 3)
+
+    def test_unchanged_events_are_skipped_and_edits_are_patched(self):
+        changes = EventChange.objects.count()
+        sync_events_batch(mocked_service([batch_response([(self.existing.id, 200, {'id': 'g-existing'})])]),
+                          [self.existing])
+        # Storing the fingerprint is bookkeeping, not an edit
+        self.assertEqual(EventChange.objects.count(), changes)
+        self.existing.refresh_from_db()
+        # An empty mock sequence fails any request that is sent
+        results = sync_events_batch(mocked_service([]), [self.existing])
+        self.assertEqual((results[0].action, results[0].ok), ('unchanged', True))
+
+        self.existing.title = 'Existing (renamed)'
+        action, body, _ = prepare_push(self.existing)
+        self.assertEqual((action, body), ('patch', {'summary': 'Existing (renamed)'}))
+        request = push_request(mocked_service([]), self.existing, action, body)
+        self.assertEqual((request.method, json.loads(request.body)), ('PATCH', body))
+
+    def test_switch_to_all_day_clears_the_timed_fields(self):
+        sync_events_batch(mocked_service([batch_response([(self.existing.id, 200, {'id': 'g-existing'})])]),
+                          [self.existing])
+        self.existing.refresh_from_db()
+        self.existing.start_time, self.existing.duration = time(0, 0), 1440
+        action, body, _ = prepare_push(self.existing)
+        self.assertEqual(action, 'patch')
+        self.assertEqual(body['start'], {'date': '2026-03-02', 'dateTime': None, 'timeZone': None})
+
+
+class CalendarServiceFactoryTests(SimpleTestCase):
+    def test_requests_match_discovery_build(self):
+        expected = build('calendar', 'v3', http=HttpMock(), static_discovery=True)
+        service = calendar_service(http=HttpMock())
+        kwargs = {'calendarId': 'primary', 'eventId': 'abc', 'body': {'summary': 'x'}}
+        self.assertEqual(service.events().update(**kwargs).uri, expected.events().update(**kwargs).uri)
+
+    def test_credentials_are_bound_per_call(self):
+        first = calendar_service(Credentials(token='first'))
+        second = calendar_service(Credentials(token='second'))
+        self.assertEqual(first._http.credentials.token, 'first')
+        self.assertEqual(second._http.credentials.token, 'second')
+
+    def test_services_share_one_parsed_discovery_document(self):
+        http = CountingHttp([])
+        get_static_doc = services.discovery_cache.get_static_doc
+        services._calendar_discovery_document.cache_clear()
+        try:
+            with mock.patch('google_sync.services.discovery_cache.get_static_doc', wraps=get_static_doc) as loads:
+                for token in ('a', 'b', 'c'):
+                    calendar_service(Credentials(token=token))
+                calendar_service(http=http)
+        finally:
+            services._calendar_discovery_document.cache_clear()
+        # Read once from the packaged document, never fetched over HTTP
+        loads.assert_called_once_with('calendar', 'v3')
+        self.assertEqual(http.round_trips, 0)
+
+
+class TokenEndpoint(BaseHTTPRequestHandler):
+    """Minimal OAuth token endpoint: counts refresh requests and hands out a fresh access token."""
+    hits = 0
+
+    def do_POST(self):
+        type(self).hits += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        perf_time.sleep(0.1)
+        body = json.dumps({'access_token': f'fresh-{self.hits}', 'expires_in': 3600}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TokenServerMixin:
+    """Runs TokenEndpoint on a local port; store_token points a user's token at it."""
+
+    def start_token_server(self):
+        TokenEndpoint.hits = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TokenEndpoint)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def store_token(self, expiry, user=None, refresh_token='refresh'):
+        user = user or self.user
+        forget_credentials(user.pk)
+        return GoogleOAuthToken.objects.create(
+            user=user, access_token='stale', refresh_token=refresh_token,
+            token_uri=f'http://127.0.0.1:{self.server.server_port}/token',
+            client_id='client', client_secret='secret',
+            scopes='https://www.googleapis.com/auth/calendar.events', expiry=expiry,
+        )
+
+
+class CredentialCacheTests(TokenServerMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('kim', password='pw')
+        self.start_token_server()
+
+    def test_valid_credentials_are_served_from_memory(self):
+        self.store_token(timezone.now() + timedelta(hours=1))
+        with self.assertNumQueries(1):
+            first = get_google_credentials(self.user)
+        with self.assertNumQueries(1):  # is the row unchanged?
+            second = get_google_credentials(self.user)
+        self.assertIs(first, second)
+        self.assertEqual(TokenEndpoint.hits, 0)
+
+    def test_changes_made_by_other_processes_are_noticed(self):
+        self.store_token(timezone.now() + timedelta(hours=1))
+        get_google_credentials(self.user)
+        # Reconnected elsewhere: the new grant replaces the cached one
+        GoogleOAuthToken.objects.filter(user=self.user).update(
+            access_token='reconnected', updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        self.assertEqual(get_google_credentials(self.user).token, 'reconnected')
+        # Disconnected elsewhere: no post_delete signal reaches this process
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM google_sync_googleoauthtoken WHERE user_id = %s', [self.user.pk])
+        with self.assertRaises(GoogleOAuthToken.DoesNotExist):
+            get_google_credentials(self.user)
+
+    def test_concurrent_requests_refresh_once(self):
+        self.store_token(timezone.now() - timedelta(minutes=5))
+        tokens = []
+
+        def request():
+            tokens.append(get_google_credentials(self.user).token)
+            connection.close()
+
+        workers = [threading.Thread(target=request) for _ in range(5)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(TokenEndpoint.hits, 1)
+        self.assertEqual(tokens, ['fresh-1'] * 5)
+        stored = GoogleOAuthToken.objects.get(user=self.user)
+        self.assertEqual(stored.access_token, 'fresh-1')
+        self.assertGreater(stored.expiry, timezone.now() + timedelta(minutes=50))
+
+    def test_missing_token_raises(self):
+        forget_credentials(self.user.pk)
+        with self.assertRaises(GoogleOAuthToken.DoesNotExist):
+            get_google_credentials(self.user)
+
+
+class OAuthFlowTests(SimpleTestCase):
+    def test_client_config_is_read_once(self):
+        config = {'web': {
+            'client_id': 'client', 'client_secret': 'secret',
+            'auth_uri': 'https://accounts.google.com/o/oauth2/auth',
+            'token_uri': 'https://oauth2.googleapis.com/token',
+        }}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as handle:
+            json.dump(config, handle)
+            handle.flush()
+            with override_settings(GOOGLE_OAUTH_CLIENT_JSON_PATH=handle.name):
+                get_google_oauth_flow()
+        with override_settings(GOOGLE_OAUTH_CLIENT_JSON_PATH=handle.name):
+            flow = get_google_oauth_flow(state='abc')
+        self.assertEqual(flow.client_config['client_id'], 'client')
+
+
+class ProactiveRefreshTests(TokenServerMixin, TestCase):
+    def setUp(self):
+        self.start_token_server()
+        User = get_user_model()
+        now = timezone.now()
+        self.soon = self.store_token(now + timedelta(minutes=5), User.objects.create_user('a'))
+        self.expired = self.store_token(now - timedelta(hours=2), User.objects.create_user('b'))
+        self.later = self.store_token(now + timedelta(hours=2), User.objects.create_user('c'))
+        self.revoked = self.store_token(now, User.objects.create_user('d'), refresh_token=None)
+
+    def test_only_tokens_inside_the_margin_are_refreshed(self):
+        refreshed, failed = refresh_due_tokens(margin=timedelta(minutes=10))
+        self.assertEqual((refreshed, failed, TokenEndpoint.hits), (2, [], 2))
+        tokens = GoogleOAuthToken.objects.in_bulk()
+        self.assertTrue(tokens[self.soon.pk].access_token.startswith('fresh-'))
+        self.assertTrue(tokens[self.expired.pk].access_token.startswith('fresh-'))
+        self.assertEqual(tokens[self.later.pk].access_token, 'stale')
+        self.assertEqual(tokens[self.revoked.pk].access_token, 'stale')
+        self.assertGreater(tokens[self.soon.pk].expiry, timezone.now() + timedelta(minutes=50))
+        # Requests served afterwards find a valid token without refreshing or reloading it
+        with self.assertNumQueries(1):
+            get_google_credentials(self.soon.user)
+        self.assertEqual(TokenEndpoint.hits, 2)
+
+    def test_batches_are_rate_limited(self):
+        pauses = []
+        refresh_due_tokens(margin=timedelta(minutes=10), rate=4, sleep=pauses.append)
+        self.assertEqual(pauses, [0.25])
+
+    def test_failed_refresh_is_reported(self):
+        self.soon.token_uri = 'http://127.0.0.1:1/token'
+        self.soon.save()
+        with self.assertLogs('google_sync.refresh', 'WARNING'):
+            refreshed, failed = refresh_due_tokens(margin=timedelta(minutes=10))
+        self.assertEqual((refreshed, failed), (1, [self.soon.pk]))
+        refreshed, failed = refresh_due_tokens(margin=timedelta(minutes=10), exclude_ids=failed)
+        self.assertEqual(failed, [])
+
+    def test_command_runs_one_batch(self):
+        out = io.StringIO()
+        call_command('refresh_google_tokens', '--once', '--rate', '0', stdout=out)
+        self.assertIn('Refreshed 2 token(s), 0 failed', out.getvalue())
+
+
+def json_response(body, status_code=200):
+    return ({'status': str(status_code)}, json.dumps(body))
+
+
+def remote_event(event_id, summary, updated='2026-03-01T12:00:00Z', **extra):
+    return {
+        'id': event_id, 'status': 'confirmed', 'summary': summary, 'updated': updated,
+        'start': {'dateTime': '2026-03-02T09:00:00-08:00'},
+        'end': {'dateTime': '2026-03-02T10:30:00-08:00'},
+        **extra,
+    }
+
+
+def connect_google(user):
+    forget_credentials(user.pk)
+    return GoogleOAuthToken.objects.create(user=user, access_token='a', client_id='c', client_secret='s',
+                                           scopes='', expiry=timezone.now() + timedelta(hours=1))
+
+
+@override_settings(TIME_ZONE='America/Los_Angeles')
+class GooglePullTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('lee', password='pw')
+
+    def pull(self, *responses):
+        return pull_changes(self.user, mocked_service(list(responses)))
+
+    def state(self):
+        return GoogleCalendarSyncState.objects.get(user=self.user, calendar_id='primary')
+
+    def test_full_sync_pages_and_stores_token(self):
+        result = self.pull(
+            json_response({'items': [remote_event('g1', 'Standup')], 'nextPageToken': 'p2'}),
+            json_response({'items': [
+                remote_event('g2', 'Offsite', start={'date': '2026-03-05'}, end={'date': '2026-03-07'},
+                             attendees=[{'email': 'a@example.com'}, {'email': 'b@example.com'}]),
+                remote_event('g3', 'Weekly', recurrence=['RRULE:FREQ=WEEKLY']),
+            ], 'nextSyncToken': 'sync-1'}),
+        )
+        self.assertEqual((result.created, result.skipped, result.full_sync), (2, 1, True))
+        self.assertEqual(self.state().sync_token, 'sync-1')
+        standup = Event.objects.get(google_event_id='g1')
+        self.assertEqual((standup.date, standup.start_time, standup.duration), (date(2026, 3, 2), time(9, 0), 90))
+        offsite = Event.objects.get(google_event_id='g2')
+        self.assertEqual((offsite.start_time, offsite.duration), (time(0, 0), 2880))
+        self.assertEqual(offsite.participants, 'a@example.com, b@example.com')
+
+    def test_incremental_pull_applies_updates_and_cancellations(self):
+        self.pull(json_response({'items': [remote_event('g1', 'Standup'), remote_event('g2', 'Lunch')],
+                                 'nextSyncToken': 'sync-1'}))
+        later = (timezone.now() + timedelta(minutes=1)).isoformat()
+        result = self.pull(json_response({'items': [
+            remote_event('g1', 'Standup (moved)', updated=later),
+            {'id': 'g2', 'status': 'cancelled'},
+            remote_event('g4', 'New in Google', updated=later),
+        ], 'nextSyncToken': 'sync-2'}))
+        self.assertEqual((result.created, result.updated, result.deleted, result.full_sync), (1, 1, 1, False))
+        self.assertEqual(
+            sorted(Event.objects.filter(user=self.user).values_list('google_event_id', 'title', 'version')),
+            [('g1', 'Standup (moved)', 2), ('g4', 'New in Google', 1)],
+        )
+        self.assertEqual(self.state().sync_token, 'sync-2')
+
+    def test_newer_local_edit_wins(self):
+        self.pull(json_response({'items': [remote_event('g1', 'Standup')], 'nextSyncToken': 'sync-1'}))
+        Event.objects.filter(google_event_id='g1').update(title='Edited here', updated_at=timezone.now())
+        result = self.pull(json_response({'items': [remote_event('g1', 'Edited in Google')],
+                                          'nextSyncToken': 'sync-2'}))
+        self.assertEqual((result.updated, result.skipped), (0, 1))
+        self.assertEqual(Event.objects.get(google_event_id='g1').title, 'Edited here')
+
+    def test_remote_cancellation_of_newer_local_edit_unlinks_it(self):
+        connect_google(self.user)
+        self.pull(json_response({'items': [remote_event('g1', 'Standup')], 'nextSyncToken': 'sync-1'}))
+        event = Event.objects.get(google_event_id='g1')
+        event.title = 'Edited here'
+        event.save()
+        GoogleSyncOutbox.objects.all().delete()
+        result = self.pull(json_response({'items': [{'id': 'g1', 'status': 'cancelled',
+                                                     'updated': '2026-03-01T13:00:00Z'}],
+                                          'nextSyncToken': 'sync-2'}))
+        self.assertEqual((result.deleted, result.skipped), (0, 1))
+        event.refresh_from_db()
+        self.assertEqual((event.title, event.google_event_id, event.google_calendar_id), ('Edited here', None, None))
+        # Queued for the worker, which inserts it again
+        self.assertEqual(list(GoogleSyncOutbox.objects.values_list('event_id', 'op')), [(event.pk, 'upsert')])
+
+    def test_expired_sync_token_triggers_full_resync(self):
+        self.pull(json_response({'items': [remote_event('g1', 'Keep'), remote_event('g2', 'Gone')],
+                                 'nextSyncToken': 'sync-1'}))
+        local_only = Event.objects.create(user=self.user, title='Local', date=date(2026, 3, 3),
+                                          start_time=time(8, 0), duration=30)
+        result = self.pull(
+            json_response({'error': {'code': 410, 'message': 'Sync token is no longer valid'}}, 410),
+            json_response({'items': [remote_event('g1', 'Keep')], 'nextSyncToken': 'sync-fresh'}),
+        )
+        self.assertTrue(result.full_sync)
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(self.state().sync_token, 'sync-fresh')
+        self.assertEqual(
+            set(Event.objects.filter(user=self.user).values_list('id', flat=True)),
+            {Event.objects.get(google_event_id='g1').id, local_only.id},
+        )
+
+    def test_multi_day_all_day_event_survives_push_and_pull(self):
+        event = Event.objects.create(user=self.user, title='Offsite', date=date(2026, 3, 2),
+                                     start_time=time(0, 0), duration=2880)
+        action, body, _ = prepare_push(event)
+        sent = json.loads(push_request(mocked_service([]), event, action, body).body)
+        self.assertEqual((sent['start'], sent['end']), ({'date': '2026-03-02'}, {'date': '2026-03-04'}))
+        sync_events_batch(mocked_service([batch_response([(event.id, 200, {'id': 'g-offsite'})])]), [event])
+
+        # Google's copy is newer than the local row after the push
+        updated = (timezone.now() + timedelta(minutes=1)).isoformat()
+        result = self.pull(json_response({'items': [{**sent, 'id': 'g-offsite', 'status': 'confirmed',
+                                                     'updated': updated}], 'nextSyncToken': 'sync-1'}))
+        self.assertEqual((result.updated, result.skipped), (0, 0))
+        event.refresh_from_db()
+        self.assertEqual(event.duration, 2880)
+        self.assertEqual(prepare_push(event)[0], 'unchanged')
+
+    def test_full_sync_only_reconciles_its_own_calendar(self):
+        self.pull(json_response({'items': [remote_event('g1', 'Primary')], 'nextSyncToken': 'sync-1'}))
+        result = pull_changes(self.user, mocked_service([
+            json_response({'items': [remote_event('w1', 'Work')], 'nextSyncToken': 'work-1'}),
+        ]), 'work')
+        self.assertEqual(result.deleted, 0)
+        self.assertEqual(
+            dict(Event.objects.filter(user=self.user).values_list('google_event_id', 'google_calendar_id')),
+            {'g1': 'primary', 'w1': 'work'},
+        )
+
+    def test_page_costs_constant_queries(self):
+        # 40 rows keep the bulk INSERT within one statement under SQLite's variable limit
+        items = [remote_event(f'g{i}', f'Event {i}') for i in range(40)]
+        # Independent of the page size: no per-event lookups or writes (3 of them create the
+        # user's list-cache generation, which later writes only increment)
+        with self.assertNumQueries(14):
+            self.pull(json_response({'items': items, 'nextSyncToken': 'sync-1'}))
+
+
+class WatchChannelTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('max', password='pw')
+        self.channel = GoogleWatchChannel.objects.create(
+            user=self.user, channel_id='chan-1', resource_id='res-1', token='secret',
+            expiration=timezone.now() + timedelta(days=7),
+        )
+
+    def notify(self, message_number, channel=None, **overrides):
+        headers = {**notification_headers(channel or self.channel, message_number), **overrides}
+        return self.client.post('/api/google/webhook/', headers=headers)
+
+    def test_burst_schedules_one_debounced_sync(self):
+        outcomes = [self.notify(number).json()['outcome'] for number in range(1, 6)]
+        self.assertEqual(outcomes, ['scheduled'] + ['coalesced'] * 4)
+        self.assertEqual(self.notify(3).json()['outcome'], 'duplicate')
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.last_message_number, 5)
+        self.assertGreater(self.channel.sync_due_at, timezone.now())
+
+    def test_rejects_unknown_channels_and_bad_tokens(self):
+        self.assertEqual(self.notify(1, **{'X-Goog-Channel-ID': 'nope'}).status_code, 404)
+        self.assertEqual(self.notify(1, **{'X-Goog-Channel-Token': 'guess'}).status_code, 403)
+        self.assertEqual(self.notify(1, **{'X-Goog-Resource-State': 'sync'}).json()['outcome'], 'ignored')
+        self.channel.refresh_from_db()
+        self.assertIsNone(self.channel.sync_due_at)
+
+    def test_worker_pulls_due_channel_once(self):
+        self.notify(1)
+        page = json_response({'items': [remote_event('g1', 'From Google')], 'nextSyncToken': 'sync-1'})
+        services = []
+
+        def service_for(user):
+            services.append(user)
+            return mocked_service([page])
+
+        self.assertEqual(run_due_syncs(service_for=service_for), (0, 0))  # still inside the debounce window
+        self.assertEqual(run_due_syncs(timezone.now() + timedelta(seconds=10), service_for=service_for), (1, 0))
+        self.assertEqual(services, [self.user])
+        self.assertTrue(Event.objects.filter(user=self.user, google_event_id='g1').exists())
+        self.channel.refresh_from_db()
+        self.assertIsNone(self.channel.sync_due_at)
+
+    def test_register_and_renew_replace_the_channel(self):
+        expiration = int((timezone.now() + timedelta(days=7)).timestamp() * 1000)
+        service = mocked_service([
+            json_response({'kind': 'api#channel', 'resourceId': 'res-2', 'expiration': str(expiration)}),
+            json_response({}),  # channels.stop for the old channel
+        ])
+        channel = register_channel(self.user, service, address='https://example.com/api/google/webhook/')
+        self.assertEqual(list(GoogleWatchChannel.objects.values_list('pk', flat=True)), [channel.pk])
+        self.assertEqual((channel.resource_id, int(channel.expiration.timestamp() * 1000)), ('res-2', expiration))
+        self.assertIsNotNone(channel.sync_due_at)
+
+        GoogleWatchChannel.objects.filter(pk=channel.pk).update(expiration=timezone.now() + timedelta(hours=1))
+        renewed = renew_expiring_channels(service_for=lambda user: mocked_service([
+            json_response({'resourceId': 'res-3', 'expiration': str(expiration)}),
+            json_response({}),
+        ]))
+        self.assertEqual(renewed, 1)
+        self.assertEqual(list(GoogleWatchChannel.objects.values_list('resource_id', flat=True)), ['res-3'])
+
+
+class NotificationSimulatorTests(LiveServerTestCase):
+    def test_command_posts_notifications_to_the_webhook(self):
+        user = get_user_model().objects.create_user('ivy', password='pw')
+        channel = GoogleWatchChannel.objects.create(
+            user=user, channel_id='chan-sim', token='secret', expiration=timezone.now() + timedelta(days=1),
+        )
+        out = io.StringIO()
+        call_command('simulate_google_notification', 'chan-sim', '--count', '3',
+                     '--url', f'{self.live_server_url}/api/google/webhook/', stdout=out)
+        self.assertIn('"outcome":"scheduled"', out.getvalue())
+        self.assertEqual(out.getvalue().count('"outcome":"coalesced"'), 2)
+        channel.refresh_from_db()
+        self.assertEqual(channel.last_message_number, 3)
+
+
+class SyncOutboxTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('oli', password='pw')
+        self.token = connect_google(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_event(self, title, **extra):
+        return Event.objects.create(user=self.user, title=title, date=date(2026, 3, 2),
+                                    start_time=time(9, 0), duration=30, **extra)
+
+    def outbox(self):
+        return list(GoogleSyncOutbox.objects.order_by('id').values_list('event_id', 'op', 'google_event_id'))
+
+    def test_every_write_path_appends_to_the_outbox(self):
+        created = self.client.post('/api/events/', {
+            'title': 'Dentist', 'date': '2026-03-02', 'start_time': '09:00:00', 'duration': 30,
+        }, format='json').json()
+        self.client.patch(f"/api/events/{created['id']}/", {'title': 'Dentist (moved)'}, format='json')
+        self.client.post('/api/events/bulk/', {'operations': [{'op': 'create', 'data': {
+            'title': 'Bulk', 'date': '2026-03-03', 'start_time': '10:00:00', 'duration': 30,
+        }}]}, format='json')
+        synced = self.create_event('Synced', google_event_id='g-synced')
+        GoogleSyncOutbox.objects.filter(event_id=synced.pk).delete()
+        self.client.delete(f'/api/events/{synced.pk}/')
+        bulk_id = Event.objects.get(title='Bulk').pk
+        self.assertEqual(self.outbox(), [
+            (created['id'], 'upsert', None),
+            (created['id'], 'upsert', None),
+            (bulk_id, 'upsert', None),
+            (synced.pk, 'delete', 'g-synced'),
+        ])
+
+    def test_failed_outbox_write_rolls_back_the_update(self):
+        event = self.create_event('Dentist')
+        GoogleSyncOutbox.objects.all().delete()
+        changes = EventChange.objects.count()
+        with mock.patch.object(GoogleSyncOutbox.objects, 'bulk_create', side_effect=DatabaseError('outbox down')):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(f'/api/events/{event.pk}/', {'title': 'Dentist (moved)'}, format='json')
+        event.refresh_from_db()
+        self.assertEqual((event.title, event.version), ('Dentist', 1))
+        self.assertEqual(EventChange.objects.count(), changes)
+
+    def test_changes_coming_from_google_are_not_queued(self):
+        pull_changes(self.user, mocked_service([
+            json_response({'items': [remote_event('g1', 'From Google')], 'nextSyncToken': 'sync-1'}),
+        ]))
+        event = self.create_event('Local')
+        GoogleSyncOutbox.objects.all().delete()
+        sync_events_batch(mocked_service([batch_response([(event.id, 200, {'id': 'g-local'})])]), [event])
+        self.assertEqual(self.outbox(), [])
+
+    def test_drain_coalesces_and_pushes_in_batches(self):
+        new = self.create_event('New')
+        existing = self.create_event('Existing', google_event_id='g-existing')
+        existing.title = 'Existing (edited)'
+        existing.save()
+        existing.title = 'Existing (edited again)'
+        existing.save()
+        removed = self.create_event('Removed', google_event_id='g-removed')
+        removed_id = removed.pk
+        removed.delete()
+        service = mocked_service([
+            batch_response([(new.id, 200, {'id': 'g-new'}), (existing.id, 200, {'id': 'g-existing'})]),
+            batch_response([(removed_id, 204, None)]),
+        ])
+        result = drain_outbox(service_for=lambda user: service)
+        self.assertEqual(result.as_dict(), {'pushed': 3, 'failed': 0, 'dead': 0, 'dropped': 0})
+        self.assertEqual(self.outbox(), [])
+        new.refresh_from_db()
+        self.assertEqual(new.google_event_id, 'g-new')
+
+    def test_failures_back_off_block_the_user_and_end_in_dead_letters(self):
+        event = self.create_event('Flaky')
+        failure = batch_response([(event.id, 500, {'error': {'code': 500, 'message': 'Backend Error'}})])
+        result = drain_outbox(service_for=lambda user: mocked_service([failure]))
+        self.assertEqual((result.pushed, result.failed), (0, 1))
+        row = GoogleSyncOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+        later = self.create_event('Later')
+        self.assertEqual(drain_outbox(service_for=lambda user: self.fail('user should be waiting')).as_dict(),
+                         {'pushed': 0, 'failed': 0, 'dead': 0, 'dropped': 0})
+        self.assertEqual(len(self.outbox()), 2)
+
+        GoogleSyncOutbox.objects.filter(pk=row.pk).update(attempts=MAX_ATTEMPTS - 1)
+        retry_at = timezone.now() + timedelta(days=1)
+        service = mocked_service([batch_response([
+            (event.id, 500, {'error': {'code': 500, 'message': 'Backend Error'}}),
+            (later.id, 200, {'id': 'g-later'}),
+        ])])
+        result = drain_outbox(retry_at, service_for=lambda user: service)
+        self.assertEqual((result.pushed, result.dead), (1, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.last_error), (GoogleSyncOutbox.DEAD, '500 Backend Error'))
+        self.assertEqual(requeue_dead(self.user), 1)
+
+    def test_permanent_errors_are_dead_lettered_at_once(self):
+        broken = self.create_event('Broken')
+        throttled = self.create_event('Throttled')
+        rate_limited = {'error': {'code': 403, 'message': 'Rate Limit Exceeded',
+                                  'errors': [{'reason': 'rateLimitExceeded'}]}}
+        service = mocked_service([batch_response([
+            (broken.id, 400, {'error': {'code': 400, 'message': 'Bad Request'}}),
+            (throttled.id, 403, rate_limited),
+        ])])
+        result = drain_outbox(service_for=lambda user: service)
+        self.assertEqual((result.failed, result.dead), (1, 1))
+        self.assertEqual(
+            dict(GoogleSyncOutbox.objects.values_list('event_id', 'status')),
+            {broken.id: GoogleSyncOutbox.DEAD, throttled.id: GoogleSyncOutbox.PENDING},
+        )
+
+    def test_manual_sync_goes_through_the_outbox(self):
+        event = self.create_event('New')
+        service = mocked_service([batch_response([(event.id, 200, {'id': 'g-new', 'htmlLink': 'https://calendar/new'})])])
+        with mock.patch('google_sync.views.calendar_service', return_value=service):
+            body = self.client.post('/api/google/events/sync/', {'event_id': event.pk}, format='json').json()
+        self.assertEqual(body, {'ok': True, 'google_event_id': 'g-new', 'htmlLink': 'https://calendar/new',
+                                'action': 'insert'})
+        # The queued row went out with it: the worker has nothing left to insert again
+        self.assertEqual(self.outbox(), [])
+        self.assertEqual(drain_outbox(service_for=lambda user: self.fail('pushed twice')).pushed, 0)
+
+    def test_a_claimed_queue_is_left_to_its_claimant(self):
+        event = self.create_event('New')
+        now = timezone.now()
+        self.assertEqual(len(claim_rows(self.user.pk, now)), 1)
+        # Neither a second worker nor the manual sync endpoint touches the leased queue
+        self.assertEqual(drain_outbox(now, service_for=lambda user: self.fail('pushed twice')).pushed, 0)
+        with mock.patch('google_sync.views.calendar_service', return_value=mocked_service([])):
+            res = self.client.post('/api/google/events/sync/batch/', {'event_ids': [event.pk]}, format='json')
+        self.assertEqual(res.json()['results'], [{'event_id': event.pk, 'ok': True, 'queued': True}])
+        # The claimant died: once the lease runs out the next pass pushes the event once
+        service = mocked_service([batch_response([(event.id, 200, {'id': 'g-new'})])])
+        result = drain_outbox(now + CLAIM_TTL + timedelta(seconds=1), service_for=lambda user: service)
+        self.assertEqual(result.pushed, 1)
+        self.assertEqual(self.outbox(), [])
+
+    def test_rows_of_disconnected_users_are_dropped(self):
+        self.create_event('Offline')
+        get_google_credentials(self.user)
+        self.token.delete()
+        self.assertEqual(drain_outbox().dropped, 1)
+        self.assertEqual(self.outbox(), [])
+        # Not connected any more: later writes queue nothing
+        self.create_event('Still offline')
+        self.assertEqual(self.outbox(), [])
+
+
+class ConnectionStatusTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('ada', password='pw')
+        forget_credentials(self.user.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.token = GoogleOAuthToken.objects.create(
+            user=self.user, access_token='a', client_id='c', client_secret='s', scopes='',
+            expiry=timezone.now() + timedelta(hours=1),
+        )
+
+    def test_status_is_answered_from_the_cached_row(self):
+        self.assertEqual(refresh_stale_statuses(service_for=lambda user: mocked_service([
+            json_response({'id': 'ada@example.com', 'summary': 'Ada'}),
+        ])), (1, 0))
+        no_google = AssertionError('status must not call Google')
+        with mock.patch('google_sync.views.calendar_service', side_effect=no_google), \
+                mock.patch('google_sync.views.get_google_credentials', side_effect=no_google), \
+                mock.patch('google_sync.status.user_calendar_service', side_effect=no_google), \
+                self.assertNumQueries(1):  # one token row, no credentials
+            body = self.client.get('/api/google/status/').json()
+        self.assertEqual((body['connected'], body['account_email'], body['status']), (True, 'ada@example.com', 'ok'))
+
+    def test_worker_rechecks_stale_identities_and_flags_revoked_grants(self):
+        checked_at = timezone.now() - STATUS_TTL - timedelta(minutes=1)
+        GoogleOAuthToken.objects.filter(pk=self.token.pk).update(
+            status=GoogleOAuthToken.OK, account_email='ada@example.com', status_checked_at=checked_at,
+        )
+        self.assertEqual(refresh_stale_statuses(service_for=lambda user: mocked_service([
+            json_response({'error': {'code': 401, 'message': 'Invalid Credentials'}}, 401),
+        ])), (0, 1))
+        body = self.client.get('/api/google/status/').json()
+        self.assertEqual((body['connected'], body['status']), (False, 'error'))
+        # Fresh entries are left alone until the TTL passes again
+        self.assertEqual(refresh_stale_statuses(service_for=lambda user: self.fail('checked too early')), (0, 0))
+
+    def test_reconnect_clears_the_cached_identity(self):
+        GoogleOAuthToken.objects.filter(pk=self.token.pk).update(
+            status=GoogleOAuthToken.OK, account_email='old@example.com', status_checked_at=timezone.now(),
+        )
+        store_credentials(self.user, Credentials(token='new', token_uri='https://oauth2.googleapis.com/token',
+                                                  client_id='c', client_secret='s'))
+        self.assertEqual(account_status(self.user),
+                         {'account_email': '', 'status': GoogleOAuthToken.UNKNOWN, 'status_checked_at': None})
+        self.client.post('/api/google/disconnect/')
+        self.assertEqual(self.client.get('/api/google/status/').json(), {'ok': True, 'connected': False})
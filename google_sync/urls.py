@@ -1,17 +1,25 @@
 from django.urls import path
 
 from .views import (
+    GoogleCalendarWebhookView,
+    GoogleEventBatchSyncView,
+    GoogleEventPullView,
     GoogleEventSyncView,
     GoogleOAuthCallbackView,
     GoogleOAuthStartView,
     GoogleOAuthStatusView,
     GoogleOAuthDisconnectView,
+    GoogleWatchView,
 )
 
 urlpatterns = [
     path('oauth/google/start/', GoogleOAuthStartView.as_view()),
     path('oauth/google/callback', GoogleOAuthCallbackView.as_view()),
     path('api/google/events/sync/', GoogleEventSyncView.as_view()),
+    path('api/google/events/sync/batch/', GoogleEventBatchSyncView.as_view()),
+    path('api/google/events/pull/', GoogleEventPullView.as_view()),
+    path('api/google/watch/', GoogleWatchView.as_view()),
+    path('api/google/webhook/', GoogleCalendarWebhookView.as_view()),
     path('api/google/status/', GoogleOAuthStatusView.as_view()),
     path('api/google/disconnect/', GoogleOAuthDisconnectView.as_view()),
 ]
@@ -12,16 +12,17 @@ from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from googleapiclient.discovery import build
-
 from events.models import Event
-from .models import GoogleOAuthToken
+from .models import GoogleOAuthToken, GoogleWatchChannel
+from .outbox import push_now
+from .pull import pull_changes
+from .status import account_status, check_account
+from .watch import FORBIDDEN, UNKNOWN, handle_notification, register_channel, stop_channel
 from .services import (
-    build_event_payload_from_model,
+    calendar_service,
     get_google_credentials,
     get_google_oauth_flow,
     store_credentials,
-    to_google_event_body,
 )
 
 logger = logging.getLogger(__name__)
@@ -108,8 +109,10 @@ class GoogleOAuthCallbackView(APIView):
             creds = flow.credentials
 
             # Store credentials
-            store_credentials(user_for_token, creds)
+            token = store_credentials(user_for_token, creds)
             logger.info(f"OAuth token stored for user {user_for_token.username}")
+            # Fill the cached identity now so the dashboard shows it right after the redirect
+            check_account(token)
 
             # Redirect to dashboard
             return redirect('/dashboard.html')
@@ -160,95 +163,183 @@ class GoogleEventSyncView(APIView):
         except Event.DoesNotExist:
             return Response({'ok': False, 'error': 'Event not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        if not GoogleOAuthToken.objects.filter(user=request.user).exists():
+        try:
+            creds = get_google_credentials(request.user)
+        except GoogleOAuthToken.DoesNotExist:
             return Response({'ok': False, 'error': 'google_not_connected'}, status=status.HTTP_403_FORBIDDEN)
+        except Exception as exc:
+            logger.exception('Failed to load Google credentials')
+            return Response({'ok': False, 'error': 'google_auth_failed'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Through the outbox lease, so a drain worker cannot push the same insert at the same time
+        calendar_id = request.data.get('calendar_id') or 'primary'
+        outcomes = push_now(request.user, [event.pk], calendar_id, calendar_service(creds))
+        outcome = (outcomes or {}).get(event.pk)
+        if outcome is None:
+            return Response({'ok': True, 'queued': True}, status=status.HTTP_202_ACCEPTED)
+        if not outcome.ok:
+            logger.warning('Google Calendar sync failed: %s', outcome.error)
+            return Response({'ok': False, 'error': outcome.error}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({
+            'ok': True,
+            'google_event_id': outcome.google_event_id,
+            'htmlLink': outcome.html_link,
+            'action': outcome.action,
+        })
+
+
+class GoogleEventBatchSyncView(APIView):
+    """Sync several events at once: POST {"event_ids": [...], "calendar_id": "primary"}."""
+    permission_classes = [permissions.IsAuthenticated]
+    max_events = 500
+
+    def post(self, request):
+        event_ids = request.data.get('event_ids')
+        if not isinstance(event_ids, list) or not event_ids:
+            return Response({'ok': False, 'error': 'event_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(event_ids) > self.max_events:
+            return Response({'ok': False, 'error': f'at most {self.max_events} events'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            event_ids = list(dict.fromkeys(int(event_id) for event_id in event_ids))
+        except (TypeError, ValueError):
+            return Response({'ok': False, 'error': 'event_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             creds = get_google_credentials(request.user)
-        except Exception as exc:
+        except GoogleOAuthToken.DoesNotExist:
+            return Response({'ok': False, 'error': 'google_not_connected'}, status=status.HTTP_403_FORBIDDEN)
+        except Exception:
             logger.exception('Failed to load Google credentials')
             return Response({'ok': False, 'error': 'google_auth_failed'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        payload = build_event_payload_from_model(event)
-        body = to_google_event_body(payload)
+        found = set(Event.objects.filter(user=request.user, id__in=event_ids).values_list('id', flat=True))
+        outcomes = push_now(
+            request.user, [event_id for event_id in event_ids if event_id in found],
+            request.data.get('calendar_id') or 'primary', calendar_service(creds),
+        ) or {}
+        results = []
+        for event_id in event_ids:
+            if event_id not in found:
+                results.append({'event_id': event_id, 'ok': False, 'error': 'Event not found'})
+            elif event_id in outcomes:
+                results.append(outcomes[event_id].as_dict())
+            else:
+                # Another pusher holds the queue; the row is sent from there
+                results.append({'event_id': event_id, 'ok': True, 'queued': True})
+        return Response({'ok': all(result['ok'] for result in results), 'results': results})
+
+
+class GoogleEventPullView(APIView):
+    """Pull changes made in Google Calendar since the last pull: POST {"calendar_id": "primary"}."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            creds = get_google_credentials(request.user)
+        except GoogleOAuthToken.DoesNotExist:
+            return Response({'ok': False, 'error': 'google_not_connected'}, status=status.HTTP_403_FORBIDDEN)
+        except Exception:
+            logger.exception('Failed to load Google credentials')
+            return Response({'ok': False, 'error': 'google_auth_failed'}, status=status.HTTP_401_UNAUTHORIZED)
 
         calendar_id = request.data.get('calendar_id') or 'primary'
-        service = build('calendar', 'v3', credentials=creds)
-        action = 'insert'
         try:
-            if event.google_event_id:
-                action = 'update'
-                result = service.events().update(
-                    calendarId=calendar_id,
-                    eventId=event.google_event_id,
-                    body=body,
-                ).execute()
-            else:
-                result = service.events().insert(
-                    calendarId=calendar_id,
-                    body=body,
-                    sendUpdates='none',
-                ).execute()
-                event.google_event_id = result.get('id')
-                event.save(update_fields=['google_event_id'])
+            result = pull_changes(request.user, calendar_service(creds), calendar_id)
         except Exception as exc:
-            logger.exception('Google Calendar sync failed')
-            print("Google Calendar sync failed:", str(exc))
+            logger.exception('Google Calendar pull failed')
             return Response({'ok': False, 'error': str(exc)}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({'ok': True, **result.as_dict()})
 
-        return Response({
-            'ok': True,
-            'google_event_id': event.google_event_id,
-            'htmlLink': result.get('htmlLink'),
-            'action': action,
-        })
+
+class GoogleWatchView(APIView):
+    """Register (POST) or stop (DELETE) push notifications for a calendar: {"calendar_id": "primary"}."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _service(self, request):
+        try:
+            return calendar_service(get_google_credentials(request.user)), None
+        except GoogleOAuthToken.DoesNotExist:
+            return None, Response({'ok': False, 'error': 'google_not_connected'}, status=status.HTTP_403_FORBIDDEN)
+        except Exception:
+            logger.exception('Failed to load Google credentials')
+            return None, Response({'ok': False, 'error': 'google_auth_failed'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    def post(self, request):
+        if not settings.GOOGLE_CALENDAR_WEBHOOK_URL:
+            return Response({'ok': False, 'error': 'webhook_not_configured'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        service, error = self._service(request)
+        if error:
+            return error
+        try:
+            channel = register_channel(request.user, service, request.data.get('calendar_id') or 'primary')
+        except Exception as exc:
+            logger.exception('Failed to register Google watch channel')
+            return Response({'ok': False, 'error': str(exc)}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({'ok': True, 'calendar_id': channel.calendar_id, 'expiration': channel.expiration})
+
+    def delete(self, request):
+        calendar_id = request.data.get('calendar_id') or 'primary'
+        channels = list(GoogleWatchChannel.objects.filter(user=request.user, calendar_id=calendar_id))
+        if channels:
+            service, error = self._service(request)
+            if error:
+                return error
+            for channel in channels:
+                stop_channel(service, channel)
+        return Response({'ok': True, 'stopped': len(channels)})
+
+
+class GoogleCalendarWebhookView(APIView):
+    """Receives Google Calendar push notifications; authenticated by the per-channel token."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        try:
+            message_number = int(request.headers['X-Goog-Message-Number'])
+        except (KeyError, ValueError):
+            message_number = None
+        outcome = handle_notification(
+            request.headers.get('X-Goog-Channel-ID'),
+            request.headers.get('X-Goog-Channel-Token'),
+            request.headers.get('X-Goog-Resource-State'),
+            message_number,
+        )
+        if outcome == UNKNOWN:
+            return Response({'ok': False, 'error': 'unknown_channel'}, status=status.HTTP_404_NOT_FOUND)
+        if outcome == FORBIDDEN:
+            return Response({'ok': False, 'error': 'invalid_token'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({'ok': True, 'outcome': outcome})
 
 
 class GoogleOAuthStatusView(APIView):
-    """Return whether the current user has valid Google OAuth credentials."""
+    """Return whether the current user has a Google connection, from the cached status (no Google calls)."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         try:
             first_login = request.query_params.get('first_login') == '1'
-            try:
-                profile = getattr(request.user, 'profile', None)
-            except OperationalError:
-                # Migration not applied yet; treat as no profile data.
-                profile = None
-            connected = False
-            account_email = None
-
-            if not GoogleOAuthToken.objects.filter(user=request.user).exists():
+            cached = account_status(request.user)
+            if cached is None:
                 response = {'ok': True, 'connected': False}
-                if first_login and profile and not profile.google_connect_prompted:
-                    profile.google_connect_prompted = True
-                    profile.save(update_fields=['google_connect_prompted'])
-                    response['should_prompt'] = True
-                elif first_login:
-                    response['should_prompt'] = False
-                return Response(response)
-
-            # Try to load/refresh credentials. If this raises, treat as disconnected.
-            try:
-                creds = get_google_credentials(request.user)
-                # Attempt to read the primary calendar to obtain the user's account id/email
-                try:
-                    service = build('calendar', 'v3', credentials=creds)
-                    primary = service.calendarList().get(calendarId='primary').execute()
-                    account_email = primary.get('id') or primary.get('summary')
-                except Exception:
-                    account_email = None
-                connected = True
-            except Exception:
-                connected = False
-
-            response = {'ok': True, 'connected': connected, 'account_email': account_email}
+            else:
+                response = {
+                    'ok': True,
+                    # Unknown until the first check: the grant itself is still there
+                    'connected': cached['status'] != GoogleOAuthToken.ERROR,
+                    'account_email': cached['account_email'] or None,
+                    'status': cached['status'],
+                    'checked_at': cached['status_checked_at'],
+                }
             if first_login:
+                try:
+                    profile = getattr(request.user, 'profile', None)
+                except OperationalError:
+                    # Migration not applied yet; treat as no profile data.
+                    profile = None
                 should_prompt = False
                 if profile and not profile.google_connect_prompted:
-                    if not connected:
-                        should_prompt = True
+                    should_prompt = not response['connected']
                     profile.google_connect_prompted = True
                     profile.save(update_fields=['google_connect_prompted'])
                 response['should_prompt'] = should_prompt
@@ -280,6 +371,8 @@ class GoogleOAuthDisconnectView(APIView):
                 logger.debug('Failed to revoke token with Google; proceeding to delete locally')
 
             token.delete()
+            # Notifications for these channels will now be rejected as unknown
+            GoogleWatchChannel.objects.filter(user=request.user).delete()
             return Response({'ok': True, 'disconnected': True})
         except Exception as exc:
             logger.exception('Failed to disconnect Google OAuth')
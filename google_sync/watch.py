@@ -0,0 +1,162 @@
+"""
+Google Calendar push notifications (events.watch channels).
+
+Google POSTs an empty notification to the webhook whenever a watched calendar changes, so a
+notification only means "pull now". Bursts are coalesced per channel: the first notification
+sets sync_due_at = now + SYNC_DEBOUNCE, later ones inside that window change nothing, and the
+worker (`manage.py run_google_watch`) runs a single incremental pull for that user and calendar
+once the window has passed. Channels expire, so the worker re-registers them shortly before.
+"""
+
+from __future__ import annotations
+
+import logging
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Callable
+
+from django.conf import settings
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from .models import GoogleOAuthToken, GoogleWatchChannel
+from .pull import pull_changes
+from .services import user_calendar_service
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_TTL = timedelta(days=7)
+RENEW_MARGIN = timedelta(hours=12)
+SYNC_DEBOUNCE = timedelta(seconds=5)
+RETRY_DELAY = timedelta(minutes=1)
+
+# Outcomes of handle_notification
+UNKNOWN = 'unknown'
+FORBIDDEN = 'forbidden'
+IGNORED = 'ignored'
+DUPLICATE = 'duplicate'
+SCHEDULED = 'scheduled'
+COALESCED = 'coalesced'
+
+
+def _from_millis(value) -> datetime:
+    return datetime.fromtimestamp(int(value) / 1000, tz=dt_timezone.utc)
+
+
+def register_channel(user, service, calendar_id: str = 'primary', address: str | None = None,
+                     ttl: timedelta = CHANNEL_TTL) -> GoogleWatchChannel:
+    """Open a new channel for the calendar and stop the ones it replaces."""
+    channel_id = uuid.uuid4().hex
+    token = secrets.token_urlsafe(32)
+    response = service.events().watch(calendarId=calendar_id, body={
+        'id': channel_id,
+        'type': 'web_hook',
+        'address': address or settings.GOOGLE_CALENDAR_WEBHOOK_URL,
+        'token': token,
+        'params': {'ttl': str(int(ttl.total_seconds()))},
+    }).execute()
+    previous = list(GoogleWatchChannel.objects.filter(user=user, calendar_id=calendar_id))
+    channel = GoogleWatchChannel.objects.create(
+        user=user,
+        calendar_id=calendar_id,
+        channel_id=channel_id,
+        resource_id=response.get('resourceId') or '',
+        token=token,
+        expiration=_from_millis(response['expiration']) if response.get('expiration') else timezone.now() + ttl,
+        # Establish the sync token right away instead of waiting for the first change
+        sync_due_at=timezone.now(),
+    )
+    for old in previous:
+        stop_channel(service, old)
+    return channel
+
+
+def stop_channel(service, channel: GoogleWatchChannel) -> None:
+    try:
+        service.channels().stop(body={'id': channel.channel_id, 'resourceId': channel.resource_id}).execute()
+    except HttpError:
+        # Already expired or stopped on Google's side
+        logger.warning('Failed to stop Google watch channel %s', channel.channel_id, exc_info=True)
+    channel.delete()
+
+
+def handle_notification(channel_id: str | None, token: str | None, state: str | None,
+                        message_number: int | None, now: datetime | None = None) -> str:
+    """
+    Record one webhook delivery and schedule a debounced pull; returns one of the outcome constants.
+
+    Message numbers grow per channel, so a number at or below the last one seen is a redelivery.
+    An out-of-order delivery is dropped the same way, which is harmless: any later pull fetches
+    every change since the stored sync token.
+    """
+    channel = GoogleWatchChannel.objects.filter(channel_id=channel_id or '').only('id', 'token').first()
+    if channel is None:
+        return UNKNOWN
+    if not secrets.compare_digest(channel.token, token or ''):
+        return FORBIDDEN
+    if state == 'sync':
+        # Handshake sent when the channel is created; nothing changed
+        return IGNORED
+    channels = GoogleWatchChannel.objects.filter(pk=channel.pk)
+    if message_number is not None:
+        if not channels.filter(last_message_number__lt=message_number).update(last_message_number=message_number):
+            return DUPLICATE
+    now = now or timezone.now()
+    if channels.filter(sync_due_at__isnull=True).update(sync_due_at=now + SYNC_DEBOUNCE):
+        return SCHEDULED
+    return COALESCED
+
+
+def notification_headers(channel: GoogleWatchChannel, message_number: int, state: str = 'exists') -> dict:
+    """Headers of a Google notification for this channel, for local simulation."""
+    return {
+        'X-Goog-Channel-ID': channel.channel_id,
+        'X-Goog-Channel-Token': channel.token,
+        'X-Goog-Channel-Expiration': channel.expiration.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        'X-Goog-Resource-ID': channel.resource_id,
+        'X-Goog-Resource-State': state,
+        'X-Goog-Message-Number': str(message_number),
+    }
+
+
+def run_due_syncs(now: datetime | None = None, limit: int = 50,
+                  service_for: Callable = user_calendar_service) -> tuple[int, int]:
+    """Pull every channel whose debounce window has passed; returns (synced, failed)."""
+    now = now or timezone.now()
+    synced = failed = 0
+    due = GoogleWatchChannel.objects.filter(sync_due_at__lte=now).select_related('user').order_by('sync_due_at')
+    for channel in due[:limit]:
+        # Claim the pending sync; a notification arriving during the pull schedules another one
+        if not GoogleWatchChannel.objects.filter(pk=channel.pk, sync_due_at=channel.sync_due_at).update(sync_due_at=None):
+            continue
+        try:
+            pull_changes(channel.user, service_for(channel.user), channel.calendar_id)
+        except GoogleOAuthToken.DoesNotExist:
+            channel.delete()
+        except Exception:
+            logger.exception('Google pull failed for channel %s', channel.channel_id)
+            GoogleWatchChannel.objects.filter(pk=channel.pk, sync_due_at__isnull=True).update(
+                sync_due_at=now + RETRY_DELAY,
+            )
+            failed += 1
+        else:
+            synced += 1
+    return synced, failed
+
+
+def renew_expiring_channels(now: datetime | None = None, margin: timedelta = RENEW_MARGIN,
+                            service_for: Callable = user_calendar_service) -> int:
+    """Re-register channels that expire within margin; returns how many were renewed."""
+    now = now or timezone.now()
+    renewed = 0
+    for channel in GoogleWatchChannel.objects.filter(expiration__lte=now + margin).select_related('user'):
+        try:
+            register_channel(channel.user, service_for(channel.user), channel.calendar_id)
+        except GoogleOAuthToken.DoesNotExist:
+            channel.delete()
+        except Exception:
+            logger.exception('Failed to renew Google watch channel %s', channel.channel_id)
+        else:
+            renewed += 1
+    return renewed
@@ -61,10 +61,19 @@ class EventProcessor {
         return data.created_events;
     }
 
-    async listEvents() {
+    // options: { start, end, order: 'created' | 'start', pageSize, cursor }
+    // 带 pageSize/cursor 时返回 { next, cursor, results }，否则返回完整数组
+    async listEvents(options = {}) {
         const csrfToken = await this.getCsrfToken();
-        
-        const res = await fetch(`${this.baseUrl}/api/events/`, {
+        const params = new URLSearchParams();
+        if (options.start) params.set('start', options.start);
+        if (options.end) params.set('end', options.end);
+        if (options.order) params.set('order', options.order);
+        if (options.pageSize) params.set('page_size', options.pageSize);
+        if (options.cursor) params.set('cursor', options.cursor);
+        const query = params.toString();
+
+        const res = await fetch(`${this.baseUrl}/api/events/${query ? `?${query}` : ''}`, {
             headers: {
                 'X-CSRFToken': csrfToken
             }
@@ -74,6 +83,28 @@ class EventProcessor {
         return await res.json();
     }
 
+    // 只加载 [start, end) 内的事件，按开始时间逐页读取
+    async listEventsInRange(start, end, pageSize = 200) {
+        const events = [];
+        let cursor = null;
+        do {
+            const page = await this.listEvents({ start, end, order: 'start', pageSize, cursor });
+            events.push(...page.results);
+            cursor = page.cursor;
+        } while (cursor);
+        return events;
+    }
+
+    // 日历网格用的汇总：{ buckets, count, minutes, categories }，各数组按 buckets 对齐
+    async getSummary(start, end, granularity = 'day') {
+        const params = new URLSearchParams({ start, end, granularity });
+        const res = await fetch(`${this.baseUrl}/api/events/summary/?${params}`, {
+            credentials: 'include'
+        });
+        if (!res.ok) throw new Error('Failed to fetch event summary');
+        return await res.json();
+    }
+
     async deleteEvent(eventId) {
         const csrfToken = await this.getCsrfToken();
         
@@ -216,11 +247,17 @@ async function loadUserEvents() {
     if (!eventProcessor) return;
     
     try {
-        const events = await eventProcessor.listEvents();
-        console.log('User events:', events);
+        // 只加载当前可见的月份
+        const now = new Date();
+        const toIsoDate = (d) => `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+        const monthStart = new Date(now.getFullYear(), now.getMonth(), 1);
+        const nextMonthStart = new Date(now.getFullYear(), now.getMonth() + 1, 1);
+        // 月视图只需要每天的数量 / 忙碌分钟 / 分类，一次小请求即可绘制
+        const summary = await eventProcessor.getSummary(toIsoDate(monthStart), toIsoDate(nextMonthStart));
+        console.log('Month summary:', summary);
         
-        // 这里可以添加代码更新 UI 显示事件列表
-        // 比如在侧边栏显示最近创建的事件
+        // 这里可以添加代码更新 UI 显示月历网格
+        // 需要某一天的详细事件时再调用 listEventsInRange(day, nextDay)
     } catch (error) {
         console.warn('Failed to load events:', error);
     }
@@ -9,6 +9,7 @@ class UserProfileInline(admin.StackedInline):
     model = UserProfile
     can_delete = False
     extra = 0
+    filter_horizontal = ("free_busy_viewers",)
 
 
 User = get_user_model()
@@ -30,3 +31,4 @@ class UserAdmin(DjangoUserAdmin):
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "radicale_username")
     search_fields = ("user__username", "user__email", "radicale_username")
+    filter_horizontal = ("free_busy_viewers",)
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_google_connect_prompted'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='free_busy_viewers',
+            field=models.ManyToManyField(blank=True, related_name='free_busy_shared_profiles', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
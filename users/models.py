@@ -11,6 +11,12 @@ class UserProfile(models.Model):
     radicale_username = models.CharField(max_length=150)
     radicale_password = models.CharField(max_length=255)
     google_connect_prompted = models.BooleanField(default=False)
+    # Users allowed to include this user in free-slot searches (they see busy times only)
+    free_busy_viewers = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        related_name='free_busy_shared_profiles',
+    )
 
     def __str__(self) -> str:
         return self.user.username